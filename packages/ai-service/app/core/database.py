@@ -1,7 +1,23 @@
-"""MongoDB async connection using Motor."""
+"""MongoDB async connection using Motor.
+
+Pool size, idle timeout, wire compression and read preference come from
+``Settings``. ``connect_db`` opens ``MONGO_MIN_POOL_SIZE`` connections
+before returning, so the first requests after startup do not pay for TCP
+and auth handshakes. Services declare the indexes they rely on as
+``INDEXES`` (collection, ``IndexModel``) lists; the lifespan hands them all
+to ``ensure_indexes`` before the service starts taking traffic.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Iterable
 
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import IndexModel  # type: ignore
+from pymongo.errors import OperationFailure, PyMongoError  # type: ignore
+
 from app.core.config import settings
+from app.core.metrics import MongoCommandMetrics
 from app.core.logging import get_logger
 
 logger = get_logger("agentbase.db")
@@ -9,13 +25,93 @@ logger = get_logger("agentbase.db")
 client: AsyncIOMotorClient = None
 db: AsyncIOMotorDatabase = None
 
+IndexSpec = tuple[str, IndexModel]
+
+# IndexOptionsConflict / IndexKeySpecsConflict: an index with this name or
+# key already exists with other options.
+_INDEX_CONFLICTS = (85, 86)
+
+
+def client_options() -> dict:
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "readPreference": settings.MONGO_READ_PREFERENCE,
+    }
+    if settings.MONGO_MAX_IDLE_TIME_MS > 0:
+        options["maxIdleTimeMS"] = settings.MONGO_MAX_IDLE_TIME_MS
+    if settings.MONGO_COMPRESSORS:
+        options["compressors"] = settings.MONGO_COMPRESSORS
+    return options
+
 
 async def connect_db():
-    """Connect to MongoDB."""
+    """Connect to MongoDB and warm the connection pool."""
     global client, db
-    client = AsyncIOMotorClient(settings.MONGO_URI)
+    client = AsyncIOMotorClient(
+        settings.MONGO_URI,
+        event_listeners=[MongoCommandMetrics()],
+        **client_options(),
+    )
     db = client.get_default_database()
-    logger.info("mongodb_connected")
+    try:
+        await warm_pool(db, settings.MONGO_MIN_POOL_SIZE)
+    except PyMongoError as e:
+        # Best-effort: the pool fills on demand once MongoDB is reachable.
+        logger.warning("mongodb_warm_up_failed", error=str(e))
+    logger.info("mongodb_connected", **client_options())
+
+
+async def warm_pool(database, connections: int) -> None:
+    """Open ``connections`` pooled connections with concurrent pings."""
+    await asyncio.gather(
+        *(database.command("ping") for _ in range(max(1, connections)))
+    )
+
+
+async def ensure_indexes(database, specs: Iterable[IndexSpec]) -> None:
+    """Create every declared index; existing identical ones are no-ops.
+
+    A TTL index whose ``expireAfterSeconds`` changed in settings is updated
+    in place; any other conflicting definition is an error.
+    """
+    by_collection: dict[str, list[IndexModel]] = defaultdict(list)
+    for collection, model in specs:
+        by_collection[collection].append(model)
+    await asyncio.gather(*(
+        _ensure_collection_indexes(database, collection, models)
+        for collection, models in by_collection.items()
+    ))
+
+
+async def _ensure_collection_indexes(
+    database, collection: str, models: list[IndexModel]
+) -> None:
+    try:
+        await database[collection].create_indexes(models)
+        return
+    except OperationFailure as e:
+        if e.code not in _INDEX_CONFLICTS:
+            raise
+    # Retry one at a time to find and fix the conflicting ones.
+    for model in models:
+        try:
+            await database[collection].create_indexes([model])
+        except OperationFailure as e:
+            ttl = model.document.get("expireAfterSeconds")
+            if e.code not in _INDEX_CONFLICTS or ttl is None:
+                raise
+            await database.command({
+                "collMod": collection,
+                "index": {"name": model.document["name"],
+                          "expireAfterSeconds": ttl},
+            })
+            logger.info(
+                "index_ttl_updated",
+                collection=collection,
+                index=model.document["name"],
+                expire_after_seconds=ttl,
+            )
 
 
 async def close_db():
@@ -0,0 +1,203 @@
+"""Prometheus metrics for the request and provider hot paths.
+
+Everything lives on a private registry served by ``GET /api/ai/metrics``.
+Label children are bound once and reused: HTTP series are cached by
+``(method, route, status)`` and provider series by ``(provider, model)``
+in a ``ProviderMetrics`` bundle, so recording a sample is a dict lookup and
+an ``observe``. Routes are labelled by their template (``/conversations/
+{conversation_id}``), never the raw path, and unknown models collapse into
+``other`` once ``METRICS_MAX_MODELS`` distinct ones have been seen, which
+keeps cardinality bounded.
+
+Under ``app.serve`` with several workers, ``PROMETHEUS_MULTIPROC_DIR`` is
+set before any worker starts; each one then records into its own files
+there and ``render`` aggregates all of them, so a scrape that lands on any
+worker sees the whole service.
+"""
+
+import os
+from typing import Optional
+
+from prometheus_client import (  # type: ignore
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from pymongo import monitoring  # type: ignore
+
+from app.core.config import settings
+
+REGISTRY = CollectorRegistry()
+
+# Seconds. Provider calls run from sub-second cache-warm answers to
+# multi-minute generations; inter-token gaps are milliseconds.
+_HTTP_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+_PROVIDER_BUCKETS = (.1, .25, .5, 1, 2, 4, 8, 15, 30, 60, 120, 300)
+_TTFT_BUCKETS = (.05, .1, .2, .35, .5, .75, 1, 1.5, 2.5, 5, 10, 30)
+_ITL_BUCKETS = (.001, .0025, .005, .01, .02, .035, .05, .075, .1, .25, .5, 1)
+_MONGO_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 5)
+_TPS_BUCKETS = (1, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500, 1000)
+
+http_request_duration = Histogram(
+    "agentbase_ai_http_request_duration_seconds",
+    "HTTP request latency until the response starts, by route template.",
+    ["method", "route", "status"],
+    buckets=_HTTP_BUCKETS,
+    registry=REGISTRY,
+)
+provider_request_duration = Histogram(
+    "agentbase_ai_provider_request_duration_seconds",
+    "Provider call latency, including the whole stream for streaming calls.",
+    ["provider", "model", "outcome"],
+    buckets=_PROVIDER_BUCKETS,
+    registry=REGISTRY,
+)
+stream_ttft = Histogram(
+    "agentbase_ai_stream_time_to_first_token_seconds",
+    "Time from sending a streaming request to its first chunk.",
+    ["provider", "model"],
+    buckets=_TTFT_BUCKETS,
+    registry=REGISTRY,
+)
+stream_inter_token = Histogram(
+    "agentbase_ai_stream_inter_token_seconds",
+    "Gap between consecutive chunks of a stream.",
+    ["provider", "model"],
+    buckets=_ITL_BUCKETS,
+    registry=REGISTRY,
+)
+tokens_per_second = Histogram(
+    "agentbase_ai_tokens_per_second",
+    "Output tokens per second of generation (after the first token for "
+    "streams).",
+    ["provider", "model"],
+    buckets=_TPS_BUCKETS,
+    registry=REGISTRY,
+)
+tokens = Counter(
+    "agentbase_ai_tokens",
+    "Tokens reported by providers.",
+    ["provider", "model", "direction"],
+    registry=REGISTRY,
+)
+provider_errors = Counter(
+    "agentbase_ai_provider_errors",
+    "Failed provider calls by exception type.",
+    ["provider", "model", "error"],
+    registry=REGISTRY,
+)
+mongo_operation_duration = Histogram(
+    "agentbase_ai_mongo_operation_duration_seconds",
+    "MongoDB command latency as reported by the driver.",
+    ["command", "outcome"],
+    buckets=_MONGO_BUCKETS,
+    registry=REGISTRY,
+)
+
+_http_children: dict[tuple[str, str, int], object] = {}
+
+
+def observe_http(method: str, route: str, status: int, seconds: float) -> None:
+    key = (method, route, status)
+    child = _http_children.get(key)
+    if child is None:
+        child = _http_children[key] = http_request_duration.labels(
+            method, route, str(status)
+        )
+    child.observe(seconds)
+
+
+class ProviderMetrics:
+    """Label children for one provider/model, bound once."""
+
+    __slots__ = (
+        "provider", "model", "ok", "failed", "ttft", "inter_token", "tps",
+        "tokens_in", "tokens_out", "cache_read", "cache_write", "_errors",
+    )
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.ok = provider_request_duration.labels(provider, model, "ok")
+        self.failed = provider_request_duration.labels(provider, model, "error")
+        self.ttft = stream_ttft.labels(provider, model)
+        self.inter_token = stream_inter_token.labels(provider, model)
+        self.tps = tokens_per_second.labels(provider, model)
+        self.tokens_in = tokens.labels(provider, model, "in")
+        self.tokens_out = tokens.labels(provider, model, "out")
+        # Prompt tokens served from / written to a provider prompt cache;
+        # already included in "in".
+        self.cache_read = tokens.labels(provider, model, "cache_read")
+        self.cache_write = tokens.labels(provider, model, "cache_write")
+        self._errors: dict[str, object] = {}
+
+    def error(self, exc: BaseException) -> None:
+        name = type(exc).__name__
+        child = self._errors.get(name)
+        if child is None:
+            child = self._errors[name] = provider_errors.labels(
+                self.provider, self.model, name
+            )
+        child.inc()
+
+    def usage(self, usage: dict, generation_seconds: float) -> None:
+        """Count reported tokens and the generation rate."""
+        completion = usage.get("completion_tokens") or 0
+        self.tokens_in.inc(usage.get("prompt_tokens") or 0)
+        self.tokens_out.inc(completion)
+        self.cache_read.inc(usage.get("cache_read_tokens") or 0)
+        self.cache_write.inc(usage.get("cache_write_tokens") or 0)
+        if completion and generation_seconds > 0:
+            self.tps.observe(completion / generation_seconds)
+
+
+_provider_children: dict[tuple[str, str], ProviderMetrics] = {}
+
+
+def for_model(provider: str, model: Optional[str]) -> ProviderMetrics:
+    key = (provider, model or "default")
+    metrics = _provider_children.get(key)
+    if metrics is None:
+        if len(_provider_children) >= settings.METRICS_MAX_MODELS:
+            key = (provider, "other")
+            metrics = _provider_children.get(key)
+        if metrics is None:
+            metrics = _provider_children[key] = ProviderMetrics(*key)
+    return metrics
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Driver listener feeding ``mongo_operation_duration``."""
+
+    def __init__(self):
+        self._children: dict[tuple[str, str], object] = {}
+
+    def _observe(self, command: str, outcome: str, micros: int) -> None:
+        key = (command, outcome)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = mongo_operation_duration.labels(
+                command, outcome
+            )
+        child.observe(micros / 1_000_000)
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._observe(event.command_name, "ok", event.duration_micros)
+
+    def failed(self, event) -> None:
+        self._observe(event.command_name, "error", event.duration_micros)
+
+
+def render() -> tuple[bytes, str]:
+    """Exposition payload and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,98 @@
+"""Pure ASGI middleware for internal auth and request logging.
+
+Starlette's ``@app.middleware("http")`` runs every request through
+``BaseHTTPMiddleware``, which copies the response body through a memory
+stream in a separate task; that costs throughput on every request and
+delays chunks and disconnect handling on SSE streams. These wrap the ASGI
+callables directly: auth looks at the scope before the app runs, and the
+logger only intercepts the ``http.response.start`` message.
+"""
+
+import hmac
+import time
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("agentbase.ai")
+
+# Health paths that must remain open for App Service probes and internal checks.
+OPEN_PATHS = frozenset(
+    {"/api/health", "/api/ai/health", "/docs", "/openapi.json", "/redoc"}
+)
+
+_UNAUTHORIZED = JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+
+
+def _header(scope: Scope, name: bytes) -> bytes:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return b""
+
+
+class InternalTokenMiddleware:
+    """Enforce X-Internal-Token on all /api/ai/* routes when token is configured.
+
+    Skipped when INTERNAL_SERVICE_TOKEN is not set (local dev). Health endpoints
+    are always open so App Service probes can reach them without credentials.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        token = settings.INTERNAL_SERVICE_TOKEN
+        if scope["type"] == "http" and token:
+            path = scope["path"]
+            if path.startswith("/api/ai/") and path not in OPEN_PATHS:
+                supplied = _header(scope, b"x-internal-token")
+                if not hmac.compare_digest(supplied, token.encode()):
+                    await _UNAUTHORIZED(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+
+class RequestLogMiddleware:
+    """Log all HTTP requests with method, path, status and duration.
+
+    The duration runs until the response starts, so a stream is logged
+    when its headers go out rather than when it ends.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+
+        async def send_logged(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - start
+                status = message["status"]
+                # The router stores the matched route in the scope; labelling
+                # by its template keeps one series per endpoint, not per id.
+                route = scope.get("route")
+                metrics.observe_http(
+                    scope["method"],
+                    route.path if route is not None else "unmatched",
+                    status,
+                    elapsed,
+                )
+                logger.info(
+                    "http_request",
+                    method=scope["method"],
+                    path=scope["path"],
+                    status=status,
+                    duration_ms=round(elapsed * 1000, 1),
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_logged)
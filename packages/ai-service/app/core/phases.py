@@ -0,0 +1,157 @@
+"""Per-turn phase timing for chat requests.
+
+A router starts a ``PhaseTimer`` for each chat turn and wraps its stages in
+``timer.phase(name)``; the chat pipeline picks the same timer up from a
+context variable to time the provider call, so nothing has to be threaded
+through the provider or routing signatures. Background tasks created during
+the turn (stream sessions, hedged attempts) inherit the timer. Phases are
+reported as ``<name>_ms`` and accumulate if a stage runs more than once.
+
+With ``PHASE_TIMING_ENABLED`` off, ``start`` and ``current`` return a shared
+no-op timer and nothing is allocated per request. With
+``PHASE_TIMING_OTEL`` on, each reported turn is also exported as an
+OpenTelemetry span with one child span per phase (requires
+``opentelemetry-sdk`` and ``opentelemetry-exporter-otlp-proto-http``; the
+exporter reads the standard ``OTEL_EXPORTER_OTLP_*`` variables).
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("agentbase.phases")
+
+DB_READ = "db_read"
+PROMPT_BUILD = "prompt_build"
+TTFT = "ttft"
+GENERATION = "generation"
+DB_WRITE = "db_write"
+
+
+class PhaseTimer:
+    """Accumulates phase durations (and spans, for export) for one turn."""
+
+    __slots__ = ("_ms", "_spans", "_epoch_ns", "_origin_ns")
+
+    def __init__(self):
+        self._ms: dict[str, float] = {}
+        self._spans: list[tuple[str, int, int]] = []
+        # perf_counter is monotonic but has no epoch; spans need both.
+        self._epoch_ns = time.time_ns()
+        self._origin_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter_ns())
+
+    def record(self, name: str, start_ns: int, end_ns: int) -> None:
+        """Add a phase measured with ``time.perf_counter_ns``."""
+        key = f"{name}_ms"
+        self._ms[key] = self._ms.get(key, 0.0) + (end_ns - start_ns) / 1e6
+        self._spans.append((name, start_ns, end_ns))
+
+    def as_dict(self) -> dict[str, float]:
+        return {k: round(v, 1) for k, v in self._ms.items()}
+
+    def report(self, event: str, **fields: Any) -> None:
+        """End the turn: log its phases and export spans if enabled."""
+        logger.info(event, **fields, **self.as_dict())
+        self._export(event, fields)
+
+    def _export(self, name: str, attributes: dict) -> None:
+        tracer = _tracer()
+        if tracer is None or not self._spans:
+            return
+        to_epoch = self._epoch_ns - self._origin_ns
+        start = min(s[1] for s in self._spans) + to_epoch
+        end = max(s[2] for s in self._spans) + to_epoch
+        from opentelemetry import trace  # type: ignore
+
+        root = tracer.start_span(
+            name,
+            start_time=start,
+            attributes={k: v for k, v in attributes.items() if v is not None},
+        )
+        parent = trace.set_span_in_context(root)
+        for phase, s, e in self._spans:
+            tracer.start_span(
+                phase, context=parent, start_time=s + to_epoch
+            ).end(end_time=e + to_epoch)
+        root.end(end_time=end)
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    _context = nullcontext()
+
+    def phase(self, name: str):
+        return self._context
+
+    def record(self, name: str, start_ns: int, end_ns: int) -> None:
+        pass
+
+    def as_dict(self) -> dict[str, float]:
+        return {}
+
+    def report(self, event: str, **fields: Any) -> None:
+        pass
+
+
+NOOP = _NoopTimer()
+
+_current: ContextVar[Any] = ContextVar("phase_timer", default=NOOP)
+
+
+def start() -> Any:
+    """Begin timing a turn in the current context."""
+    if not settings.PHASE_TIMING_ENABLED:
+        return NOOP
+    timer = PhaseTimer()
+    _current.set(timer)
+    return timer
+
+
+def current() -> Any:
+    """The timer of the turn running in this context, or the no-op one."""
+    return _current.get()
+
+
+_otel_tracer: Optional[Any] = None
+_otel_ready = False
+
+
+def _tracer() -> Optional[Any]:
+    global _otel_tracer, _otel_ready
+    if not settings.PHASE_TIMING_OTEL:
+        return None
+    if not _otel_ready:
+        _otel_ready = True
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (  # type: ignore
+                OTLPSpanExporter,
+            )
+            from opentelemetry.sdk.resources import Resource  # type: ignore
+            from opentelemetry.sdk.trace import TracerProvider  # type: ignore
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor  # type: ignore
+        except ImportError:
+            logger.warning(
+                "phase_timing_otel_unavailable",
+                detail="install opentelemetry-sdk and "
+                "opentelemetry-exporter-otlp-proto-http",
+            )
+            return None
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": "agentbase-ai"})
+        )
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        _otel_tracer = provider.get_tracer("agentbase.phases")
+    return _otel_tracer
@@ -0,0 +1,34 @@
+"""orjson-based encoding for API responses and streamed bodies.
+
+``JSONResponse`` is the app's default response class. FastAPI still runs
+``jsonable_encoder`` over whatever a route returns before handing it to
+the response class, so hot routes that return large documents build the
+response themselves (``JSONResponse(doc)`` or a streamed body from
+``dumps``) and skip that walk entirely. orjson writes ``datetime`` values
+natively in the same ISO 8601 form ``jsonable_encoder`` produces; the only
+other non-JSON type in our documents, ``ObjectId``, is written as its hex
+string.
+"""
+
+from typing import Any
+
+import orjson  # type: ignore
+from bson import ObjectId  # type: ignore
+from fastapi.responses import JSONResponse as _JSONResponse
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+
+class JSONResponse(_JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,15 +1,23 @@
 """Agentbase AI Service - FastAPI microservice for AI integrations."""
 
-import time
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 from app.core.config import settings
-from app.core.database import connect_db, close_db
+from app.core.database import connect_db, close_db, ensure_indexes, get_db
 from app.core.logging import setup_logging, get_logger
-from app.routers import health, conversations, models, streaming
+from app.core.middleware import InternalTokenMiddleware, RequestLogMiddleware
+from app.core.serialization import JSONResponse
+from app.routers import (
+    batch, cache, health, conversations, jobs as jobs_router, models, streaming,
+)
+from app.routers import metrics as metrics_router
+from app.services import (
+    conversation_list, jobs, message_store, response_cache, stream_sessions,
+)
+from app.services.ai_providers import ProviderRegistry
+from app.services.model_catalog import catalog
 
 # Initialize structured logging
 setup_logging()
@@ -21,7 +29,33 @@ async def lifespan(app: FastAPI):
     """Manage application startup and shutdown."""
     logger.info("starting_ai_service", port=settings.AI_SERVICE_PORT)
     await connect_db()
+    indexes = [
+        *message_store.INDEXES,
+        *conversation_list.INDEXES,
+        *stream_sessions.INDEXES,
+        *jobs.INDEXES,
+    ]
+    if settings.RESPONSE_CACHE_MONGO:
+        indexes += response_cache.INDEXES
+    await ensure_indexes(get_db(), indexes)
+    if (
+        settings.RESPONSE_CACHE_ENABLED
+        and not settings.RESPONSE_CACHE_MONGO
+        and settings.AI_SERVICE_WORKERS > 1
+    ):
+        logger.warning(
+            "response_cache_per_worker",
+            detail="set RESPONSE_CACHE_MONGO=true to share cached answers "
+            "across workers",
+        )
+    catalog.start()
+    if settings.JOBS_WORKER_ENABLED:
+        jobs.job_worker.start()
     yield
+    await jobs.job_worker.stop()
+    await catalog.stop()
+    await stream_sessions.shutdown()
+    await ProviderRegistry.aclose()
     await close_db()
     logger.info("ai_service_stopped")
 
@@ -31,6 +65,7 @@ app = FastAPI(
     description="AI integration microservice for the Agentbase platform",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=JSONResponse,
 )
 
 # CORS — restricted to core API only. The browser never calls the AI service directly;
@@ -43,50 +78,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Health paths that must remain open for App Service probes and internal checks.
-_OPEN_PATHS = {"/api/health", "/api/ai/health", "/docs", "/openapi.json", "/redoc"}
-
-
-@app.middleware("http")
-async def internal_token_auth(request: Request, call_next):
-    """Enforce X-Internal-Token on all /api/ai/* routes when token is configured.
-
-    Skipped when INTERNAL_SERVICE_TOKEN is not set (local dev). Health endpoints
-    are always open so App Service probes can reach them without credentials.
-    """
-    path = request.url.path
-    if (
-        settings.INTERNAL_SERVICE_TOKEN
-        and path.startswith("/api/ai/")
-        and path not in _OPEN_PATHS
-    ):
-        token = request.headers.get("x-internal-token")
-        if not token or token != settings.INTERNAL_SERVICE_TOKEN:
-            return JSONResponse(
-                status_code=401,
-                content={"detail": "Unauthorized"},
-            )
-    return await call_next(request)
-
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log all HTTP requests with method, path, status and duration."""
-    start = time.perf_counter()
-    response = await call_next(request)
-    duration_ms = round((time.perf_counter() - start) * 1000, 1)
-    logger.info(
-        "http_request",
-        method=request.method,
-        path=request.url.path,
-        status=response.status_code,
-        duration_ms=duration_ms,
-    )
-    return response
-
+# The last middleware added runs first, so 401s from the token check are
+# logged too.
+app.add_middleware(InternalTokenMiddleware)
+app.add_middleware(RequestLogMiddleware)
 
 # Routers
 app.include_router(health.router, prefix="/api", tags=["health"])
 app.include_router(conversations.router, prefix="/api/ai", tags=["conversations"])
 app.include_router(streaming.router, prefix="/api/ai", tags=["streaming"])
 app.include_router(models.router, prefix="/api/ai", tags=["models"])
+app.include_router(cache.router, prefix="/api/ai", tags=["cache"])
+app.include_router(batch.router, prefix="/api/ai", tags=["batch"])
+app.include_router(jobs_router.router, prefix="/api/ai", tags=["jobs"])
+app.include_router(metrics_router.router, prefix="/api/ai", tags=["metrics"])
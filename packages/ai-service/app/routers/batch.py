@@ -0,0 +1,294 @@
+"""Batch chat endpoint: many chat jobs in one request, results as NDJSON."""
+
+import asyncio
+from datetime import datetime
+from typing import AsyncGenerator, Optional
+
+from bson import ObjectId  # type: ignore
+from bson.errors import InvalidId  # type: ignore
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.logging import get_logger
+from app.core.serialization import dumps
+from app.services import message_store
+from app.services.ai_providers import ChatMessage, ChatRequest
+from app.services.chat_pipeline import ChatOptions
+from app.services.context_budget import ContextBudgetExceeded
+from app.services.routing import (
+    NoHealthyProvider,
+    ProviderUnavailable,
+    RoutedResponse,
+    routing,
+)
+from app.services.scheduler import PRIORITY_BATCH
+
+router = APIRouter()
+logger = get_logger("agentbase.batch")
+
+
+class BatchItem(BaseModel):
+    # Caller's correlation id, echoed back on the result line.
+    id: Optional[str] = None
+    # Optional: with a conversation the exchange is appended to it and its
+    # recent history is replayed; without one the item is a one-shot prompt.
+    conversation_id: Optional[str] = None
+    application_id: Optional[str] = None
+    content: str
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    temperature: Optional[float] = 0.7
+    max_tokens: Optional[int] = 2048
+    system_prompt: Optional[str] = None
+    api_key: Optional[str] = None
+    cache: Optional[bool] = None
+    semantic_cache: Optional[bool] = None
+    coalesce: bool = False
+
+
+class BatchRequest(BaseModel):
+    items: list[BatchItem]
+    # Parallel provider calls; capped at BATCH_MAX_CONCURRENCY.
+    concurrency: Optional[int] = None
+
+
+class _ItemError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+
+
+def _line(payload: dict) -> bytes:
+    return dumps(payload) + b"\n"
+
+
+async def _load_conversations(
+    db, items: list[BatchItem]
+) -> tuple[dict[str, dict], dict[str, list[dict]]]:
+    """Fetch every referenced header with one ``$in`` and all their recent
+    history with one bucket query. Items on the same conversation all see
+    the history as of the start of the batch.
+    """
+    ids: dict[str, ObjectId] = {}
+    windows: dict[str, tuple[int, int]] = {}
+    for item in items:
+        if not item.conversation_id:
+            continue
+        try:
+            ids[item.conversation_id] = ObjectId(item.conversation_id)
+        except (InvalidId, TypeError):
+            continue
+        max_messages, max_tokens = message_store.history_window(item.model)
+        prev = windows.get(item.conversation_id, (0, 0))
+        windows[item.conversation_id] = (
+            max(prev[0], max_messages), max(prev[1], max_tokens)
+        )
+    if not ids:
+        return {}, {}
+
+    max_messages = max(w[0] for w in windows.values())
+    convs: dict[str, dict] = {}
+    cursor = db.ai_conversations.find(
+        {"_id": {"$in": list(ids.values())}},
+        message_store.header_projection(max_messages),
+    )
+    async for conv in cursor:
+        convs[str(conv["_id"])] = conv
+
+    history = await message_store.load_recent_many(db, [
+        (conv, *windows[cid]) for cid, conv in convs.items()
+    ])
+    return convs, {str(k): v for k, v in history.items()}
+
+
+def _build_request(item: BatchItem, history: list[dict]) -> ChatRequest:
+    messages = []
+    if item.system_prompt:
+        messages.append(ChatMessage(role="system", content=item.system_prompt))
+    for msg in history:
+        messages.append(ChatMessage(role=msg["role"], content=msg["content"]))
+    messages.append(ChatMessage(role="user", content=item.content))
+    return ChatRequest(
+        messages=messages,
+        model=item.model,
+        temperature=(
+            item.temperature if item.temperature is not None
+            else settings.DEFAULT_TEMPERATURE
+        ),
+        max_tokens=item.max_tokens or 2048,
+    )
+
+
+async def _run_item(
+    item: BatchItem,
+    conv: Optional[dict],
+    history: list[dict],
+) -> RoutedResponse:
+    if item.conversation_id and conv is None:
+        raise _ItemError(404, "Conversation not found")
+    options = ChatOptions(
+        conversation_id=item.conversation_id,
+        application_id=conv.get("applicationId") if conv else item.application_id,
+        cache=item.cache,
+        semantic_cache=item.semantic_cache,
+        coalesce=item.coalesce,
+        priority=PRIORITY_BATCH,
+    )
+    try:
+        return await routing.dispatch(
+            item.provider or settings.DEFAULT_AI_PROVIDER,
+            _build_request(item, history),
+            options,
+            item.api_key,
+        )
+    except (ProviderUnavailable, ContextBudgetExceeded) as e:
+        raise _ItemError(400, str(e))
+    except NoHealthyProvider as e:
+        raise _ItemError(503, str(e))
+    except Exception as e:
+        raise _ItemError(500, f"AI provider error: {str(e)}")
+
+
+def _exchange(item: BatchItem, route: RoutedResponse) -> tuple:
+    response = route.response
+    now = datetime.utcnow()
+    return (
+        ObjectId(item.conversation_id),
+        [
+            {"role": "user", "content": item.content, "timestamp": now},
+            {
+                "role": "assistant",
+                "content": response.content,
+                "timestamp": now,
+                "metadata": {
+                    "model": response.model,
+                    "provider": response.provider,
+                },
+            },
+        ],
+        {
+            "metadata": {
+                "model": response.model,
+                "provider": response.provider,
+                **response.usage,
+            },
+        },
+    )
+
+
+@router.post("/batch")
+async def run_batch(req: BatchRequest):
+    """Run many chat jobs with bounded concurrency.
+
+    Results stream back as NDJSON, one line per item in completion order
+    (``index`` is the item's position in the request), followed by a
+    summary line. A failed item does not fail the batch. Exchanges on
+    conversations are persisted in groups of ``BATCH_WRITE_GROUP_SIZE``.
+    """
+    if not req.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(req.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch exceeds {settings.BATCH_MAX_ITEMS} items",
+        )
+    concurrency = max(1, min(
+        req.concurrency or settings.BATCH_DEFAULT_CONCURRENCY,
+        settings.BATCH_MAX_CONCURRENCY,
+    ))
+    db = get_db()
+    convs, histories = await _load_conversations(db, req.items)
+
+    async def results() -> AsyncGenerator[bytes, None]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, item: BatchItem):
+            async with semaphore:
+                cid = item.conversation_id or ""
+                try:
+                    route = await _run_item(
+                        item, convs.get(cid), histories.get(cid, [])
+                    )
+                except _ItemError as e:
+                    return index, None, e
+                return index, route, None
+
+        tasks = [
+            asyncio.create_task(run(i, item)) for i, item in enumerate(req.items)
+        ]
+        pending_writes: list[tuple] = []
+        pending_indexes: list[int] = []
+        succeeded = failed = 0
+
+        async def flush() -> Optional[bytes]:
+            if not pending_writes:
+                return None
+            writes, indexes = list(pending_writes), list(pending_indexes)
+            pending_writes.clear()
+            pending_indexes.clear()
+            try:
+                missing = await message_store.append_many(db, writes)
+            except Exception as e:
+                logger.error("batch_persist_failed", error=str(e))
+                return _line({"type": "persist_error", "indexes": indexes,
+                              "error": str(e)})
+            if missing:
+                lost = [i for i, w in zip(indexes, writes) if w[0] in missing]
+                return _line({"type": "persist_error", "indexes": lost,
+                              "error": "Conversation not found"})
+            return None
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, route, error = await next_done
+                item = req.items[index]
+                if error is not None:
+                    failed += 1
+                    yield _line({
+                        "type": "result",
+                        "index": index,
+                        "id": item.id,
+                        "status": "error",
+                        "status_code": error.status_code,
+                        "error": str(error),
+                    })
+                    continue
+                succeeded += 1
+                response = route.response
+                if item.conversation_id:
+                    pending_writes.append(_exchange(item, route))
+                    pending_indexes.append(index)
+                yield _line({
+                    "type": "result",
+                    "index": index,
+                    "id": item.id,
+                    "status": "ok",
+                    "response": response.content,
+                    "model": response.model,
+                    "provider": response.provider,
+                    "usage": response.usage,
+                    "routing": route.summary(),
+                })
+                if len(pending_writes) >= settings.BATCH_WRITE_GROUP_SIZE:
+                    line = await flush()
+                    if line:
+                        yield line
+            line = await flush()
+            if line:
+                yield line
+            yield _line({
+                "type": "summary",
+                "total": len(req.items),
+                "succeeded": succeeded,
+                "failed": failed,
+            })
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Answers already paid for are kept even if the client went away.
+            await asyncio.shield(flush())
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -0,0 +1,19 @@
+"""Response cache statistics endpoint."""
+
+from fastapi import APIRouter
+
+from app.services.response_cache import response_cache
+from app.services.semantic_cache import semantic_cache
+from app.services.single_flight import single_flight
+
+router = APIRouter()
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit rates for the response caches and request coalescing."""
+    return {
+        "exact": response_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "single_flight": single_flight.stats(),
+    }
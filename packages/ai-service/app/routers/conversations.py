@@ -1,17 +1,30 @@
 """Conversation management and AI chat endpoints."""
 
 from fastapi import APIRouter, HTTPException  # type: ignore
+from fastapi.responses import StreamingResponse  # type: ignore
 from pydantic import BaseModel  # type: ignore
 from typing import Any, Dict, Optional
 from datetime import datetime
 
+from app.core import phases
 from app.core.database import get_db
 from app.core.config import settings
+from app.core.serialization import dumps
 from app.services.ai_providers import (
     ProviderRegistry,
     ChatRequest,
     ChatMessage,
 )
+from app.services import message_store
+from app.services.chat_pipeline import ChatOptions
+from app.services.fake_provider import FakeProvider
+from app.services.local_provider import LocalProvider
+from app.services.context_budget import ContextBudgetExceeded
+from app.services.routing import (
+    NoHealthyProvider,
+    ProviderUnavailable,
+    routing,
+)
 
 router = APIRouter()
 
@@ -22,6 +35,26 @@ ProviderRegistry.initialize(
     gemini_key=settings.GEMINI_API_KEY or "",
     huggingface_key=settings.HUGGINGFACE_API_KEY or "",
 )
+if settings.FAKE_PROVIDER_ENABLED:
+    ProviderRegistry.register(FakeProvider(
+        latency_ms=settings.FAKE_PROVIDER_LATENCY_MS,
+        tokens_per_second=settings.FAKE_PROVIDER_TOKENS_PER_SECOND,
+        output_tokens=settings.FAKE_PROVIDER_OUTPUT_TOKENS,
+        error_rate=settings.FAKE_PROVIDER_ERROR_RATE,
+        rate_limit_rate=settings.FAKE_PROVIDER_RATE_LIMIT_RATE,
+    ))
+if settings.LOCAL_LLM_BASE_URL:
+    ProviderRegistry.register(LocalProvider(
+        settings.LOCAL_LLM_BASE_URL,
+        api_key=settings.LOCAL_LLM_API_KEY,
+        model=settings.LOCAL_LLM_MODEL,
+        timeout=settings.LOCAL_LLM_TIMEOUT_SECONDS,
+        max_connections=settings.LOCAL_LLM_MAX_CONNECTIONS,
+        models_ttl=settings.LOCAL_LLM_MODELS_TTL_SECONDS,
+        micro_batch_window_ms=settings.LOCAL_LLM_MICRO_BATCH_WINDOW_MS,
+        micro_batch_max_size=settings.LOCAL_LLM_MICRO_BATCH_MAX_SIZE,
+        micro_batch_max_tokens=settings.LOCAL_LLM_MICRO_BATCH_MAX_TOKENS,
+    ))
 
 
 class CreateConversationRequest(BaseModel):
@@ -40,6 +73,16 @@ class SendMessageRequest(BaseModel):
     # BYOK: caller-supplied key (decrypted by the core service,
     # transmitted over the internal network — never exposed to browsers).
     api_key: Optional[str] = None
+    # Response cache: None follows the service default, True opts in,
+    # False bypasses. Only deterministic (temperature 0) requests are cached.
+    cache: Optional[bool] = None
+    # Semantic cache for paraphrased first-turn questions; same semantics.
+    semantic_cache: Optional[bool] = None
+    # Share one upstream call with identical requests already in flight.
+    coalesce: bool = False
+    # Hedge a slow primary with a fallback provider; None follows
+    # ROUTING_HEDGE_ENABLED.
+    hedge: Optional[bool] = None
 
 
 @router.post("/conversations")
@@ -50,7 +93,7 @@ async def create_conversation(req: CreateConversationRequest):
         "applicationId": req.application_id,
         "userId": req.user_id,
         "title": req.title,
-        "messages": [],
+        **message_store.new_header_fields(),
         "metadata": {},
         "isArchived": False,
         "createdAt": datetime.utcnow(),
@@ -58,12 +101,16 @@ async def create_conversation(req: CreateConversationRequest):
     }
     result = await db.ai_conversations.insert_one(conversation)
     conversation["_id"] = str(result.inserted_id)
-    return {"id": str(result.inserted_id), **conversation}
+    return {"id": str(result.inserted_id), **conversation, "messages": []}
 
 
 @router.get("/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str):
-    """Get conversation by ID with message history."""
+    """Get conversation by ID with message history.
+
+    The history is written out one bucket at a time as it is read, so a
+    long conversation is never held, or encoded, as one document.
+    """
     from bson import ObjectId  # type: ignore
 
     db = get_db()
@@ -73,8 +120,21 @@ async def get_conversation(conversation_id: str):
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    conv["_id"] = str(conv["_id"])
-    return conv
+    conv = await message_store.ensure_bucketed(db, conv)
+    header = {k: v for k, v in conv.items() if k != "messages"}
+    return StreamingResponse(
+        _conversation_body(db, conv, header), media_type="application/json"
+    )
+
+
+async def _conversation_body(db, conv: dict, header: dict):
+    yield dumps(header)[:-1] + b',"messages":['
+    separator = b""
+    async for batch in message_store.iter_message_batches(db, conv):
+        # Each batch encodes as "[...]"; splice its items into one array.
+        yield separator + dumps(batch)[1:-1]
+        separator = b","
+    yield b"]}"
 
 
 @router.post("/conversations/{conversation_id}/messages")
@@ -83,66 +143,67 @@ async def send_message(conversation_id: str, req: SendMessageRequest):
     from bson import ObjectId  # type: ignore
 
     db = get_db()
-    conv = await db.ai_conversations.find_one(
-        {"_id": ObjectId(conversation_id)}
-    )
-    if not conv:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    timer = phases.start()
+    max_messages, max_tokens = message_store.history_window(req.model)
+    with timer.phase(phases.DB_READ):
+        conv = await db.ai_conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            message_store.header_projection(max_messages),
+        )
+        if not conv:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        history = await message_store.load_recent_messages(
+            db, conv, max_messages, max_tokens
+        )
 
-    # Determine provider
-    provider_name = req.provider or settings.DEFAULT_AI_PROVIDER
+    with timer.phase(phases.PROMPT_BUILD):
+        # Build message history
+        messages = []
+        if req.system_prompt:
+            messages.append(ChatMessage(role="system", content=req.system_prompt))
+        for msg in history:
+            messages.append(ChatMessage(role=msg["role"], content=msg["content"]))
+
+        # Add user message
+        messages.append(ChatMessage(role="user", content=req.content))
+
+        chat_request = ChatRequest(
+            messages=messages,
+            model=req.model,
+            temperature=(
+                req.temperature if req.temperature is not None
+                else settings.DEFAULT_TEMPERATURE
+            ),
+            max_tokens=req.max_tokens or 2048,
+        )
 
-    # If a BYOK key was supplied by the core service, create a short-lived
-    # ephemeral provider instance (not cached — avoids key leaks
-    # across requests).
-    if req.api_key:
-        provider = ProviderRegistry.get_ephemeral(provider_name, req.api_key)
-        if not provider:
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    f"Provider '{provider_name}' is not"
-                    " supported for BYOK."
-                ),
-            )
-    else:
-        provider = ProviderRegistry.get(provider_name)
-        if not provider:
-            raise HTTPException(
-                status_code=400,
-                detail=(
-                    f"Provider '{provider_name}' not available."
-                    " Configure API key in Settings → AI"
-                    " Providers."
-                ),
-            )
-
-    # Build message history
-    messages = []
-    if req.system_prompt:
-        messages.append(ChatMessage(role="system", content=req.system_prompt))
-
-    for msg in conv.get("messages", []):
-        messages.append(ChatMessage(role=msg["role"], content=msg["content"]))
-
-    # Add user message
-    messages.append(ChatMessage(role="user", content=req.content))
-
-    # Get AI response
-    chat_request = ChatRequest(
-        messages=messages,
-        model=req.model,
-        temperature=req.temperature or 0.7,
-        max_tokens=req.max_tokens or 2048,
+    options = ChatOptions(
+        conversation_id=conversation_id,
+        application_id=conv.get("applicationId"),
+        cache=req.cache,
+        semantic_cache=req.semantic_cache,
+        coalesce=req.coalesce,
     )
 
+    # A BYOK key supplied by the core service leases a pooled client bound
+    # to exactly that key and is never failed over; platform requests fall
+    # back to equivalent models on other providers (and hedge, if enabled)
+    # when the primary is failing or slow.
+    provider_name = req.provider or settings.DEFAULT_AI_PROVIDER
     try:
-        response = await provider.chat(chat_request)
+        route = await routing.dispatch(
+            provider_name, chat_request, options, req.api_key, req.hedge
+        )
+    except (ProviderUnavailable, ContextBudgetExceeded) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NoHealthyProvider as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"AI provider error: {str(e)}",
         )
+    response = route.response
 
     # Store messages
     user_msg = {
@@ -156,20 +217,28 @@ async def send_message(conversation_id: str, req: SendMessageRequest):
         "timestamp": datetime.utcnow(),
         "metadata": {"model": response.model, "provider": response.provider},
     }
-
-    await db.ai_conversations.update_one(
-        {"_id": ObjectId(conversation_id)},
-        {
-            "$push": {"messages": {"$each": [user_msg, assistant_msg]}},
-            "$set": {
-                "updatedAt": datetime.utcnow(),
+    timings = timer.as_dict()
+    if timings:
+        assistant_msg["metadata"]["timings"] = timings
+
+    with timer.phase(phases.DB_WRITE):
+        await message_store.append_messages(
+            db,
+            ObjectId(conversation_id),
+            [user_msg, assistant_msg],
+            set_fields={
                 "metadata": {
                     "model": response.model,
                     "provider": response.provider,
                     **response.usage,
                 },
             },
-        },
+        )
+    timer.report(
+        "chat_turn",
+        conversation_id=conversation_id,
+        provider=response.provider,
+        model=response.model,
     )
 
     return {
@@ -177,4 +246,5 @@ async def send_message(conversation_id: str, req: SendMessageRequest):
         "model": response.model,
         "provider": response.provider,
         "usage": response.usage,
+        "routing": route.summary(),
     }
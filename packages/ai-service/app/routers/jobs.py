@@ -0,0 +1,154 @@
+"""Offline bulk job endpoints."""
+
+import json
+from typing import AsyncGenerator, Optional
+
+from bson import ObjectId  # type: ignore
+from bson.errors import InvalidId  # type: ignore
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.serialization import dumps
+from app.services import jobs
+from app.services.ai_providers import ChatMessage, ChatRequest, ProviderRegistry
+
+router = APIRouter()
+
+
+def parse_jsonl(
+    body: bytes, model: Optional[str] = None
+) -> list[tuple[str, ChatRequest]]:
+    """Parse a JSONL job file into ``(custom_id, request)`` pairs.
+
+    Each line is ``{"custom_id", "messages", "model", "temperature",
+    "max_tokens"}``, or ``{"custom_id", "content", "system_prompt", ...}`` for
+    a single question. OpenAI batch-file lines (fields nested under
+    ``body``) are accepted as-is. Raises ``ValueError`` naming the bad line.
+    """
+    requests = []
+    for number, line in enumerate(body.decode().splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+            fields = entry.get("body", entry)
+            messages = fields.get("messages")
+            if messages is None:
+                messages = []
+                if fields.get("system_prompt"):
+                    messages.append(
+                        {"role": "system", "content": fields["system_prompt"]}
+                    )
+                messages.append({"role": "user", "content": fields["content"]})
+            request = ChatRequest(
+                messages=[ChatMessage(**m) for m in messages],
+                model=fields.get("model") or model,
+                temperature=fields.get("temperature", settings.DEFAULT_TEMPERATURE),
+                max_tokens=fields.get("max_tokens", settings.DEFAULT_MAX_TOKENS),
+            )
+        except (ValueError, KeyError, TypeError, AttributeError, ValidationError) as e:
+            raise ValueError(f"Invalid request on line {number}: {e}")
+        requests.append((str(entry.get("custom_id", len(requests))), request))
+    return requests
+
+
+def _job_id(job_id: str) -> ObjectId:
+    try:
+        return ObjectId(job_id)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+
+def _serialize(job: dict) -> dict:
+    return {
+        "id": str(job["_id"]),
+        "status": job["status"],
+        "provider": job["provider"],
+        "application_id": job.get("applicationId"),
+        "mode": job.get("mode"),
+        "total": job["total"],
+        "succeeded": job.get("succeeded", 0),
+        "failed": job.get("failed", 0),
+        "error": job.get("error"),
+        "created_at": job["createdAt"],
+        "started_at": job.get("startedAt"),
+        "finished_at": job.get("finishedAt"),
+    }
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    application_id: Optional[str] = None,
+):
+    """Queue a JSONL file of chat requests (the request body) for offline
+    processing. Poll ``GET /jobs/{id}`` and fetch ``/jobs/{id}/results``.
+    """
+    provider_name = provider or settings.DEFAULT_AI_PROVIDER
+    if not ProviderRegistry.get(provider_name):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Provider '{provider_name}' not available.",
+        )
+    try:
+        requests = parse_jsonl(await request.body(), model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not requests:
+        raise HTTPException(status_code=400, detail="Job has no requests")
+    if len(requests) > settings.JOBS_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Job exceeds {settings.JOBS_MAX_ITEMS} requests",
+        )
+    job = await jobs.submit_job(get_db(), requests, provider_name, application_id)
+    return _serialize(job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status and progress counters."""
+    job = await get_db()[jobs.JOBS_COLLECTION].find_one({"_id": _job_id(job_id)})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _serialize(job)
+
+
+@router.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str):
+    """Finished items as NDJSON, in submission order."""
+    db = get_db()
+    oid = _job_id(job_id)
+    if not await db[jobs.JOBS_COLLECTION].find_one({"_id": oid}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def lines() -> AsyncGenerator[bytes, None]:
+        cursor = db[jobs.ITEMS_COLLECTION].find(
+            {"jobId": oid, "status": {"$ne": jobs.ITEM_PENDING}},
+            {"request": 0},
+        ).sort("index", 1)
+        async for item in cursor:
+            response = item.get("response") or {}
+            yield dumps({
+                "custom_id": item["customId"],
+                "status": item["status"],
+                "response": response.get("content"),
+                "model": response.get("model"),
+                "usage": response.get("usage"),
+                "error": item.get("error"),
+            }) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Stop an active job and its provider batches; finished items are kept."""
+    if not await jobs.cancel_job(get_db(), _job_id(job_id)):
+        raise HTTPException(status_code=409, detail="Job is not active")
+    return {"id": job_id, "status": jobs.STATUS_CANCELLED}
@@ -0,0 +1,15 @@
+"""Prometheus scrape endpoint."""
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core import metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Latency histograms and token/error counters in text exposition format."""
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type)
@@ -1,17 +1,43 @@
 """AI model and provider listing endpoints."""
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, Response
 from app.services.ai_providers import ProviderRegistry
+from app.services.model_catalog import catalog
+from app.services.routing import routing
+from app.services.scheduler import scheduler
 
 router = APIRouter()
 
 
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in tags or "*" in tags
+
+
 @router.get("/providers")
-async def list_providers():
-    """List all available AI providers and their models."""
-    return {
-        "providers": ProviderRegistry.list_providers(),
-    }
+async def list_providers(request: Request):
+    """List all available AI providers and their models.
+
+    Served from the in-memory model catalog; a matching ``If-None-Match``
+    gets a 304.
+    """
+    body, etag = catalog.payload()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@router.get("/providers/limits")
+async def provider_limits():
+    """Scheduler state per provider model: learned limits, queue and waits."""
+    return {"limits": scheduler.stats()}
+
+
+@router.get("/providers/circuits")
+async def provider_circuits():
+    """Circuit breaker state, error rate and p95 latency per provider."""
+    return {"circuits": routing.stats()}
 
 
 @router.get("/providers/{provider_name}/models")
@@ -20,7 +46,9 @@ async def list_models(provider_name: str):
     provider = ProviderRegistry.get(provider_name)
     if not provider:
         return {"error": f"Provider '{provider_name}' not available", "models": []}
+    entry = next(p for p in catalog.providers() if p["name"] == provider_name)
     return {
         "provider": provider_name,
-        "models": provider.available_models,
+        "models": entry["models"],
+        "model_details": entry["model_details"],
     }
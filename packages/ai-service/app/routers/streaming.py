@@ -1,20 +1,26 @@
 """Streaming AI response endpoint using Server-Sent Events."""
 
-import asyncio
-import json
+from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from app.core import phases
 from app.core.config import settings
+from app.core.serialization import JSONResponse, dumps
 from app.services.ai_providers import (
     ProviderRegistry,
     ChatRequest,
     ChatMessage,
 )
 from app.core.database import get_db
+from app.services import (
+    chat_pipeline, conversation_list, message_store, stream_sessions,
+)
+from app.services.chat_pipeline import ChatOptions
+from app.services.context_budget import ContextBudgetExceeded
 
 router = APIRouter()
 
@@ -26,6 +32,13 @@ class StreamMessageRequest(BaseModel):
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 2048
     system_prompt: Optional[str] = None
+    # Response cache: None follows the service default, True opts in,
+    # False bypasses. Cache hits are replayed over the same SSE stream.
+    cache: Optional[bool] = None
+    # Semantic cache for paraphrased first-turn questions; same semantics.
+    semantic_cache: Optional[bool] = None
+    # Share one upstream call with identical requests already in flight.
+    coalesce: bool = False
 
 
 @router.post("/conversations/{conversation_id}/stream")
@@ -34,9 +47,15 @@ async def stream_message(conversation_id: str, req: StreamMessageRequest):
     from bson import ObjectId
 
     db = get_db()
-    conv = await db.ai_conversations.find_one({"_id": ObjectId(conversation_id)})
-    if not conv:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    timer = phases.start()
+    max_messages, max_tokens = message_store.history_window(req.model)
+    with timer.phase(phases.DB_READ):
+        conv = await db.ai_conversations.find_one(
+            {"_id": ObjectId(conversation_id)},
+            message_store.header_projection(max_messages),
+        )
+        if not conv:
+            raise HTTPException(status_code=404, detail="Conversation not found")
 
     provider_name = req.provider or settings.DEFAULT_AI_PROVIDER
     provider = ProviderRegistry.get(provider_name)
@@ -46,103 +65,204 @@ async def stream_message(conversation_id: str, req: StreamMessageRequest):
             detail=f"Provider '{provider_name}' not available",
         )
 
-    # Build message history
-    messages = []
-    if req.system_prompt:
-        messages.append(ChatMessage(role="system", content=req.system_prompt))
+    with timer.phase(phases.DB_READ):
+        history = await message_store.load_recent_messages(
+            db, conv, max_messages, max_tokens
+        )
+
+    with timer.phase(phases.PROMPT_BUILD):
+        # Build message history
+        messages = []
+        if req.system_prompt:
+            messages.append(ChatMessage(role="system", content=req.system_prompt))
+        for msg in history:
+            messages.append(ChatMessage(role=msg["role"], content=msg["content"]))
 
-    for msg in conv.get("messages", []):
-        messages.append(ChatMessage(role=msg["role"], content=msg["content"]))
+        messages.append(ChatMessage(role="user", content=req.content))
 
-    messages.append(ChatMessage(role="user", content=req.content))
+        chat_request = ChatRequest(
+            messages=messages,
+            model=req.model,
+            temperature=(
+                req.temperature if req.temperature is not None
+                else settings.DEFAULT_TEMPERATURE
+            ),
+            max_tokens=req.max_tokens or 2048,
+            stream=True,
+        )
 
-    chat_request = ChatRequest(
-        messages=messages,
-        model=req.model,
-        temperature=req.temperature or 0.7,
-        max_tokens=req.max_tokens or 2048,
-        stream=True,
+    options = ChatOptions(
+        conversation_id=conversation_id,
+        application_id=conv.get("applicationId"),
+        cache=req.cache,
+        semantic_cache=req.semantic_cache,
+        coalesce=req.coalesce,
     )
+    try:
+        chat_request = chat_pipeline.prepare(provider, chat_request, options)
+    except ContextBudgetExceeded as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    async def event_generator():
-        from datetime import datetime
-
-        full_response = ""
-        stream = provider.chat_stream(chat_request)
-        try:
-            async for chunk in stream:
-                full_response += chunk
-                yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
-
-            # Stream completed normally — persist the exchange to MongoDB.
-            user_msg = {
-                "role": "user",
-                "content": req.content,
-                "timestamp": datetime.utcnow(),
-            }
-            assistant_msg = {
-                "role": "assistant",
-                "content": full_response,
-                "timestamp": datetime.utcnow(),
-                "metadata": {
-                    "model": req.model or "default",
-                    "provider": provider_name,
-                    "streamed": True,
-                },
-            }
-
-            await db.ai_conversations.update_one(
-                {"_id": ObjectId(conversation_id)},
-                {
-                    "$push": {"messages": {"$each": [user_msg, assistant_msg]}},
-                    "$set": {"updatedAt": datetime.utcnow()},
-                },
+    async def persist_exchange(full_response: str, usage: dict) -> None:
+        user_msg = {
+            "role": "user",
+            "content": req.content,
+            "timestamp": datetime.utcnow(),
+        }
+        assistant_msg = {
+            "role": "assistant",
+            "content": full_response,
+            "timestamp": datetime.utcnow(),
+            "metadata": {
+                "model": req.model or "default",
+                "provider": provider_name,
+                "streamed": True,
+                "streamId": session.id,
+                **usage,
+            },
+        }
+        timings = timer.as_dict()
+        if timings:
+            assistant_msg["metadata"]["timings"] = timings
+        with timer.phase(phases.DB_WRITE):
+            await message_store.append_messages(
+                db, ObjectId(conversation_id), [user_msg, assistant_msg]
             )
+        timer.report(
+            "chat_turn",
+            conversation_id=conversation_id,
+            provider=provider_name,
+            model=req.model,
+            stream_id=session.id,
+        )
 
-            yield f"data: {json.dumps({'type': 'done', 'content': full_response})}\n\n"
+    # Generation runs in a background session so it survives a client
+    # disconnect; this response is just its first subscriber.
+    session = stream_sessions.start_session(
+        conversation_id,
+        chat_pipeline.stream(provider, chat_request, options),
+        persist_exchange,
+    )
+
+    async def event_generator():
+        yield _sse_frame(None, {"type": "start", "stream_id": session.id})
+        async for event in session.follow():
+            yield _event_frame(event)
+
+    return _sse_response(event_generator(), session.id)
 
-        except (asyncio.CancelledError, GeneratorExit):
-            # Client disconnected mid-stream. Re-raise so Starlette closes the
-            # response cleanly; the finally block ensures the upstream generator
-            # releases its connection regardless of the exit path.
-            raise
-        except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
-        finally:
-            # aclose() is idempotent — safe to call even if the async for loop
-            # already closed the generator on normal exit or exception.
-            await stream.aclose()
 
+@router.get("/streams/{stream_id}")
+async def resume_stream(
+    stream_id: str,
+    last_event_id: Optional[str] = Header(None),
+    after: int = 0,
+):
+    """Resume a stream, replaying chunks after ``Last-Event-ID`` first.
+
+    Joins the live stream when the generation is still running in this
+    process, otherwise replays and follows it from MongoDB.
+    """
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+
+    session = stream_sessions.get_live_session(stream_id)
+    if session is not None:
+        events = session.follow(after)
+    else:
+        events = stream_sessions.replay_persisted(stream_id, after)
+        first = await anext(events, None)
+        if first is None:
+            raise HTTPException(status_code=404, detail="Stream not found")
+        events = _prepend(first, events)
+
+    async def event_generator():
+        async for event in events:
+            yield _event_frame(event)
+
+    return _sse_response(event_generator(), stream_id)
+
+
+async def _prepend(first, rest):
+    yield first
+    async for item in rest:
+        yield item
+
+
+def _sse_frame(seq: Optional[int], payload: dict) -> bytes:
+    prefix = b"id: %d\n" % seq if seq is not None else b""
+    return prefix + b"data: " + dumps(payload) + b"\n\n"
+
+
+# Everything up to the content value is fixed per event type, so a chunk
+# frame is two concatenations around one encoded string.
+_EVENT_PREFIXES: dict[str, bytes] = {}
+
+
+def _event_frame(event: stream_sessions.StreamEvent) -> bytes:
+    prefix = _EVENT_PREFIXES.get(event.type)
+    if prefix is None:
+        prefix = _EVENT_PREFIXES[event.type] = (
+            b'data: {"type":' + dumps(event.type) + b',"content":'
+        )
+    frame = prefix + dumps(event.content)
+    if event.usage:
+        frame += b',"usage":' + dumps(event.usage)
+    frame += b"}\n\n"
+    if event.seq is not None:
+        return b"id: %d\n" % event.seq + frame
+    return frame
+
+
+def _sse_response(events, stream_id: str) -> StreamingResponse:
     return StreamingResponse(
-        event_generator(),
+        events,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
+            "X-Stream-Id": stream_id,
         },
     )
 
 
 @router.get("/conversations/by-app/{application_id}")
-async def list_conversations(application_id: str, limit: int = 20, skip: int = 0):
-    """List conversations for an application."""
+async def list_conversations(
+    application_id: str,
+    limit: int = Query(20, ge=1),
+    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+):
+    """List conversations for an application, most recently updated first.
+
+    Pass ``next_cursor`` from a page as ``cursor`` to get the next one.
+    """
     db = get_db()
-    cursor = db.ai_conversations.find(
-        {"applicationId": application_id, "isArchived": False},
-        {"messages": {"$slice": -1}, "title": 1, "createdAt": 1, "updatedAt": 1, "metadata": 1},
-    ).sort("updatedAt", -1).skip(skip).limit(limit)
+    limit = min(limit, settings.CONVERSATION_LIST_MAX_LIMIT)
+    try:
+        page, next_cursor = await conversation_list.list_page(
+            db, application_id, limit, cursor, skip
+        )
+    except conversation_list.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    conversations = []
-    async for conv in cursor:
+    for conv in page:
         conv["_id"] = str(conv["_id"])
-        conversations.append(conv)
+        if "messages" not in conv:
+            last = conv.get("lastMessage")
+            conv["messages"] = [last] if last else []
 
-    total = await db.ai_conversations.count_documents(
-        {"applicationId": application_id, "isArchived": False}
+    total = (
+        await conversation_list.count(db, application_id)
+        if include_total else None
     )
-
-    return {"conversations": conversations, "total": total}
+    return JSONResponse({
+        "conversations": page,
+        "total": total,
+        "next_cursor": next_cursor,
+    })
 
 
 @router.delete("/conversations/{conversation_id}")
@@ -0,0 +1,30 @@
+"""Migrate legacy embedded-message conversations to bucketed storage.
+
+Run once after every ai-service replica is on the bucketed release:
+
+    python -m app.scripts.migrate_message_buckets
+
+Safe to re-run; conversations that are already bucketed are skipped.
+"""
+
+import asyncio
+
+from app.core import database
+from app.core.logging import setup_logging, get_logger
+from app.services.message_store import migrate_legacy_conversations
+
+logger = get_logger("agentbase.migrate")
+
+
+async def main() -> None:
+    await database.connect_db()
+    try:
+        migrated = await migrate_legacy_conversations(database.get_db())
+        logger.info("message_bucket_migration_complete", migrated=migrated)
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
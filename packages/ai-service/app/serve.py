@@ -0,0 +1,106 @@
+"""Production entry point: uvicorn with one worker process per CPU.
+
+    python -m app.serve
+
+A single event loop serialises JSON encoding, validation and SSE framing on
+one core; this runs ``AI_SERVICE_WORKERS`` processes (0 = one per available
+CPU) under uvicorn's supervisor, which restarts workers that die.
+
+Workers share state the same way replicas do: MongoDB holds conversations,
+stream chunks (a resume that lands on another worker replays from it), the
+job queue and, with ``RESPONSE_CACHE_MONGO``, cached answers. What stays
+per process is either a cache (BYOK clients, the in-memory response and
+semantic caches, request coalescing, circuit breakers) or is split evenly:
+the scheduler divides every rate budget by the worker count, which is
+exported here so each worker knows its share. Prometheus metrics are
+aggregated across workers through ``PROMETHEUS_MULTIPROC_DIR``.
+"""
+
+import glob
+import math
+import os
+import tempfile
+from typing import Optional
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+
+_CGROUP_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+_CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+_CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_quota() -> Optional[float]:
+    """CPUs allowed by the container's cgroup quota, or None if unlimited."""
+    cpu_max = _read(_CGROUP_CPU_MAX)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota, period = _read(_CGROUP_V1_QUOTA), _read(_CGROUP_V1_PERIOD)
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def available_cpus() -> int:
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return cpus
+
+
+def worker_count(configured: int, maximum: int) -> int:
+    if configured > 0:
+        return configured
+    return max(1, min(available_cpus(), maximum))
+
+
+def _prepare_metrics_dir() -> None:
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        path = tempfile.mkdtemp(prefix="agentbase-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    os.makedirs(path, exist_ok=True)
+    # Files from a previous run would be summed into this one's counters.
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def main() -> None:
+    import uvicorn
+
+    setup_logging()
+    workers = worker_count(
+        settings.AI_SERVICE_WORKERS, settings.AI_SERVICE_MAX_WORKERS
+    )
+    # Workers are fresh interpreters that read their settings from the
+    # environment; they need the resolved count to size their budgets.
+    os.environ["AI_SERVICE_WORKERS"] = str(workers)
+    if workers > 1:
+        _prepare_metrics_dir()
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=settings.AI_SERVICE_PORT,
+        workers=workers,
+        # Logging is configured by setup_logging, here and in each worker.
+        log_config=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
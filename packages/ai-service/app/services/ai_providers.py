@@ -1,9 +1,28 @@
 """AI provider abstraction layer supporting multiple LLM providers."""
 
+import asyncio
+import hashlib
+import importlib.util
+import json
+import time
 from abc import ABC, abstractmethod
-from typing import AsyncGenerator, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+import httpx
+import orjson  # type: ignore
 from pydantic import BaseModel
 
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.client_pool import ProviderClientPool
+from app.services.scheduler import observe_response
+from app.services.sse import aiter_events
+
+logger = get_logger("agentbase.providers")
+
 
 class ChatMessage(BaseModel):
     role: str  # system, user, assistant
@@ -25,9 +44,26 @@ class ChatResponse(BaseModel):
     usage: dict = {}
 
 
+class BatchItemResult(BaseModel):
+    """One entry of a finished provider batch, matched by ``custom_id``."""
+
+    custom_id: str
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
+
 class AIProvider(ABC):
     """Base class for AI providers."""
 
+    # Model used when a request does not name one.
+    default_model: str = ""
+    # Whether the provider has an asynchronous (discounted) batch API.
+    supports_batch: bool = False
+    # Most requests accepted in one batch submission.
+    max_batch_size: int = 0
+    # Pool key of a BYOK client; None for the platform provider.
+    tenant: Optional[str] = None
+
     @property
     @abstractmethod
     def name(self) -> str:
@@ -48,18 +84,94 @@ class AIProvider(ABC):
     ) -> AsyncGenerator[str, None]:
         pass
 
+    async def aclose(self) -> None:
+        """Release network resources held by the provider's client."""
+
+    async def list_models(self) -> Optional[list[dict]]:
+        """Models the provider serves right now, as ``{"id": ...}`` dicts
+        plus whatever limits it reports (``context_window``,
+        ``max_output_tokens``), or None without a list-models API.
+        """
+        return None
+
+    async def submit_batch(
+        self, requests: list[tuple[str, ChatRequest]]
+    ) -> str:
+        """Submit ``(custom_id, request)`` pairs; returns the batch id."""
+        raise NotImplementedError(f"{self.name} has no batch API")
+
+    async def batch_results(
+        self, batch_id: str
+    ) -> Optional[list[BatchItemResult]]:
+        """Results of a finished batch, or None while it is still running."""
+        raise NotImplementedError(f"{self.name} has no batch API")
+
+    async def cancel_batch(self, batch_id: str) -> None:
+        """Stop a submitted batch; results already produced stay billable."""
+        raise NotImplementedError(f"{self.name} has no batch API")
+
+
+def _usage(
+    prompt: int, completion: int, cache_read: int = 0, cache_write: int = 0
+) -> dict:
+    """Usage in our common shape. ``prompt_tokens`` includes any tokens read
+    from or written to a provider-side prompt cache; those are also broken
+    out when non-zero.
+    """
+    usage = {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+    }
+    if cache_read:
+        usage["cache_read_tokens"] = cache_read
+    if cache_write:
+        usage["cache_write_tokens"] = cache_write
+    return usage
+
+
+def _count(obj, name: str) -> int:
+    """An optional integer usage field; older SDKs and some models omit it."""
+    value = getattr(obj, name, None)
+    return value if isinstance(value, int) else 0
+
+
+# /v1/models also lists embedding, speech, image and moderation models.
+_OPENAI_CHAT_PREFIXES = ("gpt-", "chatgpt-", "o1", "o3", "o4")
+_OPENAI_NON_CHAT = (
+    "audio", "realtime", "transcribe", "tts", "image", "search", "instruct",
+)
+
+
+def _is_openai_chat_model(model_id: str) -> bool:
+    return model_id.startswith(_OPENAI_CHAT_PREFIXES) and not any(
+        part in model_id for part in _OPENAI_NON_CHAT
+    )
+
 
 class OpenAIProvider(AIProvider):
     """OpenAI GPT provider."""
 
+    default_model = "gpt-4"
+    supports_batch = True
+    max_batch_size = 50_000
+
     def __init__(self, api_key: str):
-        from openai import AsyncOpenAI
-        self.client = AsyncOpenAI(api_key=api_key)
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(
+                event_hooks={"response": [observe_response]}
+            ),
+        )
 
     @property
     def name(self) -> str:
         return "openai"
 
+    async def aclose(self) -> None:
+        await self.client.close()
+
     @property
     def available_models(self) -> list[str]:
         return [
@@ -67,8 +179,14 @@ class OpenAIProvider(AIProvider):
             "gpt-4o-mini", "gpt-3.5-turbo",
         ]
 
+    async def list_models(self) -> Optional[list[dict]]:
+        return [
+            {"id": m.id} async for m in self.client.models.list()
+            if _is_openai_chat_model(m.id)
+        ]
+
     async def chat(self, request: ChatRequest) -> ChatResponse:
-        model = request.model or "gpt-4"
+        model = request.model or self.default_model
         response = await self.client.chat.completions.create(
             model=model,
             messages=[  # type: ignore
@@ -78,29 +196,29 @@ class OpenAIProvider(AIProvider):
             temperature=request.temperature,
             max_tokens=request.max_tokens,
         )
+        usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        if response.usage:
+            # Automatic prompt caching reuses the longest previously seen
+            # prefix of 1024+ tokens; it only hits if the prefix is stable.
+            usage = _usage(
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens,
+                cache_read=_count(
+                    getattr(response.usage, "prompt_tokens_details", None),
+                    "cached_tokens",
+                ),
+            )
         return ChatResponse(
             content=response.choices[0].message.content or "",
             model=model,
             provider=self.name,
-            usage={
-                "prompt_tokens": (
-                    response.usage.prompt_tokens if response.usage else 0
-                ),
-                "completion_tokens": (
-                    response.usage.completion_tokens
-                    if response.usage
-                    else 0
-                ),
-                "total_tokens": (
-                    response.usage.total_tokens if response.usage else 0
-                ),
-            },
+            usage=usage,
         )
 
     async def chat_stream(
         self, request: ChatRequest
     ) -> AsyncGenerator[str, None]:
-        model = request.model or "gpt-4"
+        model = request.model or self.default_model
         stream = await self.client.chat.completions.create(
             model=model,
             messages=[  # type: ignore
@@ -115,138 +233,475 @@ class OpenAIProvider(AIProvider):
             if chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
 
+    async def submit_batch(
+        self, requests: list[tuple[str, ChatRequest]]
+    ) -> str:
+        lines = [
+            json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": request.model or self.default_model,
+                    "messages": [
+                        {"role": m.role, "content": m.content}
+                        for m in request.messages
+                    ],
+                    "temperature": request.temperature,
+                    "max_tokens": request.max_tokens,
+                },
+            })
+            for custom_id, request in requests
+        ]
+        upload = await self.client.files.create(
+            file=("batch.jsonl", "\n".join(lines).encode()),
+            purpose="batch",
+        )
+        batch = await self.client.batches.create(
+            input_file_id=upload.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    async def batch_results(
+        self, batch_id: str
+    ) -> Optional[list[BatchItemResult]]:
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        results = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    results.append(self._batch_entry(json.loads(line)))
+        return results
+
+    async def cancel_batch(self, batch_id: str) -> None:
+        await self.client.batches.cancel(batch_id)
+
+    def _batch_entry(self, entry: dict) -> BatchItemResult:
+        response = entry.get("response") or {}
+        body = response.get("body") or {}
+        if response.get("status_code") == 200:
+            usage = body.get("usage") or {}
+            details = usage.get("prompt_tokens_details") or {}
+            return BatchItemResult(
+                custom_id=entry["custom_id"],
+                response=ChatResponse(
+                    content=body["choices"][0]["message"]["content"] or "",
+                    model=body.get("model", ""),
+                    provider=self.name,
+                    usage=_usage(
+                        usage.get("prompt_tokens", 0),
+                        usage.get("completion_tokens", 0),
+                        cache_read=details.get("cached_tokens") or 0,
+                    ),
+                ),
+            )
+        error = entry.get("error") or body.get("error") or {}
+        return BatchItemResult(
+            custom_id=entry["custom_id"],
+            error=error.get("message") or "Batch request failed",
+        )
+
+
+_DEFAULT_SYSTEM = "You are a helpful assistant."
+_EPHEMERAL = {"type": "ephemeral"}
+
 
 class AnthropicProvider(AIProvider):
     """Anthropic Claude provider."""
 
+    default_model = "claude-sonnet-4-5-20250929"
+    supports_batch = True
+    max_batch_size = 100_000
+
     def __init__(self, api_key: str):
-        from anthropic import AsyncAnthropic
-        self.client = AsyncAnthropic(api_key=api_key)
+        from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+        self.client = AsyncAnthropic(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(
+                event_hooks={"response": [observe_response]}
+            ),
+        )
 
     @property
     def name(self) -> str:
         return "anthropic"
 
+    async def aclose(self) -> None:
+        await self.client.close()
+
     @property
     def available_models(self) -> list[str]:
         return ["claude-sonnet-4-5-20250929", "claude-haiku-4-5-20251001"]
 
-    async def chat(self, request: ChatRequest) -> ChatResponse:
-        model = request.model or "claude-sonnet-4-5-20250929"
-
-        # Separate system message from conversation
-        system = ""
-        messages = []
-        for m in request.messages:
+    def _split_system(
+        self, messages: list[ChatMessage]
+    ) -> tuple[str, list[dict]]:
+        """Separate system messages (joined in order) from the conversation."""
+        system_parts = []
+        conversation = []
+        for m in messages:
             if m.role == "system":
-                system = m.content
+                system_parts.append(m.content)
             else:
-                messages.append({"role": m.role, "content": m.content})
+                conversation.append({"role": m.role, "content": m.content})
+        return "\n\n".join(system_parts), conversation
+
+    def _prompt(
+        self, messages: list[ChatMessage]
+    ) -> tuple[list[dict], list[dict]]:
+        """System blocks and messages, with prompt-cache breakpoints.
+
+        Long prompts get a breakpoint after the system prompt and one on the
+        newest message. The next turn replays this one as its prefix, so it
+        reads everything up to that point from the cache and only the new
+        turn is processed (and written) at the full rate. Prompts below the
+        model's cacheable minimum are left alone by the API.
+        """
+        system, conversation = self._split_system(messages)
+        blocks = [{"type": "text", "text": system or _DEFAULT_SYSTEM}]
+        if not settings.PROMPT_CACHE_ENABLED:
+            return blocks, conversation
+        chars = len(system) + sum(len(m["content"]) for m in conversation)
+        if chars // 4 < settings.PROMPT_CACHE_MIN_TOKENS:
+            return blocks, conversation
+        blocks[0]["cache_control"] = _EPHEMERAL
+        if conversation:
+            last = conversation[-1]
+            conversation[-1] = {
+                "role": last["role"],
+                "content": [{
+                    "type": "text",
+                    "text": last["content"],
+                    "cache_control": _EPHEMERAL,
+                }],
+            }
+        return blocks, conversation
+
+    @staticmethod
+    def _usage(usage) -> dict:
+        # input_tokens excludes cache reads and writes; count them as prompt.
+        cache_read = _count(usage, "cache_read_input_tokens")
+        cache_write = _count(usage, "cache_creation_input_tokens")
+        return _usage(
+            usage.input_tokens + cache_read + cache_write,
+            usage.output_tokens,
+            cache_read=cache_read,
+            cache_write=cache_write,
+        )
+
+    async def chat(self, request: ChatRequest) -> ChatResponse:
+        model = request.model or self.default_model
+
+        system, messages = self._prompt(request.messages)
 
         response = await self.client.messages.create(
             model=model,
             max_tokens=request.max_tokens,
-            system=system if system else "You are a helpful assistant.",
+            system=system,  # type: ignore[arg-type]
             messages=messages,  # type: ignore[arg-type]
         )
         return ChatResponse(
             content=response.content[0].text,  # type: ignore[union-attr]
             model=model,
             provider=self.name,
-            usage={
-                "prompt_tokens": response.usage.input_tokens,
-                "completion_tokens": response.usage.output_tokens,
-                "total_tokens": (
-                    response.usage.input_tokens + response.usage.output_tokens
-                ),
-            },
+            usage=self._usage(response.usage),
         )
 
     async def chat_stream(
         self, request: ChatRequest
     ) -> AsyncGenerator[str, None]:
-        model = request.model or "claude-sonnet-4-5-20250929"
-        system = ""
-        messages = []
-        for m in request.messages:
-            if m.role == "system":
-                system = m.content
-            else:
-                messages.append({"role": m.role, "content": m.content})
+        model = request.model or self.default_model
+        system, messages = self._prompt(request.messages)
 
         async with self.client.messages.stream(
             model=model,
             max_tokens=request.max_tokens,
-            system=system if system else "You are a helpful assistant.",
+            system=system,  # type: ignore[arg-type]
             messages=messages,  # type: ignore[arg-type]
         ) as stream:
             async for text in stream.text_stream:
                 yield text
 
+    async def submit_batch(
+        self, requests: list[tuple[str, ChatRequest]]
+    ) -> str:
+        batch_requests = []
+        for custom_id, request in requests:
+            system, messages = self._prompt(request.messages)
+            batch_requests.append({
+                "custom_id": custom_id,
+                "params": {
+                    "model": request.model or self.default_model,
+                    "max_tokens": request.max_tokens,
+                    "system": system,
+                    "messages": messages,
+                },
+            })
+        batch = await self.client.beta.messages.batches.create(
+            requests=batch_requests  # type: ignore[arg-type]
+        )
+        return batch.id
+
+    async def batch_results(
+        self, batch_id: str
+    ) -> Optional[list[BatchItemResult]]:
+        batch = await self.client.beta.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+        results = []
+        async for entry in await self.client.beta.messages.batches.results(
+            batch_id
+        ):
+            if entry.result.type != "succeeded":
+                error = getattr(getattr(entry.result, "error", None), "error", None)
+                results.append(BatchItemResult(
+                    custom_id=entry.custom_id,
+                    error=getattr(error, "message", None) or entry.result.type,
+                ))
+                continue
+            message = entry.result.message
+            results.append(BatchItemResult(
+                custom_id=entry.custom_id,
+                response=ChatResponse(
+                    content=message.content[0].text,  # type: ignore[union-attr]
+                    model=message.model,
+                    provider=self.name,
+                    usage=self._usage(message.usage),
+                ),
+            ))
+        return results
+
+    async def cancel_batch(self, batch_id: str) -> None:
+        await self.client.beta.messages.batches.cancel(batch_id)
+
 
 class GeminiProvider(AIProvider):
-    """Google Gemini provider."""
+    """Google Gemini provider.
+
+    ``GenerativeModel`` handles are reused per (model, system instruction,
+    temperature, max tokens), least-recently-used beyond
+    ``GEMINI_MODEL_CACHE_SIZE``. With ``GEMINI_CONTEXT_CACHE_ENABLED``, a
+    system instruction of at least ``GEMINI_CONTEXT_CACHE_MIN_TOKENS`` is
+    uploaded once as cached content and later turns reference it by name,
+    so its tokens are neither resent nor billed at the full input rate.
+    """
+
+    default_model = "gemini-2.0-flash"
 
     def __init__(self, api_key: str):
         import google.generativeai as genai  # type: ignore
         self._genai = genai
-        genai.configure(api_key=api_key)
+        # genai.configure() is process-global, so every instance talks through
+        # its own client instead; otherwise one BYOK key could end up serving
+        # another tenant's request. The client is created lazily because its
+        # gRPC channel must be built inside the running event loop.
+        self._client_options = {"api_key": api_key}
+        self._async_client = None
+        self._cache_client = None
+        self._models: OrderedDict[tuple, object] = OrderedDict()
+        # (model, system digest) -> (cached content name or None if the
+        # upload failed, monotonic time to stop using it).
+        self._contexts: dict[tuple[str, str], tuple[Optional[str], float]] = {}
+        self._context_lock = asyncio.Lock()
 
     @property
     def name(self) -> str:
         return "gemini"
 
+    async def aclose(self) -> None:
+        # Cached handles are bound to the clients being closed.
+        self._models.clear()
+        if self._async_client is not None:
+            await self._async_client.transport.close()
+            self._async_client = None
+        if self._cache_client is not None:
+            await self._cache_client.transport.close()
+            self._cache_client = None
+
+    def _bind_client(self, model):
+        """Point a GenerativeModel at this provider's own async client."""
+        if self._async_client is None:
+            from google.ai import generativelanguage as glm  # type: ignore
+            self._async_client = glm.GenerativeServiceAsyncClient(
+                client_options=self._client_options
+            )
+        model._async_client = self._async_client
+        return model
+
     @property
     def available_models(self) -> list[str]:
         return ["gemini-2.0-flash", "gemini-1.5-pro", "gemini-1.5-flash"]
 
+    async def list_models(self) -> Optional[list[dict]]:
+        from google.ai import generativelanguage as glm  # type: ignore
+        async with glm.ModelServiceAsyncClient(
+            client_options=self._client_options
+        ) as client:
+            return [
+                {
+                    "id": m.name.removeprefix("models/"),
+                    "context_window": m.input_token_limit or None,
+                    "max_output_tokens": m.output_token_limit or None,
+                }
+                async for m in await client.list_models()
+                if "generateContent" in m.supported_generation_methods
+            ]
+
     def _build_contents(
         self, messages: list[ChatMessage]
     ) -> tuple[list[dict], str]:
         """Convert ChatMessages to Gemini format, extracting system
         instruction.
         """
-        system_instruction = ""
+        system_parts = []
         contents = []
         for m in messages:
             if m.role == "system":
-                system_instruction = m.content
+                system_parts.append(m.content)
             else:
                 # Gemini uses "model" instead of "assistant"
                 role = "model" if m.role == "assistant" else "user"
                 contents.append({"role": role, "parts": [{"text": m.content}]})
-        return contents, system_instruction
-
-    async def chat(self, request: ChatRequest) -> ChatResponse:
-        model_name = request.model or "gemini-2.0-flash"
-        contents, system_instruction = self._build_contents(request.messages)
+        return contents, "\n\n".join(system_parts)
+
+    def _model(
+        self,
+        model_name: str,
+        system_instruction: str,
+        request: ChatRequest,
+        cached_content: Optional[str] = None,
+    ):
+        key = (
+            model_name,
+            _digest(system_instruction),
+            request.temperature,
+            request.max_tokens,
+            cached_content,
+        )
+        model = self._models.get(key)
+        if model is not None:
+            self._models.move_to_end(key)
+            return model
 
         model_kwargs = {}
-        if system_instruction:
+        if system_instruction and not cached_content:
             model_kwargs["system_instruction"] = system_instruction
 
-        model = self._genai.GenerativeModel(
+        model = self._bind_client(self._genai.GenerativeModel(
             model_name=model_name,
             **model_kwargs,
             generation_config=self._genai.GenerationConfig(
                 temperature=request.temperature,
                 max_output_tokens=request.max_tokens,
             ),
+        ))
+        if cached_content:
+            # from_cached_content() would look the name up through the
+            # process-global client; the name is all a request needs.
+            model._cached_content = cached_content
+        self._models[key] = model
+        if len(self._models) > settings.GEMINI_MODEL_CACHE_SIZE:
+            self._models.popitem(last=False)
+        return model
+
+    async def _cached_context(
+        self, model_name: str, system_instruction: str
+    ) -> Optional[str]:
+        """Name of the cached content holding ``system_instruction``, creating
+        it on first use; None when the instruction is not worth caching.
+        """
+        if (
+            not settings.GEMINI_CONTEXT_CACHE_ENABLED
+            or len(system_instruction) // 4
+            < settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS
+        ):
+            return None
+        key = (model_name, _digest(system_instruction))
+        entry = self._contexts.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        async with self._context_lock:
+            entry = self._contexts.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            ttl = settings.GEMINI_CONTEXT_CACHE_TTL_SECONDS
+            try:
+                name = await self._create_context(
+                    model_name, system_instruction, ttl
+                )
+            except Exception as e:
+                # Models without caching support, or instructions under the
+                # API minimum, are retried only after a TTL.
+                logger.warning(
+                    "gemini_context_cache_failed", model=model_name, error=str(e)
+                )
+                name = None
+            # Stop referencing the content a little before the API drops it.
+            self._contexts[key] = (name, time.monotonic() + ttl * 0.9)
+            if len(self._contexts) > settings.GEMINI_MODEL_CACHE_SIZE:
+                del self._contexts[next(iter(self._contexts))]
+            return name
+
+    async def _create_context(
+        self, model_name: str, system_instruction: str, ttl: int
+    ) -> str:
+        from google.ai import generativelanguage as glm  # type: ignore
+        if self._cache_client is None:
+            self._cache_client = glm.CacheServiceAsyncClient(
+                client_options=self._client_options
+            )
+        if "/" not in model_name:
+            model_name = f"models/{model_name}"
+        cached = await self._cache_client.create_cached_content(
+            cached_content=glm.CachedContent(
+                model=model_name,
+                system_instruction=glm.Content(
+                    parts=[glm.Part(text=system_instruction)]
+                ),
+                ttl=timedelta(seconds=ttl),
+            )
+        )
+        logger.info(
+            "gemini_context_cached",
+            model=model_name,
+            name=cached.name,
+            tokens=cached.usage_metadata.total_token_count,
+        )
+        return cached.name
+
+    async def _prepare(self, request: ChatRequest):
+        model_name = request.model or self.default_model
+        contents, system_instruction = self._build_contents(request.messages)
+        cached_content = None
+        if system_instruction:
+            cached_content = await self._cached_context(
+                model_name, system_instruction
+            )
+        model = self._model(
+            model_name, system_instruction, request, cached_content
         )
+        return model_name, model, contents
 
+    async def chat(self, request: ChatRequest) -> ChatResponse:
+        model_name, model, contents = await self._prepare(request)
         response = await model.generate_content_async(contents)
 
         # Extract usage metadata
         usage = {}
         if hasattr(response, "usage_metadata") and response.usage_metadata:
             um = response.usage_metadata
-            prompt_tokens = getattr(um, "prompt_token_count", 0) or 0
-            completion_tokens = getattr(um, "candidates_token_count", 0) or 0
-            usage = {
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "total_tokens": prompt_tokens + completion_tokens,
-            }
+            usage = _usage(
+                getattr(um, "prompt_token_count", 0) or 0,
+                getattr(um, "candidates_token_count", 0) or 0,
+                cache_read=_count(um, "cached_content_token_count"),
+            )
 
         return ChatResponse(
             content=response.text,
@@ -258,44 +713,95 @@ class GeminiProvider(AIProvider):
     async def chat_stream(
         self, request: ChatRequest
     ) -> AsyncGenerator[str, None]:
-        model_name = request.model or "gemini-2.0-flash"
-        contents, system_instruction = self._build_contents(request.messages)
-
-        model_kwargs = {}
-        if system_instruction:
-            model_kwargs["system_instruction"] = system_instruction
-
-        model = self._genai.GenerativeModel(
-            model_name=model_name,
-            **model_kwargs,
-            generation_config=self._genai.GenerationConfig(
-                temperature=request.temperature,
-                max_output_tokens=request.max_tokens,
-            ),
-        )
-
+        _, model, contents = await self._prepare(request)
         response = await model.generate_content_async(contents, stream=True)
         async for chunk in response:
             if chunk.text:
                 yield chunk.text
 
 
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest() if text else ""
+
+
+class _SharedTransport(httpx.AsyncBaseTransport):
+    """Routes a client through the shared pool; closing the client leaves
+    the pool open for every other client using it.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(
+        self, request: httpx.Request
+    ) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
 class HuggingFaceProvider(AIProvider):
-    """HuggingFace Inference API provider."""
+    """HuggingFace Inference API provider, or a self-hosted
+    text-generation-inference server when ``HUGGINGFACE_BASE_URL`` is set.
+
+    Every instance (the platform key and pooled BYOK keys alike) sends its
+    requests over one pooled, keep-alive transport, HTTP/2 when ``h2`` is
+    installed, which ``close_transport`` shuts at service shutdown.
+    """
+
+    default_model = "mistralai/Mistral-7B-Instruct-v0.3"
+
+    _transport: Optional[httpx.AsyncHTTPTransport] = None
+    # A self-hosted server serves one model from /generate(_stream).
+    _self_hosted = False
 
     def __init__(self, api_key: str):
-        import httpx
-        self._api_key = api_key
+        base_url = settings.HUGGINGFACE_BASE_URL.rstrip("/")
+        self._self_hosted = bool(base_url)
         self._client = httpx.AsyncClient(
-            base_url="https://api-inference.huggingface.co",
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=120.0,
+            base_url=base_url or "https://api-inference.huggingface.co",
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=settings.HUGGINGFACE_TIMEOUT_SECONDS,
+            transport=_SharedTransport(self.shared_transport()),
+            event_hooks={"response": [observe_response]},
         )
 
+    @classmethod
+    def shared_transport(cls) -> httpx.AsyncHTTPTransport:
+        if cls._transport is None:
+            http2 = settings.HUGGINGFACE_HTTP2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning(
+                    "huggingface_http2_unavailable",
+                    detail="install httpx[http2] to enable HTTP/2",
+                )
+                http2 = False
+            cls._transport = httpx.AsyncHTTPTransport(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=settings.HUGGINGFACE_MAX_CONNECTIONS,
+                    max_keepalive_connections=(
+                        settings.HUGGINGFACE_MAX_KEEPALIVE_CONNECTIONS
+                    ),
+                    keepalive_expiry=settings.HUGGINGFACE_KEEPALIVE_EXPIRY_SECONDS,
+                ),
+            )
+        return cls._transport
+
+    @classmethod
+    async def close_transport(cls) -> None:
+        if cls._transport is not None:
+            transport, cls._transport = cls._transport, None
+            await transport.aclose()
+
     @property
     def name(self) -> str:
         return "huggingface"
 
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
     @property
     def available_models(self) -> list[str]:
         return [
@@ -319,12 +825,9 @@ class HuggingFaceProvider(AIProvider):
         parts.append("<|assistant|>\n")
         return "\n".join(parts)
 
-    async def chat(self, request: ChatRequest) -> ChatResponse:
-        model = request.model or "mistralai/Mistral-7B-Instruct-v0.3"
-        prompt = self._build_prompt(request.messages)
-
-        payload = {
-            "inputs": prompt,
+    def _payload(self, request: ChatRequest) -> dict:
+        return {
+            "inputs": self._build_prompt(request.messages),
             "parameters": {
                 "max_new_tokens": request.max_tokens,
                 "temperature": request.temperature,
@@ -332,9 +835,16 @@ class HuggingFaceProvider(AIProvider):
             },
         }
 
+    def _path(self, model: str, stream: bool) -> str:
+        if self._self_hosted:
+            return "/generate_stream" if stream else "/generate"
+        return f"/models/{model}"
+
+    async def chat(self, request: ChatRequest) -> ChatResponse:
+        model = request.model or self.default_model
         response = await self._client.post(
-            f"/models/{model}",
-            json=payload,
+            self._path(model, stream=False),
+            json=self._payload(request),
         )
         response.raise_for_status()
         data = response.json()
@@ -356,35 +866,45 @@ class HuggingFaceProvider(AIProvider):
     async def chat_stream(
         self, request: ChatRequest
     ) -> AsyncGenerator[str, None]:
-        model = request.model or "mistralai/Mistral-7B-Instruct-v0.3"
-        prompt = self._build_prompt(request.messages)
-
-        payload = {
-            "inputs": prompt,
-            "parameters": {
-                "max_new_tokens": request.max_tokens,
-                "temperature": request.temperature,
-                "return_full_text": False,
-            },
-            "stream": True,
-        }
+        model = request.model or self.default_model
+        payload = {**self._payload(request), "stream": True}
 
         async with self._client.stream(
             "POST",
-            f"/models/{model}",
+            self._path(model, stream=True),
             json=payload,
         ) as response:
             response.raise_for_status()
-            async for line in response.aiter_lines():
-                if line.startswith("data:"):
-                    import json
-                    try:
-                        chunk_data = json.loads(line[5:].strip())
-                        token = chunk_data.get("token", {}).get("text", "")
-                        if token:
-                            yield token
-                    except (json.JSONDecodeError, KeyError):
-                        continue
+            async for event in aiter_events(response.aiter_bytes()):
+                try:
+                    token = orjson.loads(event.data)["token"]
+                except (orjson.JSONDecodeError, KeyError, TypeError):
+                    continue
+                # Special tokens (end of sequence) are not part of the text.
+                if token.get("text") and not token.get("special"):
+                    yield token["text"]
+
+
+_PROVIDER_CLASSES: dict[str, type[AIProvider]] = {
+    "openai": OpenAIProvider,
+    "anthropic": AnthropicProvider,
+    "gemini": GeminiProvider,
+    "huggingface": HuggingFaceProvider,
+}
+
+
+def create_provider(name: str, api_key: str) -> Optional[AIProvider]:
+    """Instantiate a provider by name, or None if the name is unknown."""
+    provider_cls = _PROVIDER_CLASSES.get(name)
+    return provider_cls(api_key) if provider_cls else None
+
+
+def _create_byok_provider(name: str, api_key: str) -> Optional[AIProvider]:
+    provider = create_provider(name, api_key)
+    if provider is not None:
+        # Scheduled against the tenant's own limits, not the platform's.
+        provider.tenant = ProviderClientPool.key(name, api_key)
+    return provider
 
 
 class ProviderRegistry:
@@ -393,6 +913,13 @@ class ProviderRegistry:
     """
 
     _providers: dict[str, AIProvider] = {}
+    # BYOK clients, keyed by a hash of the caller's key. Never consulted by
+    # get(), so a tenant's key cannot serve a platform or another tenant's call.
+    _byok_pool = ProviderClientPool(
+        _create_byok_provider,
+        max_size=settings.BYOK_POOL_MAX_CLIENTS,
+        idle_ttl=settings.BYOK_POOL_IDLE_TTL_SECONDS,
+    )
 
     @classmethod
     def register(cls, provider: AIProvider):
@@ -402,6 +929,10 @@ class ProviderRegistry:
     def get(cls, name: str) -> Optional[AIProvider]:
         return cls._providers.get(name)
 
+    @classmethod
+    def providers(cls) -> list[AIProvider]:
+        return list(cls._providers.values())
+
     @classmethod
     def list_providers(cls) -> list[dict]:
         return [
@@ -423,23 +954,41 @@ class ProviderRegistry:
             cls.register(AnthropicProvider(anthropic_key))
         if gemini_key:
             cls.register(GeminiProvider(gemini_key))
-        if huggingface_key:
-            cls.register(HuggingFaceProvider(huggingface_key))
+        # A self-hosted inference server may not need a key.
+        if huggingface_key or settings.HUGGINGFACE_BASE_URL:
+            cls.register(HuggingFaceProvider(huggingface_key or ""))
 
     @classmethod
-    def get_ephemeral(cls, name: str, api_key: str) -> Optional[AIProvider]:
+    @asynccontextmanager
+    async def lease(
+        cls, name: str, api_key: Optional[str] = None
+    ) -> AsyncIterator[Optional[AIProvider]]:
+        """Yield the provider to use for one request, or None if unavailable.
+
+        Without ``api_key`` this is the platform provider. With one (BYOK),
+        a pooled client for exactly that key is reused across requests
+        instead of paying a fresh TLS handshake each time; it is held for
+        the duration of the ``async with`` so eviction never closes a client
+        mid-request.
         """
-        Create a one-time, non-cached provider instance using a
-        caller-supplied key. Used for BYOK (Bring Your Own Key) requests
-        so user keys are never stored in the registry and do not leak
-        across requests.
+        if not api_key:
+            yield cls.get(name)
+            return
+        entry = await cls._byok_pool.acquire(name, api_key)
+        if entry is None:
+            yield None
+            return
+        try:
+            yield entry.provider
+        finally:
+            await cls._byok_pool.release(entry)
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close pooled BYOK clients, platform provider clients and shared
+        transports.
         """
-        if name == "openai":
-            return OpenAIProvider(api_key)
-        if name == "anthropic":
-            return AnthropicProvider(api_key)
-        if name == "gemini":
-            return GeminiProvider(api_key)
-        if name == "huggingface":
-            return HuggingFaceProvider(api_key)
-        return None
+        await cls._byok_pool.aclose()
+        for provider in cls._providers.values():
+            await provider.aclose()
+        await HuggingFaceProvider.close_transport()
@@ -0,0 +1,265 @@
+"""Chat request pipeline shared by the send and stream routers.
+
+``prepare`` runs the stages that may reject a request before anything is
+sent upstream (context budgeting). ``complete`` and ``stream`` then wrap the
+provider call with the caches: exact-match first, then semantic. On a miss,
+requests that opt in with ``coalesce`` share an identical in-flight call,
+and every upstream call waits for a slot from the provider scheduler.
+"""
+
+import time
+from typing import AsyncGenerator, Optional
+
+from pydantic import BaseModel
+
+from app.core import metrics, phases
+from app.services.ai_providers import AIProvider, ChatRequest, ChatResponse
+from app.services.context_budget import context_budget
+from app.services.response_cache import cache_key, response_cache
+from app.services.scheduler import PRIORITY_INTERACTIVE, scheduler
+from app.services.semantic_cache import semantic_cache
+from app.services.single_flight import single_flight
+
+
+class ChatOptions(BaseModel):
+    """Per-request pipeline settings that are not part of the prompt."""
+
+    conversation_id: Optional[str] = None
+    # Cache scope: cached answers are never shared across applications.
+    application_id: Optional[str] = None
+    # None follows the service default; False bypasses caching entirely.
+    cache: Optional[bool] = None
+    semantic_cache: Optional[bool] = None
+    # Share one upstream call with identical requests already in flight.
+    coalesce: bool = False
+    # Scheduler priority; lower is dispatched first.
+    priority: int = PRIORITY_INTERACTIVE
+
+
+def _flight_key(
+    provider: AIProvider, request: ChatRequest, options: ChatOptions
+) -> str:
+    # BYOK providers carry their key's tenant; platform keys share None.
+    scope = f"{options.application_id or ''}:{getattr(provider, 'tenant', None) or ''}"
+    model = request.model or provider.default_model
+    return cache_key(provider.name, model, request, scope)
+
+
+def _estimate_tokens(request: ChatRequest) -> int:
+    # Providers charge max_tokens against the TPM budget up front.
+    return sum(len(m.content) for m in request.messages) // 4 + request.max_tokens
+
+
+async def _call(
+    provider: AIProvider, request: ChatRequest, options: ChatOptions
+) -> ChatResponse:
+    model = request.model or provider.default_model
+    observed = metrics.for_model(provider.name, model)
+    async with scheduler.slot(
+        provider.name, model, _estimate_tokens(request), options.priority,
+        tenant=getattr(provider, "tenant", None),
+    ) as slot:
+        start = time.perf_counter_ns()
+        try:
+            response = await provider.chat(request)
+        except Exception as e:
+            observed.failed.observe((time.perf_counter_ns() - start) / 1e9)
+            observed.error(e)
+            raise
+        end = time.perf_counter_ns()
+        elapsed = (end - start) / 1e9
+        observed.ok.observe(elapsed)
+        observed.usage(response.usage, elapsed)
+        # Only the attempt that answered counts; a hedged loser is cancelled
+        # before it gets here.
+        phases.current().record(phases.GENERATION, start, end)
+        if slot is not None:
+            slot.record_usage(response.usage.get("total_tokens", 0))
+        return response
+
+
+async def _call_stream(
+    provider: AIProvider, request: ChatRequest, options: ChatOptions
+) -> AsyncGenerator[str, None]:
+    model = request.model or provider.default_model
+    observed = metrics.for_model(provider.name, model)
+    timer = phases.current()
+    # The slot is held until the stream ends, since that is how long the
+    # provider counts the request as concurrent.
+    async with scheduler.slot(
+        provider.name, model, _estimate_tokens(request), options.priority,
+        tenant=getattr(provider, "tenant", None),
+    ):
+        upstream = provider.chat_stream(request)
+        start = last = time.perf_counter_ns()
+        first = 0
+        chars = 0
+        try:
+            async for chunk in upstream:
+                now = time.perf_counter_ns()
+                if first:
+                    observed.inter_token.observe((now - last) / 1e9)
+                else:
+                    first = now
+                    observed.ttft.observe((now - start) / 1e9)
+                    timer.record(phases.TTFT, start, now)
+                last = now
+                chars += len(chunk)
+                yield chunk
+        except Exception as e:
+            observed.failed.observe((time.perf_counter_ns() - start) / 1e9)
+            observed.error(e)
+            raise
+        finally:
+            await upstream.aclose()
+        observed.ok.observe((last - start) / 1e9)
+        if first:
+            timer.record(phases.GENERATION, first, last)
+        # Streams carry no usage; output tokens are estimated at 4 chars
+        # each, as for the scheduler's budget.
+        if last > first > 0 and chars >= 4:
+            observed.tps.observe(chars / 4 / ((last - first) / 1e9))
+
+
+class _CacheLookup:
+    """Cache keys for one request, computed once and used for read and write."""
+
+    def __init__(
+        self, provider: AIProvider, request: ChatRequest, options: ChatOptions
+    ):
+        bypass = options.cache is False
+        self.key = None if bypass else response_cache.key_for(
+            provider, request, options.cache, options.application_id
+        )
+        self.probe = None if bypass else semantic_cache.probe_for(
+            provider, request, options.application_id, options.semantic_cache
+        )
+
+    @property
+    def active(self) -> bool:
+        return bool(self.key or self.probe)
+
+    async def get(self) -> Optional[ChatResponse]:
+        if self.key:
+            cached = await response_cache.get(self.key)
+            if cached is not None:
+                return cached
+        if self.probe:
+            # Only embed once the exact cache has missed.
+            await semantic_cache.embed(self.probe)
+            return semantic_cache.lookup(self.probe)
+        return None
+
+    async def put(self, response: ChatResponse, latency_ms: float) -> None:
+        if self.key:
+            await response_cache.put(self.key, response)
+        if self.probe:
+            await semantic_cache.embed(self.probe)
+            semantic_cache.put(self.probe, response, latency_ms)
+
+
+def prepare(
+    provider: AIProvider, request: ChatRequest, options: ChatOptions
+) -> ChatRequest:
+    """Fit the request to its model's context window.
+
+    Raises ``ContextBudgetExceeded`` if it cannot fit.
+    """
+    with phases.current().phase(phases.PROMPT_BUILD):
+        return context_budget.apply(request, provider, options.conversation_id)
+
+
+async def complete(
+    provider: AIProvider, request: ChatRequest, options: ChatOptions
+) -> ChatResponse:
+    """Run a non-streaming chat request through the caches and provider."""
+    lookup = _CacheLookup(provider, request, options)
+    if lookup.active:
+        cached = await lookup.get()
+        if cached is not None:
+            return cached
+
+    start = time.perf_counter()
+    if options.coalesce:
+        response = await single_flight.chat(
+            _flight_key(provider, request, options),
+            lambda: _call(provider, request, options),
+        )
+    else:
+        response = await _call(provider, request, options)
+    if lookup.active:
+        # Followers got the leader's answer, which the leader caches.
+        if not response.usage.get("coalesced"):
+            await lookup.put(response, (time.perf_counter() - start) * 1000)
+        response.usage = {**response.usage, "cache": "miss"}
+    return response
+
+
+class ChatStream:
+    """Async iterator over response chunks.
+
+    ``usage`` is populated once the stream is exhausted; a cache hit replays
+    the stored answer as a single chunk without calling the provider.
+    """
+
+    def __init__(
+        self, provider: AIProvider, request: ChatRequest, options: ChatOptions
+    ):
+        self.usage: dict = {}
+        self._chunks = self._run(provider, request, options)
+
+    def __aiter__(self) -> AsyncGenerator[str, None]:
+        return self._chunks
+
+    async def aclose(self) -> None:
+        await self._chunks.aclose()
+
+    async def _run(
+        self, provider: AIProvider, request: ChatRequest, options: ChatOptions
+    ) -> AsyncGenerator[str, None]:
+        lookup = _CacheLookup(provider, request, options)
+        if lookup.active:
+            cached = await lookup.get()
+            if cached is not None:
+                self.usage = cached.usage
+                yield cached.content
+                return
+
+        parts: list[str] = []
+        start = time.perf_counter()
+        joined = False
+        if options.coalesce:
+            upstream, joined = single_flight.stream(
+                _flight_key(provider, request, options),
+                lambda: _call_stream(provider, request, options),
+            )
+            if joined:
+                self.usage = {"coalesced": True}
+        else:
+            upstream = _call_stream(provider, request, options)
+        try:
+            async for chunk in upstream:
+                if lookup.active:
+                    parts.append(chunk)
+                yield chunk
+        finally:
+            await upstream.aclose()
+
+        if lookup.active:
+            if not joined:
+                await lookup.put(
+                    ChatResponse(
+                        content="".join(parts),
+                        model=request.model or provider.default_model,
+                        provider=provider.name,
+                    ),
+                    (time.perf_counter() - start) * 1000,
+                )
+            self.usage = {**self.usage, "cache": "miss"}
+
+
+def stream(
+    provider: AIProvider, request: ChatRequest, options: ChatOptions
+) -> ChatStream:
+    """Run a streaming chat request through the caches and provider."""
+    return ChatStream(provider, request, options)
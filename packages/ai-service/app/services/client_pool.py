@@ -0,0 +1,107 @@
+"""Keyed, bounded pool of provider clients for BYOK requests.
+
+Entries are keyed by a SHA-256 digest of ``provider:api_key`` so the pool
+itself never stores raw keys; the only copy lives inside the provider's SDK
+client for as long as that client is alive. Entries idle longer than the
+TTL, or least-recently-used beyond the size cap, are evicted and closed —
+deferred until the last in-flight request using them has released them.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from app.core.logging import get_logger
+
+logger = get_logger("agentbase.client_pool")
+
+
+class PooledClient:
+    """A pooled provider plus its bookkeeping."""
+
+    __slots__ = ("provider", "last_used", "in_use", "evicted")
+
+    def __init__(self, provider: Any):
+        self.provider = provider
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.evicted = False
+
+
+class ProviderClientPool:
+    def __init__(
+        self,
+        factory: Callable[[str, str], Any],
+        max_size: int,
+        idle_ttl: float,
+    ):
+        self._factory = factory
+        self._max_size = max_size
+        self._idle_ttl = idle_ttl
+        self._entries: OrderedDict[str, PooledClient] = OrderedDict()
+
+    @staticmethod
+    def key(name: str, api_key: str) -> str:
+        """Pool key for ``(name, api_key)``; safe to log or use as an id."""
+        return hashlib.sha256(f"{name}:{api_key}".encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def acquire(self, name: str, api_key: str) -> Optional[PooledClient]:
+        """Return a leased client for ``(name, api_key)``, creating it if needed.
+
+        Returns None when ``name`` is not a known provider. Every successful
+        acquire must be paired with :meth:`release`.
+        """
+        key = self.key(name, api_key)
+        await self._evict_expired()
+        entry = self._entries.get(key)
+        if entry is None:
+            provider = self._factory(name, api_key)
+            if provider is None:
+                return None
+            entry = self._entries[key] = PooledClient(provider)
+            while len(self._entries) > self._max_size:
+                _, oldest = self._entries.popitem(last=False)
+                await self._retire(oldest)
+        else:
+            self._entries.move_to_end(key)
+        entry.in_use += 1
+        entry.last_used = time.monotonic()
+        return entry
+
+    async def release(self, entry: PooledClient) -> None:
+        entry.in_use -= 1
+        entry.last_used = time.monotonic()
+        if entry.evicted and entry.in_use == 0:
+            await self._close(entry)
+
+    async def aclose(self) -> None:
+        """Close every pooled client (service shutdown)."""
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for entry in entries:
+            await self._close(entry)
+
+    async def _evict_expired(self) -> None:
+        deadline = time.monotonic() - self._idle_ttl
+        # Entries are in LRU order, so the expired ones are at the front.
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.last_used > deadline or entry.in_use:
+                break
+            del self._entries[key]
+            await self._retire(entry)
+
+    async def _retire(self, entry: PooledClient) -> None:
+        entry.evicted = True
+        if entry.in_use == 0:
+            await self._close(entry)
+
+    async def _close(self, entry: PooledClient) -> None:
+        try:
+            await entry.provider.aclose()
+        except Exception as e:
+            logger.warning("byok_client_close_failed", error=str(e))
@@ -0,0 +1,187 @@
+"""Token-aware context budgeting applied before a request reaches a provider.
+
+Every chat request is checked against the target model's context window,
+leaving ``max_tokens`` of headroom for the reply. When the prompt does not
+fit, the oldest whole turns (a user message and the replies to it) are
+dropped, so the history still opens on a user message. A short note that
+history was elided is prepended to the first user message kept, rather
+than added as a system message, so the system prompt (which Anthropic and
+Gemini cache ahead of the history) stays byte-identical. System prompts and
+the final message are never dropped; if those alone do not fit, the request
+is rejected locally instead of after a full upstream round trip.
+
+Models without a known context window (from ``CONTEXT_WINDOWS`` or the
+model catalog) are not trimmed: guessing too small a window would cut
+history the model could have used, so the provider decides instead.
+"""
+
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.ai_providers import AIProvider, ChatMessage, ChatRequest
+from app.services.model_catalog import catalog
+
+logger = get_logger("agentbase.context")
+
+# Per-message framing overhead (role markers, separators) and the tokens
+# the provider spends priming the assistant reply.
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+_MAX_CACHED_CONVERSATIONS = 1024
+
+
+class ContextBudgetExceeded(ValueError):
+    """Raised when the non-droppable part of a prompt cannot fit."""
+
+
+def _heuristic_tokens(text: str) -> int:
+    # ~4 characters per token holds well for English across BPE tokenizers.
+    return (len(text) + 3) // 4
+
+
+def _load_tokenizer() -> Callable[[str], int]:
+    """Use tiktoken when it is installed, otherwise the character heuristic."""
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        return _heuristic_tokens
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def context_window(model: str) -> Optional[int]:
+    """Return the total context window for ``model``, or None if unknown."""
+    window = settings.CONTEXT_WINDOWS.get(model)
+    if window is None:
+        info = catalog.get(model)
+        window = info and info["context_window"]
+    return window or None
+
+
+class TokenCountCache:
+    """Per-conversation memo of message token counts.
+
+    History is replayed on every turn, so counting each message once per
+    conversation keeps estimation off the hot path when a real tokenizer is
+    in use. Conversations are evicted least-recently-used.
+    """
+
+    def __init__(self, max_conversations: int = _MAX_CACHED_CONVERSATIONS):
+        self._max = max_conversations
+        self._entries: OrderedDict[str, dict[int, int]] = OrderedDict()
+
+    def counts_for(self, conversation_id: str) -> dict[int, int]:
+        counts = self._entries.get(conversation_id)
+        if counts is None:
+            counts = self._entries[conversation_id] = {}
+            if len(self._entries) > self._max:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(conversation_id)
+        return counts
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ContextBudget:
+    """Pipeline stage that fits a ``ChatRequest`` into its model's window."""
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None):
+        self._count_tokens = count_tokens or _load_tokenizer()
+        self.cache = TokenCountCache()
+
+    def message_tokens(
+        self, message: ChatMessage, counts: Optional[dict[int, int]] = None
+    ) -> int:
+        if counts is None:
+            return self._count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+        key = hash((message.role, message.content))
+        tokens = counts.get(key)
+        if tokens is None:
+            tokens = self._count_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS
+            counts[key] = tokens
+        return tokens
+
+    def apply(
+        self,
+        request: ChatRequest,
+        provider: AIProvider,
+        conversation_id: Optional[str] = None,
+    ) -> ChatRequest:
+        """Return ``request``, trimmed if needed to fit the model's window."""
+        model = request.model or provider.default_model
+        window = context_window(model)
+        if window is None:
+            return request
+        budget = window - request.max_tokens - REPLY_PRIMING_TOKENS
+        counts = self.cache.counts_for(conversation_id) if conversation_id else None
+        sizes = [self.message_tokens(m, counts) for m in request.messages]
+        total = sum(sizes)
+        if total <= budget:
+            return request
+
+        # System prompts and the newest message are pinned; everything else
+        # is droppable, a whole turn at a time, oldest first.
+        last = len(request.messages) - 1
+        pinned = {
+            i for i, m in enumerate(request.messages)
+            if m.role == "system" or i == last
+        }
+        pinned_total = sum(sizes[i] for i in pinned)
+        placeholder_cost = MESSAGE_OVERHEAD_TOKENS + 16
+        if pinned_total + placeholder_cost > budget:
+            raise ContextBudgetExceeded(
+                f"Prompt needs ~{pinned_total} tokens but model '{model}' "
+                f"leaves {budget} after reserving {request.max_tokens} "
+                "for the reply."
+            )
+
+        turns: list[list[int]] = []
+        for i, m in enumerate(request.messages):
+            if i in pinned:
+                continue
+            if m.role == "user" or not turns:
+                turns.append([i])
+            else:
+                turns[-1].append(i)
+
+        dropped: set[int] = set()
+        for turn in turns:
+            if total + placeholder_cost <= budget:
+                break
+            dropped.update(turn)
+            total -= sum(sizes[i] for i in turn)
+
+        note = (
+            f"[{len(dropped)} earlier messages omitted to fit the context "
+            "window]"
+        )
+        kept: list[ChatMessage] = []
+        placed = False
+        for i, m in enumerate(request.messages):
+            if i in dropped:
+                continue
+            if not placed and m.role != "system":
+                if m.role == "user":
+                    m = m.model_copy(update={"content": f"{note}\n\n{m.content}"})
+                else:
+                    kept.append(ChatMessage(role="user", content=note))
+                placed = True
+            kept.append(m)
+
+        logger.info(
+            "context_trimmed",
+            model=model,
+            conversation_id=conversation_id,
+            dropped=len(dropped),
+            prompt_tokens=total,
+            budget=budget,
+        )
+        return request.model_copy(update={"messages": kept})
+
+
+context_budget = ContextBudget()
@@ -0,0 +1,127 @@
+"""Keyset pagination over an application's conversations.
+
+Pages are ordered by ``(updatedAt, _id)`` descending and continue from an
+opaque cursor holding the last row's key, so every page is a bounded walk
+of the ``app_listing`` index however deep it is; ``skip`` is still accepted
+for the first page but costs O(skip) index entries. The walk projects only
+indexed fields, so it is a covered query that reads no documents; the
+page's headers (title, metadata, last message) are then fetched by ``_id``
+in a second query, which reads exactly ``limit`` documents. Totals are a count over the equality
+prefix of the same index and are cached per application for
+``CONVERSATION_COUNT_TTL_SECONDS``, so paging does not recount on every
+call; a total can lag new or archived conversations by up to that long.
+"""
+
+import base64
+import binascii
+import time
+from datetime import datetime
+from typing import Optional
+
+import orjson  # type: ignore
+from bson import ObjectId  # type: ignore
+from bson.errors import InvalidId  # type: ignore
+from pymongo import IndexModel  # type: ignore
+
+from app.core.config import settings
+from app.core.database import IndexSpec
+
+SORT = [("updatedAt", -1), ("_id", -1)]
+
+# Only fields in ``app_listing``, so the page walk is served from the index.
+KEY_PROJECTION = {"_id": 1, "updatedAt": 1}
+
+# Legacy documents still embed messages; bucketed ones carry lastMessage on
+# the header.
+PROJECTION = {
+    "messages": {"$slice": -1},
+    "lastMessage": 1,
+    "messageCount": 1,
+    "title": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "metadata": 1,
+}
+
+_COUNT_CACHE_MAX_APPS = 4096
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+INDEXES: list[IndexSpec] = [
+    ("ai_conversations", IndexModel(
+        [("applicationId", 1), ("isArchived", 1), *SORT], name="app_listing"
+    )),
+]
+
+
+def encode_cursor(conv: dict) -> str:
+    key = [conv["updatedAt"].isoformat(), str(conv["_id"])]
+    return base64.urlsafe_b64encode(orjson.dumps(key)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, oid = orjson.loads(raw)
+        return datetime.fromisoformat(updated_at), ObjectId(oid)
+    except (binascii.Error, orjson.JSONDecodeError, InvalidId,
+            TypeError, ValueError):
+        raise InvalidCursor("Invalid cursor") from None
+
+
+def _filter(application_id: str) -> dict:
+    return {"applicationId": application_id, "isArchived": False}
+
+
+async def list_page(
+    db,
+    application_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0,
+) -> tuple[list[dict], Optional[str]]:
+    """One page of conversation headers and the cursor for the next page
+    (None on the last page).
+    """
+    query = _filter(application_id)
+    if cursor:
+        updated_at, oid = decode_cursor(cursor)
+        query["$or"] = [
+            {"updatedAt": {"$lt": updated_at}},
+            {"updatedAt": updated_at, "_id": {"$lt": oid}},
+        ]
+    find = db.ai_conversations.find(query, KEY_PROJECTION).sort(SORT)
+    if skip and not cursor:
+        find = find.skip(skip)
+    # One extra row tells us whether there is a next page.
+    keys = await find.limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = encode_cursor(keys[limit - 1]) if len(keys) > limit else None
+    ids = [key["_id"] for key in keys[:limit]]
+    if not ids:
+        return [], next_cursor
+    docs = await db.ai_conversations.find(
+        {"_id": {"$in": ids}}, PROJECTION
+    ).to_list(length=len(ids))
+    by_id = {doc["_id"]: doc for doc in docs}
+    # A conversation deleted between the two reads is left out.
+    return [by_id[i] for i in ids if i in by_id], next_cursor
+
+
+_counts: dict[str, tuple[float, int]] = {}
+
+
+async def count(db, application_id: str) -> int:
+    ttl = settings.CONVERSATION_COUNT_TTL_SECONDS
+    now = time.monotonic()
+    cached = _counts.get(application_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    total = await db.ai_conversations.count_documents(_filter(application_id))
+    if ttl > 0:
+        if len(_counts) >= _COUNT_CACHE_MAX_APPS:
+            _counts.clear()
+        _counts[application_id] = (now + ttl, total)
+    return total
@@ -0,0 +1,141 @@
+"""Deterministic offline provider for local development, tests and load tests.
+
+Registered as ``fake`` when ``FAKE_PROVIDER_ENABLED`` is set. It answers by
+echoing the last user message (padded to ``output_tokens`` words), streams
+word by word, reports word-count usage and implements the batch API in
+memory (a batch is finished on the first poll), so the chat, streaming,
+batch and job pipelines can all be exercised without network access or API
+keys.
+
+For load tests it simulates a real upstream: ``latency_ms`` before the
+first token, then ``tokens_per_second``, and a share of calls failing with
+a 500-style error or a 429 that the scheduler treats as a rate limit. With
+a ``seed`` the failure pattern is reproducible.
+"""
+
+import asyncio
+import random
+import uuid
+from typing import AsyncGenerator, Optional
+
+from app.services.ai_providers import (
+    AIProvider,
+    BatchItemResult,
+    ChatRequest,
+    ChatResponse,
+)
+
+
+class FakeProviderError(RuntimeError):
+    """Simulated upstream failure; ``status_code`` 429 is a rate limit."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeProvider(AIProvider):
+    """Echo provider with configurable latency, token rate and failures."""
+
+    default_model = "fake-echo"
+    supports_batch = True
+    max_batch_size = 10_000
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        tokens_per_second: float = 0.0,
+        output_tokens: int = 0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self._latency = latency_ms / 1000
+        # 0 means the whole answer is available at once.
+        self._token_interval = 1 / tokens_per_second if tokens_per_second else 0.0
+        self._output_tokens = output_tokens
+        self._error_rate = error_rate
+        self._rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._batches: dict[str, list[BatchItemResult]] = {}
+
+    @property
+    def name(self) -> str:
+        return "fake"
+
+    @property
+    def available_models(self) -> list[str]:
+        return ["fake-echo"]
+
+    def _answer(self, request: ChatRequest) -> ChatResponse:
+        question = next(
+            (m.content for m in reversed(request.messages) if m.role == "user"),
+            "",
+        )
+        words = f"echo: {question}".split(" ")
+        if len(words) < self._output_tokens:
+            words += ["lorem"] * (self._output_tokens - len(words))
+        content = " ".join(words)
+        prompt_tokens = sum(len(m.content.split()) for m in request.messages)
+        completion_tokens = len(content.split())
+        return ChatResponse(
+            content=content,
+            model=request.model or self.default_model,
+            provider=self.name,
+            usage={
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        )
+
+    def _maybe_fail(self) -> None:
+        if not (self._error_rate or self._rate_limit_rate):
+            return
+        roll = self._random.random()
+        if roll < self._rate_limit_rate:
+            raise FakeProviderError(429, "Simulated rate limit")
+        if roll < self._rate_limit_rate + self._error_rate:
+            raise FakeProviderError(500, "Simulated upstream error")
+
+    async def chat(self, request: ChatRequest) -> ChatResponse:
+        self._maybe_fail()
+        response = self._answer(request)
+        delay = self._latency + self._token_interval * (
+            response.usage["completion_tokens"] - 1
+        )
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return response
+
+    async def chat_stream(
+        self, request: ChatRequest
+    ) -> AsyncGenerator[str, None]:
+        self._maybe_fail()
+        words = self._answer(request).content.split(" ")
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        for i, word in enumerate(words):
+            if i and self._token_interval:
+                await asyncio.sleep(self._token_interval)
+            yield word if i == 0 else f" {word}"
+
+    async def submit_batch(
+        self, requests: list[tuple[str, ChatRequest]]
+    ) -> str:
+        batch_id = f"fakebatch_{uuid.uuid4().hex}"
+        self._batches[batch_id] = [
+            BatchItemResult(custom_id=custom_id, response=self._answer(request))
+            for custom_id, request in requests
+        ]
+        return batch_id
+
+    async def batch_results(
+        self, batch_id: str
+    ) -> Optional[list[BatchItemResult]]:
+        if batch_id not in self._batches:
+            raise KeyError(f"Unknown batch '{batch_id}'")
+        return self._batches.pop(batch_id)
+
+    async def cancel_batch(self, batch_id: str) -> None:
+        self._batches.pop(batch_id, None)
@@ -0,0 +1,582 @@
+"""Offline bulk chat jobs.
+
+A job is a JSONL file of chat requests submitted in one go and processed in
+the background. Jobs (``ai_jobs``) and their items (``ai_job_items``) live in
+MongoDB; a worker started from the app lifespan claims queued jobs one at a
+time with an atomic ``find_one_and_update``, so several replicas can share
+the queue. While a job runs, a background heartbeat refreshes it every
+``JOBS_HEARTBEAT_SECONDS``; a job whose worker stops heartbeating for
+``JOBS_STALE_SECONDS`` is picked up again. Every write checks that the
+worker still holds the job, so a worker that lost it stops writing.
+
+Providers with a batch API (OpenAI, Anthropic, the fake provider) get the
+whole job packed into as few batch submissions as their limits allow. The
+job is then ``submitted`` and the worker moves on; a separate poll pass
+collects finished batches every ``JOBS_BATCH_POLL_SECONDS``, so a long
+batch never holds up the queue. A poll that fails (a network error or a
+5xx from the provider) is retried on the next pass; only after
+``JOBS_BATCH_POLL_MAX_FAILURES`` failures in a row is the job failed and
+its batches cancelled upstream. A batch the provider ends as failed or
+expired is collected like any other, and items it has no result for
+become errors. The submitted batch ids are stored on the
+job, so a restarted worker resumes polling instead of paying twice, and
+cancelling the job cancels its unfinished batches upstream. Other providers
+run through the normal pipeline at batch priority,
+``JOBS_LOCAL_CONCURRENCY`` at a time, with results written back in chunks.
+"""
+
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Optional
+
+from pymongo import IndexModel, ReturnDocument, UpdateOne  # type: ignore
+
+from app.core.config import settings
+from app.core.database import IndexSpec, get_db
+from app.core.logging import get_logger
+from app.services import chat_pipeline
+from app.services.ai_providers import (
+    AIProvider,
+    BatchItemResult,
+    ChatRequest,
+    ProviderRegistry,
+)
+from app.services.chat_pipeline import ChatOptions
+from app.services.scheduler import PRIORITY_BATCH
+
+logger = get_logger("agentbase.jobs")
+
+JOBS_COLLECTION = "ai_jobs"
+ITEMS_COLLECTION = "ai_job_items"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+# Handed to the provider's batch API; polled by the worker's poll pass.
+STATUS_SUBMITTED = "submitted"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING, STATUS_SUBMITTED]
+
+ITEM_PENDING = "pending"
+ITEM_DONE = "done"
+ITEM_ERROR = "error"
+
+MODE_PROVIDER_BATCH = "provider_batch"
+MODE_LOCAL = "local"
+
+_INSERT_CHUNK = 1000
+
+
+def _chunks(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+async def submit_job(
+    db,
+    requests: list[tuple[str, ChatRequest]],
+    provider: str,
+    application_id: Optional[str] = None,
+) -> dict:
+    """Persist a queued job for ``(custom_id, request)`` pairs."""
+    now = datetime.utcnow()
+    job = {
+        "status": STATUS_QUEUED,
+        "provider": provider,
+        "applicationId": application_id,
+        "mode": None,
+        "total": len(requests),
+        "succeeded": 0,
+        "failed": 0,
+        "providerBatches": [],
+        "collectedBatches": [],
+        "error": None,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+    result = await db[JOBS_COLLECTION].insert_one(job)
+    job["_id"] = result.inserted_id
+    items = [
+        {
+            "jobId": job["_id"],
+            "index": index,
+            "customId": custom_id,
+            "request": request.model_dump(exclude={"stream"}),
+            "status": ITEM_PENDING,
+        }
+        for index, (custom_id, request) in enumerate(requests)
+    ]
+    for chunk in _chunks(items, _INSERT_CHUNK):
+        await db[ITEMS_COLLECTION].insert_many(chunk, ordered=False)
+    return job
+
+
+async def cancel_job(db, job_id: Any) -> bool:
+    """Cancel an active job and any provider batch still running for it;
+    returns False if the job already ended.
+    """
+    job = await db[JOBS_COLLECTION].find_one_and_update(
+        {"_id": job_id, "status": {"$in": ACTIVE_STATUSES}},
+        {"$set": {"status": STATUS_CANCELLED, "updatedAt": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is None:
+        return False
+    pending = _uncollected(job)
+    provider = ProviderRegistry.get(job["provider"])
+    if pending and provider is not None:
+        await _cancel_batches(provider, pending)
+    return True
+
+
+async def claim_next(db, worker_id: str) -> Optional[dict]:
+    """Atomically take the oldest queued (or abandoned running) job."""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.JOBS_STALE_SECONDS)
+    return await db[JOBS_COLLECTION].find_one_and_update(
+        {"$or": [
+            {"status": STATUS_QUEUED},
+            {"status": STATUS_RUNNING, "updatedAt": {"$lt": stale}},
+        ]},
+        {"$set": {
+            "status": STATUS_RUNNING,
+            "worker": worker_id,
+            "updatedAt": now,
+            "startedAt": now,
+        }},
+        sort=[("createdAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _next_poll(now: datetime) -> datetime:
+    return now + timedelta(seconds=settings.JOBS_BATCH_POLL_SECONDS)
+
+
+async def claim_submitted(
+    db, worker_id: str, skip: Optional[list] = None
+) -> Optional[dict]:
+    """Atomically take a submitted job whose batches are due for a poll,
+    other than the ids in ``skip``.
+
+    Claiming pushes ``nextPollAt`` forward, so other workers skip the job
+    until then; if this worker dies mid-poll, the job comes due again.
+    """
+    now = datetime.utcnow()
+    return await db[JOBS_COLLECTION].find_one_and_update(
+        {
+            "_id": {"$nin": skip or []},
+            "status": STATUS_SUBMITTED,
+            "nextPollAt": {"$lte": now},
+        },
+        {"$set": {
+            "worker": worker_id,
+            "updatedAt": now,
+            "nextPollAt": _next_poll(now),
+        }},
+        sort=[("nextPollAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _owned(job_id: Any, worker_id: str, status: Any = STATUS_RUNNING) -> dict:
+    """Filter matching the job only while ``worker_id`` still holds it."""
+    return {"_id": job_id, "status": status, "worker": worker_id}
+
+
+async def _still_running(db, job_id: Any, worker_id: str) -> bool:
+    """Heartbeat the job; False once it was cancelled or another worker
+    took it over.
+    """
+    result = await db[JOBS_COLLECTION].update_one(
+        _owned(job_id, worker_id),
+        {"$set": {"updatedAt": datetime.utcnow()}},
+    )
+    return result.matched_count == 1
+
+
+@asynccontextmanager
+async def _heartbeat(db, job_id: Any, worker_id: str) -> AsyncIterator[None]:
+    """Keep a running job's ``updatedAt`` fresh for as long as it is worked
+    on, however long a single chunk takes, so it is not reclaimed as stale.
+    """
+
+    async def beat() -> None:
+        while True:
+            await asyncio.sleep(settings.JOBS_HEARTBEAT_SECONDS)
+            try:
+                if not await _still_running(db, job_id, worker_id):
+                    return
+            except Exception as e:
+                logger.warning(
+                    "job_heartbeat_failed", job_id=str(job_id), error=str(e)
+                )
+
+    task = asyncio.create_task(beat())
+    try:
+        yield
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _pending_items(db, job_id: Any) -> list[dict]:
+    cursor = db[ITEMS_COLLECTION].find(
+        {"jobId": job_id, "status": ITEM_PENDING},
+        {"index": 1, "request": 1},
+    ).sort("index", 1)
+    return [item async for item in cursor]
+
+
+async def _record(
+    db, job_id: Any, worker_id: str, results: list[BatchItemResult]
+) -> bool:
+    """Write item results and bump the job's counters.
+
+    Returns False, writing nothing, once ``worker_id`` no longer holds the
+    job. Counters follow the items actually updated, so results written
+    twice for one item are only counted once.
+    """
+    if not results:
+        return True
+    now = datetime.utcnow()
+    owner = await db[JOBS_COLLECTION].update_one(
+        _owned(job_id, worker_id, {"$in": [STATUS_RUNNING, STATUS_SUBMITTED]}),
+        {"$set": {"updatedAt": now}},
+    )
+    if owner.matched_count == 0:
+        return False
+    done, errors = [], []
+    for result in results:
+        if result.response is not None:
+            ops, update = done, {
+                "status": ITEM_DONE,
+                "response": result.response.model_dump(),
+                "finishedAt": now,
+            }
+        else:
+            ops, update = errors, {
+                "status": ITEM_ERROR,
+                "error": result.error or "Unknown error",
+                "finishedAt": now,
+            }
+        ops.append(UpdateOne(
+            {"jobId": job_id, "index": int(result.custom_id),
+             "status": ITEM_PENDING},
+            {"$set": update},
+        ))
+    counts = {}
+    for field, ops in (("succeeded", done), ("failed", errors)):
+        if ops:
+            written = await db[ITEMS_COLLECTION].bulk_write(ops, ordered=False)
+            counts[field] = written.modified_count
+    await db[JOBS_COLLECTION].update_one({"_id": job_id}, {"$inc": counts})
+    return True
+
+
+def _uncollected(job: dict) -> list[str]:
+    collected = set(job.get("collectedBatches") or [])
+    return [b for b in job.get("providerBatches") or [] if b not in collected]
+
+
+async def _cancel_batches(provider: AIProvider, batch_ids: list[str]) -> None:
+    for batch_id in batch_ids:
+        try:
+            await provider.cancel_batch(batch_id)
+        except Exception as e:
+            logger.warning(
+                "provider_batch_cancel_failed", batch_id=batch_id, error=str(e)
+            )
+
+
+async def _finish(
+    db, job_id: Any, worker_id: str, from_status: str, status: str,
+    error: Optional[str] = None,
+) -> None:
+    # A cancelled or taken-over job keeps its status; only ours is finalised.
+    now = datetime.utcnow()
+    await db[JOBS_COLLECTION].update_one(
+        _owned(job_id, worker_id, from_status),
+        {"$set": {
+            "status": status,
+            "error": error,
+            "finishedAt": now,
+            "updatedAt": now,
+        }},
+    )
+
+
+async def _submit_provider_batch(
+    db, job: dict, provider: AIProvider, items: list[dict]
+) -> bool:
+    """Submit the job's remaining items, then hand it to the poll pass.
+
+    Returns False if the job was cancelled or taken over meanwhile; a batch
+    submitted after that is cancelled again.
+    """
+    job_id, worker_id = job["_id"], job["worker"]
+    # Items up to ``submittedThrough`` are already in a provider batch; a
+    # resumed job only submits the rest.
+    submitted_through = job.get("submittedThrough", -1)
+    await db[JOBS_COLLECTION].update_one(
+        {"_id": job_id}, {"$set": {"mode": MODE_PROVIDER_BATCH}}
+    )
+    unsubmitted = [item for item in items if item["index"] > submitted_through]
+    for chunk in _chunks(unsubmitted, provider.max_batch_size):
+        batch_id = await provider.submit_batch([
+            (str(item["index"]), ChatRequest(**item["request"]))
+            for item in chunk
+        ])
+        stored = await db[JOBS_COLLECTION].update_one(
+            _owned(job_id, worker_id),
+            {"$push": {"providerBatches": batch_id},
+             "$set": {"submittedThrough": chunk[-1]["index"],
+                      "updatedAt": datetime.utcnow()}},
+        )
+        if stored.matched_count == 0:
+            await _cancel_batches(provider, [batch_id])
+            return False
+
+    now = datetime.utcnow()
+    handed_over = await db[JOBS_COLLECTION].update_one(
+        _owned(job_id, worker_id),
+        {"$set": {"status": STATUS_SUBMITTED, "nextPollAt": _next_poll(now),
+                  "updatedAt": now}},
+    )
+    return handed_over.matched_count == 1
+
+
+async def _poll_failed(
+    db, job: dict, provider: Optional[AIProvider], pending: list[str],
+    error: str,
+) -> None:
+    """Count a failed poll; the job stays submitted and is polled again
+    unless this was the ``JOBS_BATCH_POLL_MAX_FAILURES``-th in a row, in
+    which case its unfinished batches are cancelled and it fails.
+    """
+    job_id, worker_id = job["_id"], job["worker"]
+    failures = job.get("pollFailures", 0) + 1
+    if failures < settings.JOBS_BATCH_POLL_MAX_FAILURES:
+        logger.warning(
+            "job_poll_failed", job_id=str(job_id), attempt=failures, error=error
+        )
+        await db[JOBS_COLLECTION].update_one(
+            _owned(job_id, worker_id, STATUS_SUBMITTED),
+            {"$set": {"pollFailures": failures}},
+        )
+        return
+    logger.error("job_failed", job_id=str(job_id), error=error)
+    if provider is not None:
+        await _cancel_batches(provider, pending)
+    await _finish(
+        db, job_id, worker_id, STATUS_SUBMITTED, STATUS_FAILED,
+        f"Polling the provider batch failed {failures} times: {error}",
+    )
+
+
+async def poll_provider_batch(
+    db, job: dict, provider: Optional[AIProvider]
+) -> None:
+    """Collect whichever of a submitted job's batches have finished, and
+    complete the job once all of them have. Never waits on the provider.
+    A provider error leaves the job submitted for the next poll.
+    """
+    job_id, worker_id = job["_id"], job["worker"]
+    pending = _uncollected(job)
+    if provider is None:
+        await _poll_failed(
+            db, job, None, pending,
+            f"Provider '{job['provider']}' not available",
+        )
+        return
+    for batch_id in list(pending):
+        try:
+            results = await provider.batch_results(batch_id)
+        except Exception as e:
+            await _poll_failed(db, job, provider, pending, str(e))
+            return
+        if results is None:
+            continue
+        if not await _record(db, job_id, worker_id, results):
+            return
+        await db[JOBS_COLLECTION].update_one(
+            {"_id": job_id}, {"$push": {"collectedBatches": batch_id}}
+        )
+        pending.remove(batch_id)
+    if job.get("pollFailures"):
+        await db[JOBS_COLLECTION].update_one(
+            {"_id": job_id}, {"$set": {"pollFailures": 0}}
+        )
+    if pending:
+        return
+
+    # Anything the provider dropped (expired or failed batch) is an error.
+    now = datetime.utcnow()
+    dropped = await db[ITEMS_COLLECTION].update_many(
+        {"jobId": job_id, "status": ITEM_PENDING},
+        {"$set": {
+            "status": ITEM_ERROR,
+            "error": "No result returned by the provider batch",
+            "finishedAt": now,
+        }},
+    )
+    if dropped.modified_count:
+        await db[JOBS_COLLECTION].update_one(
+            {"_id": job_id}, {"$inc": {"failed": dropped.modified_count}}
+        )
+    await _finish(db, job_id, worker_id, STATUS_SUBMITTED, STATUS_COMPLETED)
+
+
+async def _run_local(
+    db, job: dict, provider: AIProvider, items: list[dict]
+) -> None:
+    job_id, worker_id = job["_id"], job["worker"]
+    await db[JOBS_COLLECTION].update_one(
+        {"_id": job_id}, {"$set": {"mode": MODE_LOCAL}}
+    )
+    semaphore = asyncio.Semaphore(settings.JOBS_LOCAL_CONCURRENCY)
+    options = ChatOptions(
+        application_id=job.get("applicationId"), priority=PRIORITY_BATCH
+    )
+
+    async def run(item: dict) -> BatchItemResult:
+        custom_id = str(item["index"])
+        async with semaphore:
+            try:
+                request = chat_pipeline.prepare(
+                    provider, ChatRequest(**item["request"]), options
+                )
+                response = await chat_pipeline.complete(provider, request, options)
+            except Exception as e:
+                return BatchItemResult(custom_id=custom_id, error=str(e))
+        return BatchItemResult(custom_id=custom_id, response=response)
+
+    for chunk in _chunks(items, settings.JOBS_CHUNK_SIZE):
+        if not await _still_running(db, job_id, worker_id):
+            return
+        results = await asyncio.gather(*(run(i) for i in chunk))
+        if not await _record(db, job_id, worker_id, results):
+            return
+
+
+async def process_job(db, job: dict) -> None:
+    """Run a claimed job. Provider-batch jobs return once submitted; their
+    results are collected by later poll passes.
+    """
+    job_id, worker_id = job["_id"], job["worker"]
+    provider = ProviderRegistry.get(job["provider"])
+    try:
+        if provider is None:
+            raise RuntimeError(f"Provider '{job['provider']}' not available")
+        items = await _pending_items(db, job_id)
+        use_batch = (
+            provider.supports_batch
+            and settings.JOBS_USE_PROVIDER_BATCH
+            and job.get("mode") != MODE_LOCAL
+        )
+        async with _heartbeat(db, job_id, worker_id):
+            if use_batch:
+                if await _submit_provider_batch(db, job, provider, items):
+                    # Batches that finish quickly are collected right away.
+                    submitted = await db[JOBS_COLLECTION].find_one(
+                        {"_id": job_id}
+                    )
+                    await poll_provider_batch(db, submitted, provider)
+                return
+            await _run_local(db, job, provider, items)
+    except Exception as e:
+        logger.error("job_failed", job_id=str(job_id), error=str(e))
+        await _finish(db, job_id, worker_id, STATUS_RUNNING, STATUS_FAILED, str(e))
+        # Batches submitted before the failure would otherwise keep running.
+        failed = await db[JOBS_COLLECTION].find_one(
+            {"_id": job_id, "status": STATUS_FAILED, "worker": worker_id}
+        )
+        if failed is not None and provider is not None:
+            await _cancel_batches(provider, _uncollected(failed))
+        return
+    await _finish(db, job_id, worker_id, STATUS_RUNNING, STATUS_COMPLETED)
+
+
+class JobWorker:
+    """Background loop that polls submitted provider batches, then claims
+    and processes queued jobs one at a time.
+    """
+
+    def __init__(self, poll_interval: float):
+        self.id = uuid.uuid4().hex
+        self._poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def poll_submitted(self, db) -> int:
+        """One poll of every submitted job that is due; returns how many."""
+        polled: list = []
+        while (job := await claim_submitted(db, self.id, polled)) is not None:
+            polled.append(job["_id"])
+            try:
+                await poll_provider_batch(
+                    db, job, ProviderRegistry.get(job["provider"])
+                )
+            except Exception as e:
+                # The job stays submitted and comes due again at nextPollAt.
+                logger.warning(
+                    "job_poll_failed", job_id=str(job["_id"]), error=str(e)
+                )
+        return len(polled)
+
+    async def run_once(self) -> bool:
+        """Poll due batches, then process one queued job if any is waiting;
+        returns whether there was any work.
+        """
+        db = get_db()
+        if db is None:
+            return False
+        polled = await self.poll_submitted(db)
+        job = await claim_next(db, self.id)
+        if job is None:
+            return polled > 0
+        logger.info("job_started", job_id=str(job["_id"]), total=job["total"])
+        await process_job(db, job)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("job_worker_error", error=str(e))
+            await asyncio.sleep(self._poll_interval)
+
+
+INDEXES: list[IndexSpec] = [
+    (JOBS_COLLECTION, IndexModel(
+        [("status", 1), ("createdAt", 1)], name="status_created"
+    )),
+    (JOBS_COLLECTION, IndexModel(
+        [("status", 1), ("nextPollAt", 1)], name="status_next_poll"
+    )),
+    (ITEMS_COLLECTION, IndexModel(
+        [("jobId", 1), ("index", 1)], unique=True, name="job_index"
+    )),
+    (ITEMS_COLLECTION, IndexModel(
+        [("jobId", 1), ("status", 1)], name="job_status"
+    )),
+]
+
+
+job_worker = JobWorker(poll_interval=settings.JOBS_POLL_INTERVAL_SECONDS)
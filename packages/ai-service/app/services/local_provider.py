@@ -0,0 +1,223 @@
+"""Provider for self-hosted OpenAI-compatible inference servers.
+
+Registered as ``local`` when ``LOCAL_LLM_BASE_URL`` is set. It works with
+any server that implements ``/v1/chat/completions`` and ``/v1/models``,
+such as vLLM, the llama.cpp server or text-generation-inference's Messages
+API. Requests are plain httpx calls over one pooled keep-alive client, and
+streams are decoded with ``app.services.sse``. The model list is read from
+``/v1/models`` by the model catalog, and again here whenever it is older
+than ``LOCAL_LLM_MODELS_TTL_SECONDS``. ``LOCAL_LLM_MODEL``, or else the
+first model the server lists, is the default.
+
+Servers like vLLM batch continuously: whatever requests are waiting at
+the start of a scheduler step are decoded together. With a micro-batch
+window, concurrent non-streaming calls whose ``max_tokens`` is at most
+``LOCAL_LLM_MICRO_BATCH_MAX_TOKENS`` are held for up to the window, or
+until ``LOCAL_LLM_MICRO_BATCH_MAX_SIZE`` are waiting. They are then sent
+together, so they arrive at the server as one burst and share steps
+instead of trickling in one at a time. Each held call waits at most one
+window. Streams and long generations are never held.
+"""
+
+import asyncio
+import time
+from typing import AsyncGenerator, Optional
+
+import httpx
+import orjson  # type: ignore
+
+from app.core.logging import get_logger
+from app.services.ai_providers import (
+    AIProvider,
+    ChatRequest,
+    ChatResponse,
+    _usage,
+)
+from app.services.scheduler import observe_response
+from app.services.sse import aiter_events
+
+logger = get_logger("agentbase.providers.local")
+
+
+def api_base(base_url: str) -> str:
+    """``base_url`` with the ``/v1`` prefix the endpoints live under."""
+    base = base_url.rstrip("/")
+    return base if base.endswith("/v1") else f"{base}/v1"
+
+
+class MicroBatcher:
+    """Gate that releases waiting calls together, after ``window`` seconds
+    or once ``max_size`` are waiting.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self._window = window
+        self._max_size = max(1, max_size)
+        self._waiting: list[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        gate = loop.create_future()
+        self._waiting.append(gate)
+        if len(self._waiting) >= self._max_size:
+            self._release()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._release)
+        await gate
+
+    def _release(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        waiting, self._waiting = self._waiting, []
+        for gate in waiting:
+            if not gate.done():
+                gate.set_result(None)
+
+
+class LocalProvider(AIProvider):
+    """OpenAI-compatible chat completions on a self-hosted server."""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str = "",
+        model: str = "",
+        timeout: float = 300.0,
+        max_connections: int = 100,
+        models_ttl: float = 60.0,
+        micro_batch_window_ms: float = 0.0,
+        micro_batch_max_size: int = 32,
+        micro_batch_max_tokens: int = 256,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._client = httpx.AsyncClient(
+            base_url=api_base(base_url),
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            transport=transport,
+            event_hooks={"response": [observe_response]},
+        )
+        self._configured_model = model
+        self._models: list[str] = [model] if model else []
+        self._models_ttl = models_ttl
+        self._models_read_at: Optional[float] = None
+        self._batcher = (
+            MicroBatcher(micro_batch_window_ms / 1000, micro_batch_max_size)
+            if micro_batch_window_ms > 0 else None
+        )
+        self._micro_batch_max_tokens = micro_batch_max_tokens
+
+    @property
+    def name(self) -> str:
+        return "local"
+
+    @property
+    def default_model(self) -> str:  # type: ignore[override]
+        if self._configured_model:
+            return self._configured_model
+        return self._models[0] if self._models else ""
+
+    @property
+    def available_models(self) -> list[str]:
+        return list(self._models)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def list_models(self) -> Optional[list[dict]]:
+        self._models_read_at = time.monotonic()
+        response = await self._client.get("/models")
+        response.raise_for_status()
+        listed = {m["id"]: m for m in response.json().get("data", [])}
+        models = list(listed)
+        if self._configured_model and self._configured_model not in listed:
+            models.insert(0, self._configured_model)
+        self._models = models
+        # vLLM reports each model's context length as max_model_len.
+        return [
+            {"id": m, "context_window": listed.get(m, {}).get("max_model_len")}
+            for m in models
+        ]
+
+    async def refresh_models(self) -> None:
+        """Re-read the server's model list; keep the last one on failure."""
+        try:
+            await self.list_models()
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            logger.warning("local_models_unavailable", error=str(e))
+
+    async def _model(self, request: ChatRequest) -> str:
+        if request.model:
+            return request.model
+        if (
+            self._models_read_at is None
+            or time.monotonic() - self._models_read_at > self._models_ttl
+        ):
+            await self.refresh_models()
+        if not self.default_model:
+            raise ValueError("Local inference server lists no models")
+        return self.default_model
+
+    @staticmethod
+    def _payload(request: ChatRequest, model: str) -> dict:
+        return {
+            "model": model,
+            "messages": [
+                {"role": m.role, "content": m.content} for m in request.messages
+            ],
+            "temperature": request.temperature,
+            "max_tokens": request.max_tokens,
+        }
+
+    async def chat(self, request: ChatRequest) -> ChatResponse:
+        model = await self._model(request)
+        if (
+            self._batcher is not None
+            and request.max_tokens <= self._micro_batch_max_tokens
+        ):
+            await self._batcher.wait()
+        response = await self._client.post(
+            "/chat/completions", json=self._payload(request, model)
+        )
+        response.raise_for_status()
+        data = response.json()
+        usage = data.get("usage") or {}
+        return ChatResponse(
+            content=data["choices"][0]["message"].get("content") or "",
+            model=model,
+            provider=self.name,
+            usage=_usage(
+                usage.get("prompt_tokens") or 0,
+                usage.get("completion_tokens") or 0,
+                cache_read=(usage.get("prompt_tokens_details") or {}).get(
+                    "cached_tokens"
+                ) or 0,
+            ),
+        )
+
+    async def chat_stream(
+        self, request: ChatRequest
+    ) -> AsyncGenerator[str, None]:
+        model = await self._model(request)
+        payload = {**self._payload(request, model), "stream": True}
+        async with self._client.stream(
+            "POST", "/chat/completions", json=payload
+        ) as response:
+            response.raise_for_status()
+            async for event in aiter_events(response.aiter_bytes()):
+                if event.data == "[DONE]":
+                    break
+                try:
+                    choices = orjson.loads(event.data)["choices"]
+                except (orjson.JSONDecodeError, KeyError, TypeError):
+                    continue
+                if choices:
+                    content = (choices[0].get("delta") or {}).get("content")
+                    if content:
+                        yield content
@@ -0,0 +1,467 @@
+"""Bucketed conversation message storage.
+
+Messages live in fixed-size bucket documents in ``ai_conversation_messages``
+instead of one unbounded ``messages`` array on the conversation. The
+``ai_conversations`` document becomes a header that carries ``messageCount``,
+``bucketSize`` and ``lastMessage``, so a chat turn only touches the header and
+the tail bucket, and no conversation can grow towards the 16 MB BSON limit.
+
+Conversations written before bucketing (no ``storageVersion`` on the header)
+are migrated lazily the first time they are read or appended to, or in bulk
+with ``python -m app.scripts.migrate_message_buckets``.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+from pymongo import IndexModel, ReturnDocument, UpdateOne  # type: ignore
+
+from app.core.config import settings
+from app.core.database import IndexSpec
+from app.core.logging import get_logger
+
+logger = get_logger("agentbase.messages")
+
+MESSAGES_COLLECTION = "ai_conversation_messages"
+STORAGE_VERSION = 2
+
+# Legacy migration is guarded by the size of the embedded array; if an
+# old-version writer pushes concurrently we re-read and try again.
+_MIGRATION_ATTEMPTS = 3
+
+
+def new_header_fields() -> dict[str, Any]:
+    """Storage fields for a freshly created conversation header."""
+    return {
+        "storageVersion": STORAGE_VERSION,
+        "bucketSize": settings.MESSAGE_BUCKET_SIZE,
+        "messageCount": 0,
+        "lastMessage": None,
+    }
+
+
+def is_bucketed(conv: dict) -> bool:
+    return conv.get("storageVersion", 0) >= STORAGE_VERSION
+
+
+def plan_buckets(
+    start_index: int, messages: list[dict], bucket_size: int
+) -> dict[int, list[dict]]:
+    """Assign consecutive messages starting at ``start_index`` to buckets.
+
+    Each stored message carries its absolute ``index`` so buckets can be
+    kept ordered even when two turns on the same conversation race.
+    """
+    buckets: dict[int, list[dict]] = {}
+    for offset, msg in enumerate(messages):
+        index = start_index + offset
+        buckets.setdefault(index // bucket_size, []).append(
+            {**msg, "index": index}
+        )
+    return buckets
+
+
+def _bucket_ops(
+    conversation_id: Any, buckets: dict[int, list[dict]], now: datetime
+) -> list[UpdateOne]:
+    return [
+        UpdateOne(
+            {"conversationId": conversation_id, "bucket": bucket},
+            {
+                "$push": {"messages": {"$each": items, "$sort": {"index": 1}}},
+                "$inc": {"count": len(items)},
+                "$set": {"updatedAt": now},
+                "$setOnInsert": {"createdAt": now},
+            },
+            upsert=True,
+        )
+        for bucket, items in buckets.items()
+    ]
+
+
+# Bucket upserts rely on the lookup index being unique.
+INDEXES: list[IndexSpec] = [
+    (MESSAGES_COLLECTION, IndexModel(
+        [("conversationId", 1), ("bucket", 1)],
+        unique=True,
+        name="conversation_bucket",
+    )),
+]
+
+
+async def migrate_conversation(db, conv: dict) -> dict:
+    """Move a legacy embedded ``messages`` array into buckets.
+
+    Returns the migrated header (without ``messages``). Idempotent: bucket
+    contents are replaced rather than appended, so a retried or concurrent
+    migration converges on the same documents.
+    """
+    bucket_size = settings.MESSAGE_BUCKET_SIZE
+    for _ in range(_MIGRATION_ATTEMPTS):
+        if is_bucketed(conv):
+            return conv
+        legacy = conv.get("messages") or []
+        now = datetime.utcnow()
+        buckets = plan_buckets(0, legacy, bucket_size)
+        if buckets:
+            await db[MESSAGES_COLLECTION].bulk_write(
+                [
+                    UpdateOne(
+                        {"conversationId": conv["_id"], "bucket": bucket},
+                        {
+                            "$set": {
+                                "messages": items,
+                                "count": len(items),
+                                "updatedAt": now,
+                            },
+                            "$setOnInsert": {"createdAt": now},
+                        },
+                        upsert=True,
+                    )
+                    for bucket, items in buckets.items()
+                ],
+                ordered=False,
+            )
+
+        header_fields = {
+            "storageVersion": STORAGE_VERSION,
+            "bucketSize": bucket_size,
+            "messageCount": len(legacy),
+            "lastMessage": legacy[-1] if legacy else None,
+        }
+        result = await db.ai_conversations.update_one(
+            {
+                "_id": conv["_id"],
+                "storageVersion": {"$exists": False},
+                "messages": (
+                    {"$size": len(legacy)}
+                    if "messages" in conv
+                    else {"$exists": False}
+                ),
+            },
+            {"$set": header_fields, "$unset": {"messages": ""}},
+        )
+        if result.modified_count:
+            logger.info(
+                "conversation_migrated",
+                conversation_id=str(conv["_id"]),
+                messages=len(legacy),
+                buckets=len(buckets),
+            )
+            conv = {k: v for k, v in conv.items() if k != "messages"}
+            conv.update(header_fields)
+            return conv
+
+        reread = await db.ai_conversations.find_one({"_id": conv["_id"]})
+        if reread is None:
+            return conv
+        conv = reread
+    raise RuntimeError(
+        f"Could not migrate conversation {conv['_id']}: concurrent writers"
+    )
+
+
+async def ensure_bucketed(db, conv: dict) -> dict:
+    """Return a bucketed header for ``conv``, migrating it first if needed."""
+    if is_bucketed(conv):
+        return conv
+    return await migrate_conversation(db, conv)
+
+
+async def _reserve(
+    db,
+    conversation_id: Any,
+    messages: list[dict],
+    set_fields: Optional[dict],
+    now: datetime,
+) -> Optional[list[UpdateOne]]:
+    """Reserve index slots on the header; returns the bucket writes to apply.
+
+    The header's ``messageCount`` is reserved atomically with ``$inc`` so
+    concurrent turns get disjoint index ranges. Returns None when the
+    conversation does not exist.
+    """
+    header = await db.ai_conversations.find_one_and_update(
+        {"_id": conversation_id, "storageVersion": STORAGE_VERSION},
+        {
+            "$inc": {"messageCount": len(messages)},
+            "$set": {
+                "lastMessage": messages[-1],
+                "updatedAt": now,
+                **(set_fields or {}),
+            },
+        },
+        projection={"messageCount": 1, "bucketSize": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if header is None:
+        # Either missing, or still a legacy document — migrate and retry once.
+        conv = await db.ai_conversations.find_one({"_id": conversation_id})
+        if conv is None or is_bucketed(conv):
+            return None
+        await migrate_conversation(db, conv)
+        return await _reserve(db, conversation_id, messages, set_fields, now)
+
+    bucket_size = header.get("bucketSize") or settings.MESSAGE_BUCKET_SIZE
+    start = header["messageCount"] - len(messages)
+    return _bucket_ops(
+        conversation_id, plan_buckets(start, messages, bucket_size), now
+    )
+
+
+async def append_messages(
+    db,
+    conversation_id: Any,
+    messages: list[dict],
+    set_fields: Optional[dict] = None,
+) -> bool:
+    """Append ``messages`` to a conversation, touching only the tail bucket.
+
+    Returns False when the conversation does not exist.
+    """
+    if not messages:
+        return True
+    ops = await _reserve(
+        db, conversation_id, messages, set_fields, datetime.utcnow()
+    )
+    if ops is None:
+        return False
+    await db[MESSAGES_COLLECTION].bulk_write(ops, ordered=False)
+    return True
+
+
+async def append_many(
+    db, appends: list[tuple[Any, list[dict], Optional[dict]]]
+) -> set[Any]:
+    """Append to many conversations with a single bucket ``bulk_write``.
+
+    ``appends`` holds ``(conversation_id, messages, set_fields)``; several
+    entries for one conversation are merged in order. Header reservations
+    run concurrently (each needs its own atomic ``$inc``). Returns the ids
+    of conversations that do not exist.
+    """
+    merged: dict[Any, tuple[list[dict], dict]] = {}
+    for conversation_id, messages, set_fields in appends:
+        pending, fields = merged.setdefault(conversation_id, ([], {}))
+        pending.extend(messages)
+        fields.update(set_fields or {})
+    merged = {cid: entry for cid, entry in merged.items() if entry[0]}
+    if not merged:
+        return set()
+
+    now = datetime.utcnow()
+    reserved = await asyncio.gather(*(
+        _reserve(db, cid, messages, fields, now)
+        for cid, (messages, fields) in merged.items()
+    ))
+    ops = [op for batch in reserved if batch for op in batch]
+    if ops:
+        await db[MESSAGES_COLLECTION].bulk_write(ops, ordered=False)
+    return {cid for cid, batch in zip(merged, reserved) if batch is None}
+
+
+def history_window(model: Optional[str]) -> tuple[int, int]:
+    """Return ``(max_messages, max_tokens)`` of history to replay for a model."""
+    override = settings.HISTORY_WINDOWS.get(model or "", {})
+    return (
+        override.get("max_messages", settings.HISTORY_MAX_MESSAGES),
+        override.get("max_tokens", settings.HISTORY_MAX_TOKENS),
+    )
+
+
+def header_projection(max_messages: int) -> dict:
+    """Projection for loading a conversation header before a chat turn.
+
+    Bucketed headers have no ``messages`` field; for legacy documents the
+    ``$slice`` keeps the server from shipping the whole embedded history.
+    """
+    return {"messages": {"$slice": -max_messages}}
+
+
+def _estimate_tokens(msg: dict) -> int:
+    # ~4 characters per token plus per-message framing overhead.
+    return len(msg.get("content") or "") // 4 + 4
+
+
+def _take_recent(
+    newest_first: list[dict], budget: int, window: list[dict]
+) -> int:
+    """Append messages newest-first to ``window`` while they fit ``budget``.
+
+    Returns the remaining budget, or -1 once it has been exhausted.
+    """
+    for msg in newest_first:
+        cost = _estimate_tokens(msg)
+        if cost > budget:
+            return -1
+        budget -= cost
+        window.append(msg)
+    return budget
+
+
+def _window_start(count: int, max_messages: int) -> int:
+    """Index of the oldest message in the window.
+
+    With ``HISTORY_WINDOW_STRIDE`` the start only advances in whole strides,
+    so consecutive turns replay an identical prefix and provider prompt
+    caches, which match exact prefixes, keep hitting. The window then holds
+    between ``max_messages - stride + 1`` and ``max_messages`` messages.
+    """
+    start = max(0, count - max_messages)
+    stride = min(settings.HISTORY_WINDOW_STRIDE, max_messages)
+    if stride > 1:
+        start = -(-start // stride) * stride
+    return start
+
+
+def _align_cut(window: list[dict]) -> list[dict]:
+    """Move a token-budget cut in ``window`` (newest first) forward to a
+    stride boundary, for the same reason as ``_window_start``.
+    """
+    stride = settings.HISTORY_WINDOW_STRIDE
+    if stride <= 1 or not window:
+        return window
+    oldest = window[-1].get("index", 0)
+    aligned = -(-oldest // stride) * stride
+    return [m for m in window if m.get("index", 0) >= aligned] or window
+
+
+async def load_recent_messages(
+    db, conv: dict, max_messages: int, max_tokens: int
+) -> list[dict]:
+    """Load only the newest window of history, oldest first.
+
+    At most ``max_messages`` messages totalling roughly ``max_tokens``
+    estimated tokens are returned. For bucketed conversations only the
+    buckets overlapping the window are fetched, newest first, and reading
+    stops as soon as the token budget is spent.
+    """
+    if max_messages <= 0:
+        return []
+    if not is_bucketed(conv):
+        window: list[dict] = []
+        recent = list(conv.get("messages") or [])[-max_messages:]
+        _take_recent(recent[::-1], max_tokens, window)
+        return window[::-1]
+
+    count = conv.get("messageCount", 0)
+    if count == 0:
+        return []
+    bucket_size = conv.get("bucketSize") or settings.MESSAGE_BUCKET_SIZE
+    first_index = _window_start(count, max_messages)
+    cursor = db[MESSAGES_COLLECTION].find(
+        {
+            "conversationId": conv["_id"],
+            "bucket": {"$gte": first_index // bucket_size},
+        },
+        {"messages": 1, "_id": 0},
+    ).sort("bucket", -1)
+
+    window = []
+    budget = max_tokens
+    async for bucket in cursor:
+        newest_first = [
+            m for m in reversed(bucket.get("messages", []))
+            if m.get("index", 0) >= first_index
+        ]
+        budget = _take_recent(newest_first, budget, window)
+        if budget < 0:
+            window = _align_cut(window)
+            break
+    return window[::-1]
+
+
+async def load_recent_many(
+    db, windows: list[tuple[dict, int, int]]
+) -> dict[Any, list[dict]]:
+    """``load_recent_messages`` for many headers with one bucket query.
+
+    ``windows`` holds ``(conv, max_messages, max_tokens)``; the result maps
+    each conversation ``_id`` to its window, oldest first.
+    """
+    result: dict[Any, list[dict]] = {}
+    clauses = []
+    limits: dict[Any, tuple[int, int]] = {}
+    for conv, max_messages, max_tokens in windows:
+        result[conv["_id"]] = []
+        count = conv.get("messageCount", 0)
+        if max_messages <= 0:
+            continue
+        if not is_bucketed(conv):
+            result[conv["_id"]] = await load_recent_messages(
+                db, conv, max_messages, max_tokens
+            )
+            continue
+        if count == 0:
+            continue
+        bucket_size = conv.get("bucketSize") or settings.MESSAGE_BUCKET_SIZE
+        first_index = _window_start(count, max_messages)
+        limits[conv["_id"]] = (first_index, max_tokens)
+        clauses.append({
+            "conversationId": conv["_id"],
+            "bucket": {"$gte": first_index // bucket_size},
+        })
+    if not clauses:
+        return result
+
+    cursor = db[MESSAGES_COLLECTION].find(
+        {"$or": clauses},
+        {"conversationId": 1, "bucket": 1, "messages": 1, "_id": 0},
+    )
+    buckets: dict[Any, list[dict]] = {}
+    async for bucket in cursor:
+        buckets.setdefault(bucket["conversationId"], []).append(bucket)
+    for conversation_id, (first_index, budget) in limits.items():
+        window: list[dict] = []
+        for bucket in sorted(
+            buckets.get(conversation_id, []), key=lambda b: -b["bucket"]
+        ):
+            newest_first = [
+                m for m in reversed(bucket.get("messages", []))
+                if m.get("index", 0) >= first_index
+            ]
+            budget = _take_recent(newest_first, budget, window)
+            if budget < 0:
+                window = _align_cut(window)
+                break
+        result[conversation_id] = window[::-1]
+    return result
+
+
+async def iter_message_batches(db, conv: dict) -> AsyncIterator[list[dict]]:
+    """Yield the full, ordered history one bucket at a time, so callers can
+    write it out without holding every message at once. The internal
+    ``index`` field is not returned.
+    """
+    if not is_bucketed(conv):
+        if conv.get("messages"):
+            yield list(conv["messages"])
+        return
+    cursor = db[MESSAGES_COLLECTION].find(
+        {"conversationId": conv["_id"]},
+        {"_id": 0, "messages.index": 0},
+    ).sort("bucket", 1)
+    async for bucket in cursor:
+        if bucket.get("messages"):
+            yield bucket["messages"]
+
+
+async def load_messages(db, conv: dict) -> list[dict]:
+    """Load the full, ordered message history for a conversation header."""
+    messages: list[dict] = []
+    async for batch in iter_message_batches(db, conv):
+        messages.extend(batch)
+    return messages
+
+
+async def migrate_legacy_conversations(db, batch_size: int = 100) -> int:
+    """Migrate every legacy conversation; returns how many were migrated."""
+    migrated = 0
+    cursor = db.ai_conversations.find(
+        {"storageVersion": {"$exists": False}}
+    ).batch_size(batch_size)
+    async for conv in cursor:
+        await migrate_conversation(db, conv)
+        migrated += 1
+    return migrated
@@ -0,0 +1,184 @@
+"""Catalog of the models each registered provider serves, with their limits.
+
+Every entry has ``id``, ``context_window`` (prompt plus completion tokens),
+``max_output_tokens``, ``input_price`` and ``output_price`` (USD per
+million tokens) and ``modalities`` (input types). Any of the numbers may
+be None when unknown. Entries merge two sources:
+
+- ``SNAPSHOT``: bundled metadata for the models we ship by default.
+- The provider's list-models API (OpenAI, Gemini, local servers). When
+  it answers, it decides which models are offered, and any limits it
+  reports override the snapshot. Providers without one offer their
+  static ``available_models``.
+
+Live lists are re-read in the background every
+``MODEL_CATALOG_REFRESH_SECONDS``. Readers never wait on a refresh: they
+are served the last catalog built in memory, and a provider whose listing
+fails keeps its previous list. The serialized ``GET /providers`` body is
+built once per change and carries an ETag derived from its content, so
+every worker serving the same catalog answers with the same tag.
+"""
+
+import asyncio
+import hashlib
+from typing import Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.serialization import dumps
+from app.services.ai_providers import AIProvider, ProviderRegistry
+
+logger = get_logger("agentbase.catalog")
+
+
+def _entry(
+    context_window: Optional[int],
+    max_output_tokens: Optional[int],
+    input_price: Optional[float] = None,
+    output_price: Optional[float] = None,
+    modalities: tuple[str, ...] = ("text",),
+) -> dict:
+    return {
+        "context_window": context_window,
+        "max_output_tokens": max_output_tokens,
+        "input_price": input_price,
+        "output_price": output_price,
+        "modalities": list(modalities),
+    }
+
+
+_VISION = ("text", "image")
+_MULTIMODAL = ("text", "image", "audio", "video")
+
+# Published limits and list prices for the default models. Context windows
+# can be overridden without a release through CONTEXT_WINDOWS in settings.
+SNAPSHOT: dict[str, dict] = {
+    "gpt-4": _entry(8192, 8192, 30.0, 60.0),
+    "gpt-4-turbo": _entry(128000, 4096, 10.0, 30.0, _VISION),
+    "gpt-4o": _entry(128000, 16384, 2.5, 10.0, _VISION),
+    "gpt-4o-mini": _entry(128000, 16384, 0.15, 0.6, _VISION),
+    "gpt-3.5-turbo": _entry(16385, 4096, 0.5, 1.5),
+    "claude-sonnet-4-5-20250929": _entry(200000, 64000, 3.0, 15.0, _VISION),
+    "claude-haiku-4-5-20251001": _entry(200000, 64000, 1.0, 5.0, _VISION),
+    "gemini-2.0-flash": _entry(1048576, 8192, 0.1, 0.4, _MULTIMODAL),
+    "gemini-1.5-pro": _entry(2097152, 8192, 1.25, 5.0, _MULTIMODAL),
+    "gemini-1.5-flash": _entry(1048576, 8192, 0.075, 0.3, _MULTIMODAL),
+    "meta-llama/Llama-3.1-8B-Instruct": _entry(131072, None),
+    "mistralai/Mistral-7B-Instruct-v0.3": _entry(32768, None),
+    "mistralai/Mixtral-8x7B-Instruct-v0.1": _entry(32768, None),
+    "microsoft/Phi-3-mini-4k-instruct": _entry(4096, None),
+    "HuggingFaceH4/zephyr-7b-beta": _entry(4096, None),
+}
+
+_UNKNOWN = _entry(None, None)
+
+
+def _model(model_id: str, live: Optional[dict] = None) -> dict:
+    info = {"id": model_id, **SNAPSHOT.get(model_id, _UNKNOWN)}
+    if live:
+        info.update(
+            (k, v) for k, v in live.items() if v is not None and k != "id"
+        )
+    return info
+
+
+class ModelCatalog:
+    def __init__(self):
+        # Provider name -> last live listing that succeeded.
+        self._live: dict[str, list[dict]] = {}
+        self._built_for: Optional[tuple[AIProvider, ...]] = None
+        self._by_model: dict[str, dict] = {}
+        self._providers: list[dict] = []
+        self._body = b""
+        self._etag = ""
+        self._task: Optional[asyncio.Task] = None
+
+    def _build(self, providers: tuple[AIProvider, ...]) -> None:
+        entries = []
+        by_model: dict[str, dict] = {}
+        for provider in providers:
+            live = self._live.get(provider.name)
+            if live is not None:
+                models = [_model(m["id"], m) for m in live]
+            else:
+                models = [_model(m) for m in provider.available_models]
+            for info in models:
+                by_model.setdefault(info["id"], info)
+            entries.append({
+                "name": provider.name,
+                "models": [m["id"] for m in models],
+                "model_details": models,
+            })
+        body = dumps({"providers": entries})
+        self._providers = entries
+        self._by_model = by_model
+        self._body = body
+        self._etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self._built_for = providers
+
+    def _current(self) -> None:
+        providers = tuple(ProviderRegistry.providers())
+        if providers != self._built_for:
+            self._build(providers)
+
+    def providers(self) -> list[dict]:
+        self._current()
+        return self._providers
+
+    def payload(self) -> tuple[bytes, str]:
+        """The serialized ``{"providers": [...]}`` body and its ETag."""
+        self._current()
+        return self._body, self._etag
+
+    def get(self, model_id: str) -> Optional[dict]:
+        """Metadata for ``model_id`` from any provider, else the snapshot."""
+        info = self._by_model.get(model_id)
+        if info is None and model_id in SNAPSHOT:
+            info = _model(model_id)
+        return info
+
+    async def _list(self, provider: AIProvider) -> None:
+        try:
+            live = await asyncio.wait_for(
+                provider.list_models(), settings.MODEL_CATALOG_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            logger.warning(
+                "model_listing_failed", provider=provider.name, error=str(e)
+            )
+            return
+        if live is not None:
+            self._live[provider.name] = live
+
+    async def refresh(self) -> None:
+        """Re-list every provider, then swap in the rebuilt catalog."""
+        providers = tuple(ProviderRegistry.providers())
+        await asyncio.gather(*(self._list(p) for p in providers))
+        self._build(providers)
+        logger.info(
+            "model_catalog_refreshed",
+            providers=len(providers),
+            models=len(self._by_model),
+        )
+
+    async def _run(self, interval: float) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        interval = settings.MODEL_CATALOG_REFRESH_SECONDS
+        if interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+catalog = ModelCatalog()
@@ -0,0 +1,170 @@
+"""Exact-match response cache for deterministic chat requests.
+
+Requests are keyed on a canonical SHA-256 of provider, model, messages,
+temperature and max_tokens (plus the application the conversation belongs
+to, so cached answers never cross application boundaries). Only requests at
+or below ``RESPONSE_CACHE_MAX_TEMPERATURE`` are cacheable — sampling at a
+higher temperature is a request for a fresh answer.
+
+Two tiers: an in-process LRU with a TTL, and an optional MongoDB tier
+(``ai_response_cache``) whose documents expire through a TTL index so every
+replica shares hits.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import IndexModel  # type: ignore
+
+from app.core.config import settings
+from app.core.database import IndexSpec, get_db
+from app.services.ai_providers import AIProvider, ChatRequest, ChatResponse
+
+CACHE_COLLECTION = "ai_response_cache"
+
+
+def cache_key(
+    provider_name: str, model: str, request: ChatRequest, scope: str = ""
+) -> str:
+    """Canonical digest of everything that determines a provider's answer."""
+    canonical = json.dumps(
+        [
+            scope,
+            provider_name,
+            model,
+            [[m.role, m.content] for m in request.messages],
+            request.temperature,
+            request.max_tokens,
+        ],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def hit_usage() -> dict:
+    # A hit costs no provider tokens, so quota tracking must not count any.
+    return {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "cache": "hit",
+    }
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(
+        self,
+        provider: AIProvider,
+        request: ChatRequest,
+        enabled: Optional[bool] = None,
+        scope: Optional[str] = None,
+    ) -> Optional[str]:
+        """Return the cache key for ``request``, or None if it is not cacheable.
+
+        ``enabled`` is the per-request switch: None follows
+        ``RESPONSE_CACHE_ENABLED``, True opts in, False bypasses the cache.
+        """
+        if enabled is None:
+            enabled = settings.RESPONSE_CACHE_ENABLED
+        if not enabled:
+            return None
+        if request.temperature > settings.RESPONSE_CACHE_MAX_TEMPERATURE:
+            return None
+        model = request.model or provider.default_model
+        return cache_key(provider.name, model, request, scope or "")
+
+    async def get(self, key: str) -> Optional[ChatResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, payload = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return ChatResponse(**payload, usage=hit_usage())
+            del self._entries[key]
+
+        payload = await self._get_shared(key)
+        if payload is None:
+            self.misses += 1
+            return None
+        self._remember(key, payload)
+        self.hits += 1
+        return ChatResponse(**payload, usage=hit_usage())
+
+    async def put(self, key: str, response: ChatResponse) -> None:
+        payload = {
+            "content": response.content,
+            "model": response.model,
+            "provider": response.provider,
+        }
+        self._remember(key, payload)
+        db = get_db()
+        if settings.RESPONSE_CACHE_MONGO and db is not None:
+            now = datetime.utcnow()
+            await db[CACHE_COLLECTION].update_one(
+                {"_id": key},
+                {"$set": {
+                    "response": payload,
+                    "createdAt": now,
+                    "expiresAt": now + timedelta(seconds=self._ttl),
+                }},
+                upsert=True,
+            )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, payload: dict) -> None:
+        self._entries[key] = (time.monotonic() + self._ttl, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def _get_shared(self, key: str) -> Optional[dict]:
+        db = get_db()
+        if not settings.RESPONSE_CACHE_MONGO or db is None:
+            return None
+        # The TTL monitor only runs once a minute, so filter on expiry too.
+        doc = await db[CACHE_COLLECTION].find_one(
+            {"_id": key, "expiresAt": {"$gt": datetime.utcnow()}},
+            {"response": 1},
+        )
+        return doc["response"] if doc else None
+
+
+# TTL index so MongoDB drops expired cache entries on its own; only created
+# when the Mongo tier is on.
+INDEXES: list[IndexSpec] = [
+    (CACHE_COLLECTION, IndexModel(
+        "expiresAt", expireAfterSeconds=0, name="expires_at_ttl"
+    )),
+]
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,420 @@
+"""Provider routing: fallback chains, circuit breakers and hedged requests.
+
+A request names a primary provider/model; ``ROUTING_FALLBACKS`` lists
+equivalent models on other providers to try when it fails, e.g.
+``{"openai:gpt-4o": ["anthropic:claude-sonnet-4-5-20250929",
+"gemini:gemini-2.0-flash"]}`` (a bare provider name applies to every model
+of that provider; a fallback without a model uses the provider default).
+
+Each provider has a circuit breaker over a sliding window of outcomes. It
+opens when the error rate (slow calls count as errors once
+``BREAKER_SLOW_CALL_MS`` is set) crosses ``BREAKER_ERROR_THRESHOLD``,
+skips the provider for ``BREAKER_OPEN_SECONDS``, then lets one probe
+through. Only provider faults count as errors: 5xx and 429 responses,
+timeouts and connection failures. A client error (any other 4xx, such as
+a bad request or unknown model) is the caller's problem; it is raised at
+once without failing over or touching the breaker.
+
+With hedging on, if the primary has not answered by its recent p95
+latency, the next candidate is fired as well; the first answer wins and
+the other call is cancelled.
+
+Only platform providers are routed: a BYOK request is bound to the
+tenant's own key and is never failed over to a platform key.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services import chat_pipeline
+from app.services.ai_providers import (
+    AIProvider,
+    ChatRequest,
+    ChatResponse,
+    ProviderRegistry,
+)
+from app.services.chat_pipeline import ChatOptions
+from app.services.context_budget import ContextBudgetExceeded
+
+logger = get_logger("agentbase.routing")
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class NoHealthyProvider(RuntimeError):
+    """Every candidate provider is unavailable or has an open circuit."""
+
+
+class ProviderUnavailable(ValueError):
+    """The requested provider is not configured (or not supported for BYOK)."""
+
+
+# SDK exceptions (OpenAI, Anthropic) for calls that never got a response.
+_TRANSPORT_ERROR_NAMES = frozenset({"APIConnectionError", "APITimeoutError"})
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of a provider error from the SDKs, httpx or
+    google-api-core, if it carries one.
+    """
+    for status in (
+        getattr(exc, "status_code", None),
+        getattr(getattr(exc, "response", None), "status_code", None),
+        getattr(exc, "code", None),
+    ):
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_provider_fault(exc: BaseException) -> bool:
+    """5xx, 408 and 429 responses, timeouts and connection failures."""
+    status = _status_code(exc)
+    if status is not None:
+        return status >= 500 or status in (408, 429)
+    if isinstance(exc, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return any(
+        cls.__name__ in _TRANSPORT_ERROR_NAMES for cls in type(exc).__mro__
+    )
+
+
+def is_client_error(exc: BaseException) -> bool:
+    """A 4xx other than 408/429: retrying elsewhere would fail the same way."""
+    status = _status_code(exc)
+    return status is not None and 400 <= status < 500 and status not in (408, 429)
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float,
+        min_requests: int,
+        error_threshold: float,
+        open_seconds: float,
+        slow_call_ms: float = 0.0,
+    ):
+        self.name = name
+        self._window = window_seconds
+        self._min_requests = min_requests
+        self._threshold = error_threshold
+        self._open_seconds = open_seconds
+        self._slow_call_ms = slow_call_ms
+        # (monotonic time, ok, latency_ms)
+        self._outcomes: deque[tuple[float, bool, float]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self.state = STATE_CLOSED
+
+    def allow(self) -> bool:
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self._open_seconds:
+                return False
+            self.state = STATE_HALF_OPEN
+        if self.state == STATE_HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record(self, ok: bool, latency_ms: float) -> None:
+        if ok and self._slow_call_ms and latency_ms > self._slow_call_ms:
+            ok = False
+        now = time.monotonic()
+        if self.state == STATE_HALF_OPEN:
+            self._probing = False
+            if ok:
+                self.state = STATE_CLOSED
+                self._outcomes.clear()
+            else:
+                self._open(now)
+                return
+        self._outcomes.append((now, ok, latency_ms))
+        self._trim(now)
+        if self.state == STATE_CLOSED and self._should_open():
+            self._open(now)
+
+    def abandon(self) -> None:
+        """A call was cancelled before it finished; it proves nothing."""
+        self._probing = False
+
+    def p95_ms(self) -> Optional[float]:
+        self._trim(time.monotonic())
+        latencies = sorted(lat for _, ok, lat in self._outcomes if ok)
+        if not latencies:
+            return None
+        return latencies[int(len(latencies) * 0.95)]
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        total = len(self._outcomes)
+        errors = sum(1 for _, ok, _ in self._outcomes if not ok)
+        p95 = self.p95_ms()
+        return {
+            "provider": self.name,
+            "state": self.state,
+            "requests": total,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+        }
+
+    def _should_open(self) -> bool:
+        total = len(self._outcomes)
+        if total < self._min_requests:
+            return False
+        errors = sum(1 for _, ok, _ in self._outcomes if not ok)
+        return errors / total >= self._threshold
+
+    def _open(self, now: float) -> None:
+        self.state = STATE_OPEN
+        self._opened_at = now
+        logger.warning("circuit_opened", provider=self.name)
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self._window:
+            self._outcomes.popleft()
+
+
+class RoutedResponse:
+    """The winning response plus how it was obtained."""
+
+    __slots__ = ("response", "attempts", "fallback", "hedged")
+
+    def __init__(
+        self,
+        response: ChatResponse,
+        attempts: list[dict],
+        fallback: bool,
+        hedged: bool,
+    ):
+        self.response = response
+        self.attempts = attempts
+        self.fallback = fallback
+        self.hedged = hedged
+
+    def summary(self) -> dict:
+        return {
+            "provider": self.response.provider,
+            "model": self.response.model,
+            "fallback": self.fallback,
+            "hedged": self.hedged,
+            "attempts": self.attempts,
+        }
+
+
+class RoutingPolicy:
+    def __init__(self, fallbacks: dict[str, list[str]]):
+        self._fallbacks = fallbacks
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def breaker(self, provider_name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider_name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider_name,
+                window_seconds=settings.BREAKER_WINDOW_SECONDS,
+                min_requests=settings.BREAKER_MIN_REQUESTS,
+                error_threshold=settings.BREAKER_ERROR_THRESHOLD,
+                open_seconds=settings.BREAKER_OPEN_SECONDS,
+                slow_call_ms=settings.BREAKER_SLOW_CALL_MS,
+            )
+            self._breakers[provider_name] = breaker
+        return breaker
+
+    def chain(
+        self, provider_name: str, model: Optional[str]
+    ) -> list[tuple[AIProvider, str]]:
+        """Registered (provider, model) candidates, primary first."""
+        primary = ProviderRegistry.get(provider_name)
+        if primary is None:
+            return []
+        model = model or primary.default_model
+        fallbacks = self._fallbacks.get(
+            f"{provider_name}:{model}", self._fallbacks.get(provider_name, [])
+        )
+        chain = [(primary, model)]
+        for entry in fallbacks:
+            name, _, fallback_model = entry.partition(":")
+            provider = ProviderRegistry.get(name)
+            if provider is not None:
+                chain.append((provider, fallback_model or provider.default_model))
+        return chain
+
+    async def dispatch(
+        self,
+        provider_name: str,
+        request: ChatRequest,
+        options: ChatOptions,
+        api_key: Optional[str] = None,
+        hedge: Optional[bool] = None,
+    ) -> RoutedResponse:
+        """Serve one chat request for the routers.
+
+        A BYOK ``api_key`` leases a pooled client bound to exactly that key
+        and calls it directly; platform requests are routed via ``complete``.
+        Raises ``ProviderUnavailable`` when the provider cannot be used.
+        """
+        if not api_key:
+            if ProviderRegistry.get(provider_name) is None:
+                raise ProviderUnavailable(
+                    f"Provider '{provider_name}' not available."
+                    " Configure API key in Settings → AI Providers."
+                )
+            return await self.complete(provider_name, request, options, hedge)
+
+        async with ProviderRegistry.lease(provider_name, api_key) as provider:
+            if provider is None:
+                raise ProviderUnavailable(
+                    f"Provider '{provider_name}' is not supported for BYOK."
+                )
+            request = chat_pipeline.prepare(provider, request, options)
+            started = time.monotonic()
+            response = await chat_pipeline.complete(provider, request, options)
+        latency_ms = (time.monotonic() - started) * 1000
+        return RoutedResponse(
+            response,
+            [_attempt(provider, request.model, "ok", latency_ms)],
+            fallback=False,
+            hedged=False,
+        )
+
+    async def complete(
+        self,
+        provider_name: str,
+        request: ChatRequest,
+        options: ChatOptions,
+        hedge: Optional[bool] = None,
+    ) -> RoutedResponse:
+        """Serve ``request`` from the first healthy candidate that answers.
+
+        Raises ``ContextBudgetExceeded`` if the prompt fits no candidate,
+        ``NoHealthyProvider`` if every circuit is open, a client error as
+        soon as any candidate returns one, and otherwise the last provider
+        error once every candidate has failed.
+        """
+        if hedge is None:
+            hedge = settings.ROUTING_HEDGE_ENABLED
+        attempts: list[dict] = []
+        candidates: deque[tuple[AIProvider, ChatRequest]] = deque()
+        budget_error: Optional[ContextBudgetExceeded] = None
+        chain = self.chain(provider_name, request.model)
+        for provider, model in chain:
+            try:
+                candidates.append((provider, chat_pipeline.prepare(
+                    provider, request.model_copy(update={"model": model}), options
+                )))
+            except ContextBudgetExceeded as e:
+                budget_error = budget_error or e
+                attempts.append(_attempt(provider, model, "context_exceeded"))
+        if not candidates and budget_error is not None:
+            raise budget_error
+
+        running: dict[asyncio.Task, tuple[AIProvider, ChatRequest, float]] = {}
+
+        def launch() -> bool:
+            while candidates:
+                provider, prepared = candidates.popleft()
+                if not self.breaker(provider.name).allow():
+                    attempts.append(_attempt(provider, prepared.model, "circuit_open"))
+                    continue
+                task = asyncio.create_task(
+                    chat_pipeline.complete(provider, prepared, options)
+                )
+                running[task] = (provider, prepared, time.monotonic())
+                return True
+            return False
+
+        if not launch():
+            raise NoHealthyProvider(f"No healthy provider for '{provider_name}'")
+
+        hedged = False
+        last_error: Optional[BaseException] = None
+        try:
+            while running:
+                timeout = None
+                if hedge and not hedged and candidates and len(running) == 1:
+                    # Hedge the attempt in flight, timed from its own start.
+                    attempt, _, started = next(iter(running.values()))
+                    hedge_at = started + self._hedge_delay(attempt.name) / 1000
+                    timeout = max(hedge_at - time.monotonic(), 0.0)
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    provider, prepared, started = running.pop(task)
+                    latency_ms = (time.monotonic() - started) * 1000
+                    error = task.exception()
+                    breaker = self.breaker(provider.name)
+                    if error is None or is_provider_fault(error):
+                        breaker.record(error is None, latency_ms)
+                    else:
+                        breaker.abandon()
+                    if error is None:
+                        attempts.append(
+                            _attempt(provider, prepared.model, "ok", latency_ms)
+                        )
+                        return RoutedResponse(
+                            task.result(),
+                            attempts,
+                            fallback=(provider, prepared.model) != chain[0],
+                            hedged=hedged,
+                        )
+                    if is_client_error(error):
+                        raise error
+                    last_error = error
+                    attempts.append(
+                        _attempt(provider, prepared.model, "error", latency_ms)
+                    )
+                    logger.warning(
+                        "provider_failed",
+                        provider=provider.name,
+                        model=prepared.model,
+                        error=str(error),
+                    )
+                if not running:
+                    launch()
+        finally:
+            for task, (provider, prepared, _) in running.items():
+                task.cancel()
+                self.breaker(provider.name).abandon()
+                attempts.append(_attempt(provider, prepared.model, "cancelled"))
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        if last_error is None:
+            raise NoHealthyProvider(f"No healthy provider for '{provider_name}'")
+        raise last_error
+
+    def _hedge_delay(self, provider_name: str) -> float:
+        p95 = self.breaker(provider_name).p95_ms()
+        if p95 is None:
+            return settings.ROUTING_HEDGE_DEFAULT_DELAY_MS
+        return max(p95, settings.ROUTING_HEDGE_MIN_DELAY_MS)
+
+    def stats(self) -> list[dict]:
+        return [breaker.stats() for breaker in self._breakers.values()]
+
+
+def _attempt(
+    provider: AIProvider, model: Optional[str], outcome: str,
+    latency_ms: Optional[float] = None,
+) -> dict:
+    attempt = {"provider": provider.name, "model": model, "outcome": outcome}
+    if latency_ms is not None:
+        attempt["latency_ms"] = round(latency_ms, 1)
+    return attempt
+
+
+routing = RoutingPolicy(fallbacks=settings.ROUTING_FALLBACKS)
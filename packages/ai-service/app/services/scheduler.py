@@ -0,0 +1,476 @@
+"""Adaptive per-provider, per-model request scheduler.
+
+Every upstream call takes a slot from the limiter for its (provider, model)
+before it is sent:
+
+- **Concurrency** starts at ``SCHEDULER_MAX_CONCURRENCY`` and is adjusted
+  AIMD-style: each success adds ``1/limit`` (one slot per window of
+  successes), each rate-limit response halves it.
+- **RPM/TPM token buckets** start from ``SCHEDULER_LIMITS`` (or unlimited)
+  and learn the real budget from the provider's rate-limit headers: the
+  advertised limit resizes the bucket and ``remaining`` clamps it, so we slow
+  down before the provider starts returning 429s. A 429 pauses the model
+  until ``retry-after``.
+- Waiters queue by **priority** (lower runs first), so interactive chat is
+  dispatched ahead of batch work, FIFO within a priority.
+
+Headers reach the limiter through an httpx response hook installed on the
+provider SDK clients (``observe_response``); the slot in force is carried in
+a context variable. Gemini's gRPC transport has no hook, so it learns from
+``ResourceExhausted`` errors only.
+
+With ``AI_SERVICE_WORKERS`` processes sharing one set of provider keys, each
+process gets an even share of every budget: configured and learned
+concurrency, RPM and TPM limits, and the provider's reported ``remaining``,
+are all divided by the worker count, so together they stay inside the
+account's limits without coordinating per request.
+
+BYOK calls are billed to the tenant's own account, so they never touch the
+platform limiters: each tenant key gets separate limiters (``tenant`` is the
+client pool's key hash) that learn from that key's headers and 429s alone.
+They start from the default concurrency with no RPM/TPM budget, since
+``SCHEDULER_LIMITS`` describes the platform account, and idle ones are
+dropped least-recently-used beyond ``max_tenant_limiters``.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("agentbase.scheduler")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Rate-limit responses closer together than this count as one signal, so a
+# burst of concurrent 429s halves the limit once rather than collapsing it.
+_DECREASE_COOLDOWN_SECONDS = 1.0
+_DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+# (limit, remaining, reset) header names per budget, by provider convention.
+_HEADER_SETS = {
+    "requests": [
+        ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests",
+         "x-ratelimit-reset-requests"),
+        ("anthropic-ratelimit-requests-limit",
+         "anthropic-ratelimit-requests-remaining",
+         "anthropic-ratelimit-requests-reset"),
+    ],
+    "tokens": [
+        ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens",
+         "x-ratelimit-reset-tokens"),
+        ("anthropic-ratelimit-tokens-limit",
+         "anthropic-ratelimit-tokens-remaining",
+         "anthropic-ratelimit-tokens-reset"),
+    ],
+}
+
+
+def _parse_reset(value: str) -> Optional[float]:
+    """Seconds until reset from "6m0s"/"20ms"/"1.5" or an RFC 3339 time."""
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True for 429s from the OpenAI/Anthropic SDKs, httpx and google-api-core."""
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    if getattr(getattr(exc, "response", None), "status_code", None) == 429:
+        return True
+    return getattr(exc, "code", None) == 429
+
+
+class TokenBucket:
+    """Per-minute budget refilled continuously; a limit of 0 is unlimited."""
+
+    def __init__(self, per_minute: int = 0):
+        self.limit = per_minute
+        self._level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def set_limit(self, per_minute: int) -> None:
+        self._refill()
+        if self.limit <= 0:
+            self._level = float(per_minute)
+        self.limit = per_minute
+        self._level = min(self._level, float(per_minute))
+
+    def clamp(self, remaining: int) -> None:
+        """Trust the provider when it reports less headroom than we think."""
+        self._refill()
+        self._level = min(self._level, float(remaining))
+
+    def wait_time(self, amount: float) -> float:
+        if self.limit <= 0:
+            return 0.0
+        self._refill()
+        # A single request larger than the whole budget waits for a full bucket.
+        deficit = min(amount, self.limit) - self._level
+        return deficit * 60.0 / self.limit if deficit > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        if self.limit > 0:
+            self._level -= min(amount, self.limit)
+
+    def refund(self, amount: float) -> None:
+        if self.limit > 0:
+            self._level = min(self._level + amount, float(self.limit))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.limit > 0:
+            self._level = min(
+                float(self.limit),
+                self._level + (now - self._updated) * self.limit / 60.0,
+            )
+        self._updated = now
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "tokens", "future", "enqueued")
+
+    def __init__(self, priority: int, seq: int, tokens: int):
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def _share(limit: int, workers: int) -> int:
+    """This process's part of a budget split across ``workers``; 0 stays
+    unlimited and a real budget never rounds down to nothing.
+    """
+    if limit <= 0 or workers <= 1:
+        return limit
+    return max(1, limit // workers)
+
+
+class ModelLimiter:
+    """Concurrency, RPM and TPM budget for one provider model.
+
+    ``workers`` is the number of processes sharing the provider account;
+    every limit, configured or learned, is this process's share of it.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        concurrency: int,
+        rpm: int = 0,
+        tpm: int = 0,
+        workers: int = 1,
+    ):
+        self.provider = provider
+        self.model = model
+        self.workers = max(1, workers)
+        self.max_concurrency = _share(concurrency, self.workers)
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self.requests = TokenBucket(_share(rpm, self.workers))
+        self.tokens = TokenBucket(_share(tpm, self.workers))
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._last_decrease = 0.0
+        self._queue: list[_Waiter] = []
+        self._seq = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waits: deque[float] = deque(maxlen=512)
+        self.waited = 0
+        self.wait_total = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for w in self._queue if not w.future.done())
+
+    async def acquire(self, tokens: int, priority: int) -> None:
+        self._seq += 1
+        waiter = _Waiter(priority, self._seq, tokens)
+        heapq.heappush(self._queue, waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted and cancelled in the same tick: give the slot back.
+                self.release()
+            raise
+        wait = time.monotonic() - waiter.enqueued
+        self._waits.append(wait)
+        self.waited += 1
+        self.wait_total += wait
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def on_success(self) -> None:
+        self.concurrency = min(
+            float(self.max_concurrency), self.concurrency + 1.0 / self.concurrency
+        )
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> None:
+        now = time.monotonic()
+        self.paused_until = max(
+            self.paused_until,
+            now + (retry_after if retry_after is not None
+                   else _DEFAULT_RETRY_AFTER_SECONDS),
+        )
+        if now - self._last_decrease >= _DECREASE_COOLDOWN_SECONDS:
+            self.rate_limited += 1
+            self.concurrency = max(1.0, self.concurrency / 2)
+            self._last_decrease = now
+            logger.warning(
+                "provider_rate_limited",
+                provider=self.provider,
+                model=self.model,
+                concurrency=int(self.concurrency),
+            )
+
+    def observe_headers(self, headers, status_code: int) -> None:
+        for budget, header_sets in _HEADER_SETS.items():
+            bucket = self.requests if budget == "requests" else self.tokens
+            for limit_name, remaining_name, _ in header_sets:
+                limit = _int_header(headers, limit_name)
+                if limit is not None:
+                    limit = _share(limit, self.workers)
+                    if limit != bucket.limit:
+                        bucket.set_limit(limit)
+                remaining = _int_header(headers, remaining_name)
+                if remaining is not None:
+                    bucket.clamp(_share(remaining, self.workers))
+        if status_code == 429:
+            retry_after = headers.get("retry-after")
+            self.on_rate_limited(
+                _parse_reset(retry_after) if retry_after else None
+            )
+        self._dispatch()
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        p95 = waits[int(len(waits) * 0.95)] if waits else 0.0
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "concurrency_limit": int(self.concurrency),
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "workers": self.workers,
+            "rpm_limit": self.requests.limit,
+            "tpm_limit": self.tokens.limit,
+            "rate_limited": self.rate_limited,
+            "waited": self.waited,
+            "wait_avg_ms": round(self.wait_total / self.waited * 1000, 1)
+            if self.waited else 0.0,
+            "wait_p95_ms": round(p95 * 1000, 1),
+        }
+
+    def _dispatch(self) -> None:
+        while self._queue and self.in_flight < int(self.concurrency):
+            head = self._queue[0]
+            if head.future.done():
+                heapq.heappop(self._queue)
+                continue
+            delay = max(
+                self.paused_until - time.monotonic(),
+                self.requests.wait_time(1),
+                self.tokens.wait_time(head.tokens),
+            )
+            if delay > 0:
+                self._schedule(delay)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(head.tokens)
+            self.in_flight += 1
+            head.future.set_result(None)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+
+class Slot:
+    """A granted slot; report actual token usage to correct the TPM estimate."""
+
+    __slots__ = ("limiter", "estimated_tokens")
+
+    def __init__(self, limiter: ModelLimiter, estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+
+    def record_usage(self, total_tokens: int) -> None:
+        if total_tokens:
+            self.limiter.tokens.refund(self.estimated_tokens - total_tokens)
+
+
+_current_limiter: contextvars.ContextVar[Optional[ModelLimiter]] = (
+    contextvars.ContextVar("current_limiter", default=None)
+)
+
+
+async def observe_response(response) -> None:
+    """httpx response hook: feed rate-limit headers to the active limiter."""
+    limiter = _current_limiter.get()
+    if limiter is not None:
+        limiter.observe_headers(response.headers, response.status_code)
+
+
+class Scheduler:
+    def __init__(
+        self,
+        enabled: bool,
+        max_concurrency: int,
+        limits: dict,
+        workers: int = 1,
+        max_tenant_limiters: int = 1024,
+    ):
+        self.enabled = enabled
+        self._max_concurrency = max_concurrency
+        self._limits = limits
+        self._workers = workers
+        self._limiters: dict[tuple[str, str], ModelLimiter] = {}
+        self._max_tenant_limiters = max_tenant_limiters
+        self._tenant_limiters: OrderedDict[
+            tuple[str, str, str], ModelLimiter
+        ] = OrderedDict()
+
+    def limiter(
+        self, provider: str, model: str, tenant: Optional[str] = None
+    ) -> ModelLimiter:
+        if tenant is not None:
+            return self._tenant_limiter(provider, model, tenant)
+        key = (provider, model)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            config = {
+                **self._limits.get(provider, {}),
+                **self._limits.get(f"{provider}:{model}", {}),
+            }
+            limiter = ModelLimiter(
+                provider,
+                model,
+                concurrency=config.get("concurrency", self._max_concurrency),
+                rpm=config.get("rpm", 0),
+                tpm=config.get("tpm", 0),
+                workers=self._workers,
+            )
+            self._limiters[key] = limiter
+        return limiter
+
+    def _tenant_limiter(
+        self, provider: str, model: str, tenant: str
+    ) -> ModelLimiter:
+        key = (provider, model, tenant)
+        limiter = self._tenant_limiters.get(key)
+        if limiter is not None:
+            self._tenant_limiters.move_to_end(key)
+            return limiter
+        limiter = self._tenant_limiters[key] = ModelLimiter(
+            provider,
+            model,
+            concurrency=self._max_concurrency,
+            workers=self._workers,
+        )
+        excess = len(self._tenant_limiters) - self._max_tenant_limiters
+        for old_key in list(self._tenant_limiters)[:-1]:
+            if excess <= 0:
+                break
+            old = self._tenant_limiters[old_key]
+            # A limiter with calls in flight or queued is still holding them.
+            if old.in_flight == 0 and old.queue_depth == 0:
+                del self._tenant_limiters[old_key]
+                excess -= 1
+        return limiter
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        provider: str,
+        model: str,
+        tokens: int,
+        priority: int = PRIORITY_INTERACTIVE,
+        tenant: Optional[str] = None,
+    ) -> AsyncIterator[Optional[Slot]]:
+        """Hold a slot for one upstream call; yields None when disabled.
+
+        ``tenant`` identifies a BYOK key, whose calls are limited apart
+        from the platform budget.
+        """
+        if not self.enabled:
+            yield None
+            return
+        limiter = self.limiter(provider, model, tenant)
+        await limiter.acquire(tokens, priority)
+        token = _current_limiter.set(limiter)
+        try:
+            yield Slot(limiter, tokens)
+        except Exception as e:
+            if is_rate_limited(e):
+                limiter.on_rate_limited()
+            raise
+        else:
+            limiter.on_success()
+        finally:
+            try:
+                _current_limiter.reset(token)
+            except ValueError:
+                # A streaming slot closed from a different task's context.
+                pass
+            limiter.release()
+
+    def stats(self) -> list[dict]:
+        """Platform limiters only; per-tenant BYOK limiters are not listed."""
+        return [limiter.stats() for limiter in self._limiters.values()]
+
+
+scheduler = Scheduler(
+    enabled=settings.SCHEDULER_ENABLED,
+    max_concurrency=settings.SCHEDULER_MAX_CONCURRENCY,
+    limits=settings.SCHEDULER_LIMITS,
+    # 0 (one per CPU) is resolved by app.serve before workers start; a
+    # process started directly is a single worker.
+    workers=max(1, settings.AI_SERVICE_WORKERS),
+    max_tenant_limiters=settings.SCHEDULER_MAX_TENANT_LIMITERS,
+)
@@ -0,0 +1,258 @@
+"""Semantic (embedding-similarity) cache for near-duplicate prompts.
+
+The final user message is embedded and compared against previously answered
+questions from the same application; above ``SEMANTIC_CACHE_THRESHOLD``
+cosine similarity the stored answer is returned without calling the model.
+
+Entries are partitioned by ``applicationId`` and, within an application,
+by a namespace of (provider, model, temperature, system prompt) so an answer
+is only reused for the same assistant configuration. Only single-question
+prompts (no earlier turns) are eligible, since an answer that depends on
+conversation history cannot be reused for a different history.
+
+The question is embedded lazily, so a request answered by the exact cache
+never pays for it. Configured embedders run in a worker thread to keep the
+event loop free; the built-in hashed embedder is cheap enough to run inline.
+
+The embedding function and the vector index are both pluggable: the default
+embedder is a dependency-free hashed n-gram model and the default index is
+a NumPy brute-force scan, which is fast enough for a few thousand entries
+per application. Swap in a sentence-embedding model with
+``SEMANTIC_CACHE_EMBEDDER="package.module:function"`` and an ANN index by
+passing ``index_factory``.
+"""
+
+import asyncio
+import hashlib
+import importlib
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Optional, Protocol
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.ai_providers import AIProvider, ChatRequest, ChatResponse
+
+logger = get_logger("agentbase.semantic_cache")
+
+Embedder = Callable[[str], np.ndarray]
+
+_HASH_DIM = 512
+_WORD_RE = re.compile(r"\w+")
+
+
+def hashed_ngram_embedding(text: str, dim: int = _HASH_DIM) -> np.ndarray:
+    """Embed text as L2-normalised hashed word and character-trigram counts.
+
+    Robust to casing, punctuation, word order and small typos without a
+    model download. Genuine rewordings need a sentence-embedding model
+    configured through ``SEMANTIC_CACHE_EMBEDDER``.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    words = _WORD_RE.findall(text.lower())
+    for word in words:
+        vec[zlib.crc32(word.encode()) % dim] += 1.0
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vec[zlib.crc32(padded[i:i + 3].encode()) % dim] += 0.5
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def _load_embedder(path: str) -> Embedder:
+    if not path:
+        return hashed_ngram_embedding
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+class VectorIndex(Protocol):
+    """Nearest-neighbour index over normalised vectors with payloads."""
+
+    def search(self, vector: np.ndarray, namespace: int) -> tuple[float, Optional[dict]]:
+        ...
+
+    def add(self, vector: np.ndarray, namespace: int, payload: dict) -> None:
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+class BruteForceIndex:
+    """Fixed-capacity NumPy index; evicts the least recently hit entry."""
+
+    def __init__(self, dim: int, capacity: int):
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._namespaces = np.zeros(capacity, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._payloads: list[Optional[dict]] = [None] * capacity
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def search(self, vector: np.ndarray, namespace: int) -> tuple[float, Optional[dict]]:
+        if not self._size:
+            return 0.0, None
+        scores = self._vectors[:self._size] @ vector
+        scores[self._namespaces[:self._size] != namespace] = -1.0
+        best = int(np.argmax(scores))
+        if scores[best] < 0:
+            return 0.0, None
+        self._last_used[best] = time.monotonic()
+        return float(scores[best]), self._payloads[best]
+
+    def add(self, vector: np.ndarray, namespace: int, payload: dict) -> None:
+        if self._size < len(self._payloads):
+            slot = self._size
+            self._size += 1
+        else:
+            slot = int(np.argmin(self._last_used))
+        self._vectors[slot] = vector
+        self._namespaces[slot] = namespace
+        self._last_used[slot] = time.monotonic()
+        self._payloads[slot] = payload
+
+
+class SemanticProbe:
+    """A request's position in the cache; the vector is filled in on demand."""
+
+    __slots__ = ("application_id", "namespace", "text", "vector")
+
+    def __init__(self, application_id: str, namespace: int, text: str):
+        self.application_id = application_id
+        self.namespace = namespace
+        self.text = text
+        self.vector: Optional[np.ndarray] = None
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float,
+        max_entries_per_app: int,
+        max_apps: int,
+        index_factory: Optional[Callable[[int, int], VectorIndex]] = None,
+    ):
+        self._embed = embedder
+        self._threshold = threshold
+        self._max_entries = max_entries_per_app
+        self._max_apps = max_apps
+        self._index_factory = index_factory or BruteForceIndex
+        self._indexes: OrderedDict[str, VectorIndex] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+    def probe_for(
+        self,
+        provider: AIProvider,
+        request: ChatRequest,
+        application_id: Optional[str],
+        enabled: Optional[bool] = None,
+    ) -> Optional[SemanticProbe]:
+        """Locate the request's question, or return None if it is ineligible."""
+        if enabled is None:
+            enabled = settings.SEMANTIC_CACHE_ENABLED
+        if not enabled or not application_id:
+            return None
+        system = [m.content for m in request.messages if m.role == "system"]
+        turns = [m for m in request.messages if m.role != "system"]
+        if len(turns) != 1 or turns[0].role != "user":
+            return None
+        model = request.model or provider.default_model
+        digest = hashlib.sha256(
+            "\x00".join(
+                [provider.name, model, repr(float(request.temperature)), *system]
+            ).encode()
+        ).digest()
+        namespace = int.from_bytes(digest[:8], "big", signed=True)
+        return SemanticProbe(application_id, namespace, turns[0].content)
+
+    async def embed(self, probe: SemanticProbe) -> np.ndarray:
+        """Fill in the probe's vector without blocking the event loop."""
+        if probe.vector is None:
+            if self._embed is hashed_ngram_embedding:
+                probe.vector = self._embed(probe.text)
+            else:
+                probe.vector = await asyncio.to_thread(self._embed, probe.text)
+        return probe.vector
+
+    def _vector(self, probe: SemanticProbe) -> np.ndarray:
+        if probe.vector is None:
+            probe.vector = self._embed(probe.text)
+        return probe.vector
+
+    def lookup(self, probe: SemanticProbe) -> Optional[ChatResponse]:
+        index = self._indexes.get(probe.application_id)
+        score, payload = (
+            index.search(self._vector(probe), probe.namespace)
+            if index else (0.0, None)
+        )
+        if payload is None or score < self._threshold:
+            self.misses += 1
+            return None
+        self._indexes.move_to_end(probe.application_id)
+        self.hits += 1
+        self.latency_saved_ms += payload["latency_ms"]
+        return ChatResponse(
+            content=payload["content"],
+            model=payload["model"],
+            provider=payload["provider"],
+            usage={
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cache": "semantic_hit",
+                "similarity": round(score, 4),
+            },
+        )
+
+    def put(
+        self, probe: SemanticProbe, response: ChatResponse, latency_ms: float
+    ) -> None:
+        vector = self._vector(probe)
+        index = self._indexes.get(probe.application_id)
+        if index is None:
+            index = self._index_factory(len(vector), self._max_entries)
+            self._indexes[probe.application_id] = index
+            while len(self._indexes) > self._max_apps:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(probe.application_id)
+        index.add(vector, probe.namespace, {
+            "content": response.content,
+            "model": response.model,
+            "provider": response.provider,
+            "latency_ms": latency_ms,
+        })
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+            "applications": len(self._indexes),
+            "entries": sum(len(i) for i in self._indexes.values()),
+        }
+
+    def clear(self) -> None:
+        self._indexes.clear()
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+
+
+semantic_cache = SemanticCache(
+    embedder=_load_embedder(settings.SEMANTIC_CACHE_EMBEDDER),
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries_per_app=settings.SEMANTIC_CACHE_MAX_ENTRIES_PER_APP,
+    max_apps=settings.SEMANTIC_CACHE_MAX_APPS,
+)
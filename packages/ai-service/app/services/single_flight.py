@@ -0,0 +1,187 @@
+"""Request coalescing (single-flight) for identical in-flight provider calls.
+
+Concurrent identical requests — same key as the response cache — share one
+upstream call. ``chat`` callers await a single shared task; ``chat_stream``
+callers subscribe to one upstream generator through a ``Broadcaster`` that
+gives each subscriber a bounded queue. A subscriber that falls more than
+``SINGLE_FLIGHT_SUBSCRIBER_BUFFER`` chunks behind is dropped with an error
+rather than stalling everyone else.
+
+Keys are the response-cache digest scoped to the application and to the
+provider's tenant, so BYOK callers never share a call billed to someone
+else's key. Only the caller that triggered the upstream call reports its
+token usage; coalesced followers report zero tokens, like cache hits.
+"""
+
+import asyncio
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.ai_providers import ChatResponse
+
+logger = get_logger("agentbase.single_flight")
+
+_END = object()
+
+
+class SubscriberTooSlow(RuntimeError):
+    """Raised in a stream subscriber that could not keep up with upstream."""
+
+
+def _follower_usage(usage: dict) -> dict:
+    return {
+        **usage,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "coalesced": True,
+    }
+
+
+class _Subscriber:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, backlog: list[str], maxsize: int):
+        # Late joiners start with everything broadcast so far.
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize + len(backlog))
+        for chunk in backlog:
+            self.queue.put_nowait(chunk)
+        self.dropped = False
+
+
+class Broadcaster:
+    """Fans one upstream chunk generator out to many subscribers."""
+
+    def __init__(
+        self,
+        upstream: AsyncGenerator[str, None],
+        buffer: int,
+        on_done: Callable[[], None],
+    ):
+        self._upstream = upstream
+        self._buffer = buffer
+        self._on_done = on_done
+        self._chunks: list[str] = []
+        self._subscribers: set[_Subscriber] = set()
+        self._error: Optional[BaseException] = None
+        self._finished = False
+        self._task = asyncio.create_task(self._pump())
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        sub = _Subscriber(self._chunks, self._buffer)
+        if self._finished:
+            sub.queue.put_nowait(_END)
+        self._subscribers.add(sub)
+        try:
+            while True:
+                item = await sub.queue.get()
+                if item is _END:
+                    break
+                yield item
+            if sub.dropped:
+                raise SubscriberTooSlow("Stream consumer fell too far behind")
+            if self._error is not None:
+                raise self._error
+        finally:
+            self._subscribers.discard(sub)
+            if not self._subscribers and not self._finished:
+                # Nobody is listening any more; stop paying for tokens.
+                self._task.cancel()
+
+    async def _pump(self) -> None:
+        try:
+            async for chunk in self._upstream:
+                self._chunks.append(chunk)
+                for sub in list(self._subscribers):
+                    try:
+                        sub.queue.put_nowait(chunk)
+                    except asyncio.QueueFull:
+                        self._drop(sub)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._error = e
+        finally:
+            self._finished = True
+            self._on_done()
+            await self._upstream.aclose()
+            for sub in list(self._subscribers):
+                self._end(sub)
+
+    def _drop(self, sub: _Subscriber) -> None:
+        sub.dropped = True
+        self._subscribers.discard(sub)
+        self._end(sub)
+
+    @staticmethod
+    def _end(sub: _Subscriber) -> None:
+        # The queue may be full; make room so the terminator always lands.
+        if sub.queue.full():
+            sub.queue.get_nowait()
+            sub.dropped = True
+        sub.queue.put_nowait(_END)
+
+
+class SingleFlight:
+    def __init__(self, subscriber_buffer: int):
+        self._buffer = subscriber_buffer
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, Broadcaster] = {}
+        self.coalesced = 0
+
+    async def chat(
+        self, key: str, call: Callable[[], Awaitable[ChatResponse]]
+    ) -> ChatResponse:
+        """Await the in-flight call for ``key``, starting it if there is none."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._settle(key, t))
+            # Shielded so a leader that disconnects does not cancel followers.
+            return await asyncio.shield(task)
+        self.coalesced += 1
+        response = await asyncio.shield(task)
+        return response.model_copy(
+            update={"usage": _follower_usage(response.usage)}
+        )
+
+    def _settle(self, key: str, task: asyncio.Task) -> None:
+        self._calls.pop(key, None)
+        # Retrieve the error even if every waiter has already gone away.
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(
+                "single_flight_call_failed", key=key, error=str(task.exception())
+            )
+
+    def stream(
+        self, key: str, open_stream: Callable[[], AsyncGenerator[str, None]]
+    ) -> tuple[AsyncGenerator[str, None], bool]:
+        """Subscribe to the in-flight stream for ``key``, opening it if needed.
+
+        Returns the subscription and whether it joined an existing stream.
+        """
+        broadcaster = self._streams.get(key)
+        joined = broadcaster is not None
+        if broadcaster is None:
+            broadcaster = Broadcaster(
+                open_stream(),
+                self._buffer,
+                on_done=lambda: self._streams.pop(key, None),
+            )
+            self._streams[key] = broadcaster
+        else:
+            self.coalesced += 1
+        return broadcaster.subscribe(), joined
+
+    def stats(self) -> dict:
+        return {
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
+
+
+single_flight = SingleFlight(
+    subscriber_buffer=settings.SINGLE_FLIGHT_SUBSCRIBER_BUFFER
+)
@@ -0,0 +1,112 @@
+"""Incremental Server-Sent Events decoding for provider streams.
+
+``SSEDecoder.feed`` takes raw body chunks as they arrive from
+``aiter_bytes`` and returns the events they complete, so a stream is
+parsed straight off the wire rather than re-buffered into text lines
+first. Chunk boundaries can fall anywhere, including inside a UTF-8
+sequence or between the ``\\r`` and ``\\n`` of a line ending. Parsing
+follows the WHATWG event-stream rules: ``\\n``, ``\\r\\n`` and ``\\r``
+line endings, multi-line ``data``, ``:`` comments, and the ``event``,
+``id`` and ``retry`` fields.
+"""
+
+from typing import AsyncIterable, AsyncIterator, Optional
+
+
+class SSEEvent:
+    """One dispatched event."""
+
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(
+        self,
+        data: str,
+        event: str = "message",
+        id: Optional[str] = None,
+        retry: Optional[int] = None,
+    ):
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data!r})"
+
+
+class SSEDecoder:
+    def __init__(self):
+        self._buffer = bytearray()
+        # The previous chunk ended in "\r"; a leading "\n" belongs to it.
+        self._after_cr = False
+        self._data: list[str] = []
+        self._event = ""
+        self._id: Optional[str] = None
+        self._retry: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> list[SSEEvent]:
+        """Events completed by ``chunk``, in order."""
+        if self._after_cr and chunk[:1] == b"\n":
+            chunk = chunk[1:]
+        self._after_cr = False
+        if not chunk:
+            return []
+        buffer = self._buffer
+        buffer += chunk
+        events: list[SSEEvent] = []
+        start = 0
+        end = len(buffer)
+        while start < end:
+            lf = buffer.find(b"\n", start)
+            cr = buffer.find(b"\r", start, lf if lf >= 0 else end)
+            if cr >= 0:
+                stop, start_next = cr, cr + 1
+                if cr + 1 < end and buffer[cr + 1] == 0x0A:
+                    start_next += 1
+                elif cr + 1 == end:
+                    self._after_cr = True
+            elif lf >= 0:
+                stop, start_next = lf, lf + 1
+            else:
+                break
+            event = self._line(bytes(buffer[start:stop]))
+            if event is not None:
+                events.append(event)
+            start = start_next
+        del buffer[:start]
+        return events
+
+    def _line(self, line: bytes) -> Optional[SSEEvent]:
+        if not line:
+            return self._dispatch()
+        if line[:1] == b":":
+            return None
+        name, sep, value = line.partition(b":")
+        if sep and value[:1] == b" ":
+            value = value[1:]
+        if name == b"data":
+            self._data.append(value.decode("utf-8", "replace"))
+        elif name == b"event":
+            self._event = value.decode("utf-8", "replace")
+        elif name == b"id":
+            if b"\0" not in value:
+                self._id = value.decode("utf-8", "replace")
+        elif name == b"retry":
+            if value.isdigit():
+                self._retry = int(value)
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        data, event = self._data, self._event
+        self._data, self._event = [], ""
+        if not data:
+            return None
+        return SSEEvent("\n".join(data), event or "message", self._id, self._retry)
+
+
+async def aiter_events(chunks: AsyncIterable[bytes]) -> AsyncIterator[SSEEvent]:
+    """Decode an async stream of body chunks into events."""
+    decoder = SSEDecoder()
+    async for chunk in chunks:
+        for event in decoder.feed(chunk):
+            yield event
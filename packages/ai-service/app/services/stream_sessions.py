@@ -0,0 +1,299 @@
+"""Resumable streaming sessions with incremental persistence.
+
+A streamed generation runs as a background producer task that is decoupled
+from the HTTP response that started it. Chunks are buffered in memory for
+live subscribers and flushed to MongoDB in small batches
+(``ai_stream_chunks``), so:
+
+- a client that disconnects can reconnect with ``Last-Event-ID`` and get
+  the chunks it missed replayed before joining the live stream;
+- a reconnect that lands on another replica replays from MongoDB and then
+  follows newly flushed batches;
+- if the pod dies mid-generation, everything up to the last flush survives
+  and the session is reported as interrupted.
+
+A failed flush never interrupts the stream: it is logged and the same
+batch is written again on the next flush, under the same id, so a write
+that landed despite the error is not stored twice.
+
+SSE event IDs are the 1-based chunk sequence numbers.
+"""
+
+import asyncio
+import time
+from datetime import datetime
+from typing import AsyncGenerator, Awaitable, Callable, Optional
+
+from bson import ObjectId  # type: ignore
+from pymongo import IndexModel  # type: ignore
+
+from app.core.config import settings
+from app.core.database import IndexSpec, get_db
+from app.core.logging import get_logger
+
+logger = get_logger("agentbase.streams")
+
+STREAMS_COLLECTION = "ai_streams"
+CHUNKS_COLLECTION = "ai_stream_chunks"
+
+STATUS_STREAMING = "streaming"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+# Called once the upstream finishes with (full_response, usage); persists the
+# exchange to the conversation before the final "done" event is released.
+OnComplete = Callable[[str, dict], Awaitable[None]]
+
+
+class StreamEvent:
+    """One event delivered to a subscriber."""
+
+    __slots__ = ("seq", "type", "content", "usage")
+
+    def __init__(
+        self, seq: Optional[int], type: str, content: str, usage: Optional[dict] = None
+    ):
+        self.seq = seq
+        self.type = type
+        self.content = content
+        self.usage = usage or {}
+
+
+class StreamSession:
+    def __init__(self, conversation_id: str, chunks, on_complete: OnComplete):
+        self.id = str(ObjectId())
+        self.conversation_id = conversation_id
+        self.status = STATUS_STREAMING
+        self.error: Optional[str] = None
+        self.usage: dict = {}
+        self._source = chunks
+        self._on_complete = on_complete
+        self._chunks: list[str] = []
+        self._flushed = 0
+        # End of a batch whose write failed; retried as-is on the next flush.
+        self._retry_end: Optional[int] = None
+        self._last_flush = time.monotonic()
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status != STATUS_STREAMING
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._produce())
+
+    async def cancel(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def follow(self, after: int = 0) -> AsyncGenerator[StreamEvent, None]:
+        """Yield chunks after sequence ``after``, then the terminal event."""
+        sent = after
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: len(self._chunks) > sent or self.finished
+                )
+                pending = self._chunks[sent:]
+                finished = self.finished
+            for chunk in pending:
+                sent += 1
+                yield StreamEvent(sent, "chunk", chunk)
+            if finished and sent >= len(self._chunks):
+                break
+        yield self._terminal_event()
+
+    def _terminal_event(self) -> StreamEvent:
+        if self.status == STATUS_ERROR:
+            return StreamEvent(None, "error", self.error or "Stream failed")
+        return StreamEvent(None, "done", "".join(self._chunks), self.usage)
+
+    async def _produce(self) -> None:
+        try:
+            await self._persist_header()
+            async for chunk in self._source:
+                async with self._changed:
+                    self._chunks.append(chunk)
+                    self._changed.notify_all()
+                if self._flush_due():
+                    await self._flush()
+            self.usage = getattr(self._source, "usage", {}) or {}
+            await self._flush()
+            await self._on_complete("".join(self._chunks), self.usage)
+            await self._finish(STATUS_DONE)
+        except asyncio.CancelledError:
+            await self._finish(STATUS_ERROR, "Stream interrupted")
+            raise
+        except Exception as e:
+            await self._finish(STATUS_ERROR, str(e))
+        finally:
+            await self._source.aclose()
+            _sessions.pop(self.id, None)
+
+    def _flush_due(self) -> bool:
+        pending = len(self._chunks) - self._flushed
+        return pending >= settings.STREAM_FLUSH_MAX_CHUNKS or (
+            pending
+            and (time.monotonic() - self._last_flush) * 1000
+            >= settings.STREAM_FLUSH_INTERVAL_MS
+        )
+
+    async def _flush(self) -> None:
+        """Persist every unflushed chunk; failures are logged, not raised."""
+        self._last_flush = time.monotonic()
+        db = get_db()
+        if db is None:
+            return
+        while self._flushed < len(self._chunks):
+            end = self._retry_end or len(self._chunks)
+            start = self._flushed + 1
+            now = datetime.utcnow()
+            try:
+                await db[CHUNKS_COLLECTION].replace_one(
+                    {"_id": f"{self.id}:{start}"},
+                    {
+                        "streamId": self.id,
+                        "start": start,
+                        "chunks": self._chunks[self._flushed:end],
+                        "createdAt": now,
+                    },
+                    upsert=True,
+                )
+            except Exception as e:
+                self._retry_end = end
+                logger.warning(
+                    "stream_flush_failed", stream_id=self.id, error=str(e)
+                )
+                return
+            self._retry_end = None
+            self._flushed = end
+            try:
+                await db[STREAMS_COLLECTION].update_one(
+                    {"_id": self.id},
+                    {"$set": {"chunkCount": self._flushed, "updatedAt": now}},
+                )
+            except Exception as e:
+                logger.warning(
+                    "stream_flush_failed", stream_id=self.id, error=str(e)
+                )
+
+    async def _persist_header(self) -> None:
+        db = get_db()
+        if db is None:
+            return
+        now = datetime.utcnow()
+        await db[STREAMS_COLLECTION].insert_one({
+            "_id": self.id,
+            "conversationId": self.conversation_id,
+            "status": STATUS_STREAMING,
+            "chunkCount": 0,
+            "createdAt": now,
+            "updatedAt": now,
+        })
+
+    async def _finish(self, status: str, error: Optional[str] = None) -> None:
+        await self._flush()
+        async with self._changed:
+            self.status = status
+            self.error = error
+            self._changed.notify_all()
+        db = get_db()
+        if db is not None:
+            await db[STREAMS_COLLECTION].update_one(
+                {"_id": self.id},
+                {"$set": {
+                    "status": status,
+                    "error": error,
+                    "usage": self.usage,
+                    "updatedAt": datetime.utcnow(),
+                }},
+            )
+
+
+# Sessions whose producer is running in this process.
+_sessions: dict[str, StreamSession] = {}
+
+
+def start_session(
+    conversation_id: str, chunks, on_complete: OnComplete
+) -> StreamSession:
+    """Start producing ``chunks`` in the background and return the session.
+
+    ``chunks`` is an async iterator with ``aclose()`` (e.g. a
+    ``chat_pipeline.ChatStream``); its ``usage`` attribute, if any, is read
+    once it is exhausted.
+    """
+    session = StreamSession(conversation_id, chunks, on_complete)
+    _sessions[session.id] = session
+    session.start()
+    return session
+
+
+def get_live_session(stream_id: str) -> Optional[StreamSession]:
+    return _sessions.get(stream_id)
+
+
+async def replay_persisted(
+    stream_id: str, after: int = 0
+) -> AsyncGenerator[StreamEvent, None]:
+    """Replay a stream owned by another process (or a dead one) from MongoDB.
+
+    Follows newly flushed batches while the owner is still producing; a
+    stream whose header has not been touched for ``STREAM_STALE_SECONDS`` is
+    treated as interrupted.
+    """
+    db = get_db()
+    header = await db[STREAMS_COLLECTION].find_one({"_id": stream_id})
+    if header is None:
+        return
+    chunks: list[str] = []
+    sent = after
+    while True:
+        cursor = db[CHUNKS_COLLECTION].find(
+            {"streamId": stream_id, "start": {"$gt": len(chunks)}},
+            {"chunks": 1, "_id": 0},
+        ).sort("start", 1)
+        async for batch in cursor:
+            chunks.extend(batch["chunks"])
+        while sent < len(chunks):
+            sent += 1
+            yield StreamEvent(sent, "chunk", chunks[sent - 1])
+
+        header = await db[STREAMS_COLLECTION].find_one({"_id": stream_id})
+        status = header["status"]
+        stale = (
+            datetime.utcnow() - header["updatedAt"]
+        ).total_seconds() > settings.STREAM_STALE_SECONDS
+        if status == STATUS_STREAMING and not stale:
+            await asyncio.sleep(settings.STREAM_FLUSH_INTERVAL_MS / 1000)
+            continue
+        if status == STATUS_DONE:
+            yield StreamEvent(None, "done", "".join(chunks), header.get("usage"))
+        else:
+            yield StreamEvent(
+                None, "error", header.get("error") or "Stream interrupted"
+            )
+        return
+
+
+INDEXES: list[IndexSpec] = [
+    (CHUNKS_COLLECTION, IndexModel(
+        [("streamId", 1), ("start", 1)], name="stream_start"
+    )),
+    *(
+        (collection, IndexModel(
+            "createdAt",
+            expireAfterSeconds=settings.STREAM_RETENTION_SECONDS,
+            name="created_at_ttl",
+        ))
+        for collection in (STREAMS_COLLECTION, CHUNKS_COLLECTION)
+    ),
+]
+
+
+async def shutdown() -> None:
+    """Cancel in-flight producers; their flushed output stays resumable."""
+    for session in list(_sessions.values()):
+        await session.cancel()
@@ -0,0 +1,107 @@
+"""Run the load-test scenarios against an in-memory service.
+
+Run from ``packages/ai-service``::
+
+    python -m benchmarks                       # every scenario
+    python -m benchmarks chat stream --concurrency 100 --latency-ms 300 \\
+        --tokens-per-second 60 --output-tokens 200
+    python -m benchmarks --json after.json --compare before.json
+
+Defaults simulate an instant provider, so the numbers are this service's
+own overhead. MongoDB is mongomock (``requirements-test.txt``), which is
+slower than a real server: compare runs with each other, not with
+production.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from dataclasses import asdict
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from benchmarks import harness  # noqa: E402
+from benchmarks.scenarios import SCENARIOS  # noqa: E402
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Load-test the AI service with a fake provider.",
+    )
+    parser.add_argument(
+        "scenarios", nargs="*", choices=[[], *SCENARIOS], default=[],
+        metavar="scenario", help=f"any of {', '.join(SCENARIOS)} (default: all)",
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="simulated time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--output-tokens", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0,
+                        help="fraction of provider calls answered with a 429")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--history", type=int, default=2000,
+                        help="messages per conversation in long_history")
+    parser.add_argument("--byok-keys", type=int, default=256,
+                        help="distinct BYOK keys in byok_churn")
+    parser.add_argument("--byok-pool-size", type=int, default=64)
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="show deltas against an earlier --json file")
+    return parser.parse_args(argv)
+
+
+async def main(args: argparse.Namespace) -> dict:
+    profile = harness.Profile(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        # A fresh database and provider per scenario keeps them independent.
+        app = harness.setup_service(profile, args.byok_pool_size)
+        request = await SCENARIOS[name](app, args)
+        samples, elapsed = await harness.run(
+            request, args.requests, args.concurrency, args.warmup
+        )
+        results.append(harness.summarize(name, samples, elapsed))
+    return {
+        "environment": harness.environment(),
+        "profile": asdict(profile),
+        "options": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "history": args.history,
+            "byok_keys": args.byok_keys,
+            "byok_pool_size": args.byok_pool_size,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("options") != report["options"] or (
+            baseline.get("profile") != report["profile"]
+        ):
+            print("warning: baseline was run with different options",
+                  file=sys.stderr)
+    print(harness.format_table(report["results"], baseline))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
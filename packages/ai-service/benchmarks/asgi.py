@@ -0,0 +1,74 @@
+"""Minimal in-process ASGI client for benchmarks.
+
+httpx's ``ASGITransport`` buffers the whole response, which hides streaming
+behaviour; this calls the app directly and hands every body message to a
+callback as it is sent, so time-to-first-chunk can be measured. No sockets
+are involved, so results measure the framework and service path only.
+"""
+
+import asyncio
+import json
+from typing import Any, Callable, Optional
+
+
+async def call(
+    app,
+    method: str,
+    path: str,
+    body: Any = None,
+    headers: tuple[tuple[bytes, bytes], ...] = (),
+    on_body: Optional[Callable[[bytes], None]] = None,
+) -> int:
+    """Send one request through ``app`` and return the response status.
+
+    ``body`` is sent as JSON. ``on_body`` is called with each chunk of the
+    response body as the app sends it.
+    """
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            *headers,
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    done = asyncio.Event()
+    requested = False
+    status = 0
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk and on_body is not None:
+                on_body(chunk)
+            if not message.get("more_body", False):
+                done.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    return status
@@ -0,0 +1,176 @@
+"""Load-test harness: an in-memory service, a closed-loop runner and reports.
+
+``setup_service`` points the real app at a mongomock database and a
+``FakeProvider`` (platform and BYOK), so every request runs the full router,
+pipeline, scheduler, routing and persistence path with no network. ``run``
+keeps ``concurrency`` requests in flight until ``requests`` have completed.
+Reports carry the commit and every knob, so JSON results from two commits
+can be compared with ``--compare``.
+"""
+
+import asyncio
+import platform
+import statistics
+import subprocess
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+
+
+@dataclass
+class Profile:
+    """Simulated upstream behaviour (see ``FakeProvider``)."""
+
+    latency_ms: float = 0.0
+    tokens_per_second: float = 0.0
+    output_tokens: int = 0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: Optional[int] = 1
+
+
+@dataclass
+class Sample:
+    ok: bool
+    latency: float
+    ttft: Optional[float] = None
+
+
+def setup_service(profile: Profile, byok_pool_size: int):
+    """Wire the app to in-memory MongoDB and the fake provider; return it."""
+    from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+    from app.core import database
+    from app.core.config import settings
+    from app.main import app
+    from app.services.ai_providers import ProviderRegistry
+    from app.services.client_pool import ProviderClientPool
+    from app.services.fake_provider import FakeProvider
+    from app.services.routing import routing
+    from app.services.scheduler import scheduler
+
+    def byok_client(name: str, api_key: str):
+        if name != "fake":
+            return None
+        # Seeded per key, so recreated clients do not replay one sequence.
+        seed = profile.seed
+        if seed is not None:
+            seed = seed * 1_000_003 + zlib.crc32(api_key.encode())
+        return FakeProvider(**{**asdict(profile), "seed": seed})
+
+    database.db = AsyncMongoMockClient()["agentbase_bench"]
+    # Breaker and rate-limit state from an earlier scenario would skew this one.
+    routing._breakers.pop("fake", None)
+    for key in [k for k in scheduler._limiters if k[0] == "fake"]:
+        del scheduler._limiters[key]
+    ProviderRegistry._providers = {}
+    ProviderRegistry.register(FakeProvider(**asdict(profile)))
+    # BYOK keys get their own fake client each, so churn exercises the pool.
+    ProviderRegistry._byok_pool = ProviderClientPool(
+        byok_client,
+        max_size=byok_pool_size,
+        idle_ttl=settings.BYOK_POOL_IDLE_TTL_SECONDS,
+    )
+    return app
+
+
+async def run(
+    request: Callable[[int], Awaitable[Sample]],
+    requests: int,
+    concurrency: int,
+    warmup: int = 0,
+) -> tuple[list[Sample], float]:
+    """Run ``request(i)`` for i in range(requests) with fixed concurrency."""
+    for i in range(warmup):
+        await request(-1 - i)
+    samples: list[Sample] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            samples.append(await request(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def _percentiles(values: list[float]) -> Optional[dict]:
+    if not values:
+        return None
+    if len(values) == 1:
+        ms = round(values[0] * 1000, 2)
+        return {"p50": ms, "p95": ms, "p99": ms}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 2),
+        "p95": round(cuts[94] * 1000, 2),
+        "p99": round(cuts[98] * 1000, 2),
+    }
+
+
+def summarize(scenario: str, samples: list[Sample], elapsed: float) -> dict:
+    ok = [s for s in samples if s.ok]
+    return {
+        "scenario": scenario,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": _percentiles([s.latency for s in ok]),
+        "ttft_ms": _percentiles([s.ttft for s in ok if s.ttft is not None]),
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def _cell(stats: Optional[dict], key: str) -> str:
+    return f"{stats[key]:.1f}" if stats else "-"
+
+
+def format_table(results: list[dict], baseline: Optional[dict] = None) -> str:
+    """Human-readable results; with ``baseline``, rps/p95 deltas in percent."""
+    before = {r["scenario"]: r for r in (baseline or {}).get("results", [])}
+    header = (f"{'scenario':14}{'reqs':>7}{'errs':>6}{'rps':>9}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+              f"{'ttft p50':>10}{'ttft p95':>10}")
+    if before:
+        header += f"{'Δrps':>10}{'Δp95':>10}"
+    lines = [header]
+    for r in results:
+        lat, ttft = r["latency_ms"], r["ttft_ms"]
+        line = (f"{r['scenario']:14}{r['requests']:>7}{r['errors']:>6}"
+                f"{r['rps']:>9.1f}{_cell(lat, 'p50'):>9}{_cell(lat, 'p95'):>9}"
+                f"{_cell(lat, 'p99'):>9}{_cell(ttft, 'p50'):>10}"
+                f"{_cell(ttft, 'p95'):>10}")
+        old = before.get(r["scenario"])
+        if old:
+            line += f"{_delta(old['rps'], r['rps']):>10}"
+            line += f"{_delta(_p95(old), _p95(r)):>10}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _p95(result: dict) -> Optional[float]:
+    return result["latency_ms"]["p95"] if result["latency_ms"] else None
+
+
+def _delta(old: Optional[float], new: Optional[float]) -> str:
+    if not old or new is None:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
@@ -0,0 +1,170 @@
+"""Middleware overhead: ``BaseHTTPMiddleware`` functions vs pure ASGI.
+
+Builds the same two-route app twice, once with the legacy
+``@app.middleware("http")`` auth/logging functions and once with
+``app.core.middleware``, and drives each in-process through a minimal ASGI
+client (``benchmarks.asgi``):
+
+- ``GET /ping``: small JSON responses, reported as requests/sec.
+- ``GET /stream``: an SSE-style stream, reported as the delay between the
+  route yielding a chunk and the server's ``send`` receiving it.
+
+Run from ``packages/ai-service``::
+
+    python -m benchmarks.middleware [--requests 5000] [--streams 200]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Optional
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+from app.core import metrics  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.logging import get_logger, setup_logging  # noqa: E402
+from app.core.middleware import (  # noqa: E402
+    OPEN_PATHS,
+    InternalTokenMiddleware,
+    RequestLogMiddleware,
+)
+from benchmarks.asgi import call  # noqa: E402
+
+TOKEN = "bench-token"
+logger = get_logger("agentbase.bench")
+
+
+def _routes(app: FastAPI, chunks: int) -> FastAPI:
+    @app.get("/api/ai/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/api/ai/stream")
+    async def stream():
+        async def events():
+            for _ in range(chunks):
+                await asyncio.sleep(0)
+                yield f"data: {time.perf_counter_ns()}\n\n".encode()
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def legacy_app(chunks: int) -> FastAPI:
+    """The middleware as it was before ``app.core.middleware``."""
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def internal_token_auth(request: Request, call_next):
+        path = request.url.path
+        if (
+            settings.INTERNAL_SERVICE_TOKEN
+            and path.startswith("/api/ai/")
+            and path not in OPEN_PATHS
+        ):
+            token = request.headers.get("x-internal-token")
+            if not token or token != settings.INTERNAL_SERVICE_TOKEN:
+                return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        metrics.observe_http(
+            request.method,
+            route.path if route is not None else "unmatched",
+            response.status_code,
+            elapsed,
+        )
+        logger.info(
+            "http_request",
+            method=request.method,
+            path=request.url.path,
+            status=response.status_code,
+            duration_ms=round(elapsed * 1000, 1),
+        )
+        return response
+
+    return _routes(app, chunks)
+
+
+def asgi_app(chunks: int) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(InternalTokenMiddleware)
+    app.add_middleware(RequestLogMiddleware)
+    return _routes(app, chunks)
+
+
+async def _get(app, path: str, chunk_delays: Optional[list[float]] = None) -> int:
+    def on_body(body: bytes) -> None:
+        if chunk_delays is not None and body.startswith(b"data: "):
+            sent = int(body[6:].strip())
+            chunk_delays.append((time.perf_counter_ns() - sent) / 1000)
+
+    return await call(
+        app, "GET", path,
+        headers=((b"x-internal-token", TOKEN.encode()),),
+        on_body=on_body,
+    )
+
+
+def _pct(values: list[float], q: float) -> float:
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else 0.0
+
+
+async def measure(app, requests: int, streams: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(path, delays=None):
+        async with semaphore:
+            assert await _get(app, path, delays) == 200
+
+    await asyncio.gather(*(one("/api/ai/ping") for _ in range(100)))  # warm-up
+    start = time.perf_counter()
+    await asyncio.gather(*(one("/api/ai/ping") for _ in range(requests)))
+    rps = requests / (time.perf_counter() - start)
+
+    delays: list[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(one("/api/ai/stream", delays) for _ in range(streams)))
+    stream_seconds = time.perf_counter() - start
+    return {
+        "rps": rps,
+        "chunk_p50_us": _pct(delays, 50),
+        "chunk_p99_us": _pct(delays, 99),
+        "chunks_per_s": len(delays) / stream_seconds,
+    }
+
+
+async def main(args) -> None:
+    setup_logging()
+    settings.INTERNAL_SERVICE_TOKEN = TOKEN
+    results = {}
+    for name, build in (("BaseHTTPMiddleware", legacy_app), ("pure ASGI", asgi_app)):
+        results[name] = await measure(
+            build(args.chunks), args.requests, args.streams, args.concurrency
+        )
+    print(f"{'':20}{'req/s':>10}{'chunk p50 µs':>14}{'chunk p99 µs':>14}"
+          f"{'chunks/s':>12}")
+    for name, r in results.items():
+        print(f"{name:20}{r['rps']:>10.0f}{r['chunk_p50_us']:>14.1f}"
+              f"{r['chunk_p99_us']:>14.1f}{r['chunks_per_s']:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
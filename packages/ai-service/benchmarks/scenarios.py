@@ -0,0 +1,130 @@
+"""Benchmark scenarios.
+
+Each scenario prepares its data, then returns a ``request(i)`` coroutine
+function for ``harness.run``. Requests bypass the response caches so every
+one reaches the (fake) provider.
+"""
+
+import json
+import time
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from bson import ObjectId  # type: ignore
+
+from benchmarks.asgi import call
+from benchmarks.harness import Sample
+
+Request = Callable[[int], Awaitable[Sample]]
+
+_CHUNK_MARKER = b'"type":"chunk"'
+_ERROR_MARKER = b'"type":"error"'
+
+
+def _body(i: int, **extra) -> dict:
+    return {
+        "content": f"benchmark question number {i}",
+        "provider": "fake",
+        "cache": False,
+        "semantic_cache": False,
+        **extra,
+    }
+
+
+async def _conversations(app, count: int) -> list[str]:
+    ids = []
+    for n in range(count):
+        captured: list[bytes] = []
+        status = await call(
+            app, "POST", "/api/ai/conversations",
+            {"application_id": "bench", "user_id": f"user-{n}"},
+            on_body=captured.append,
+        )
+        if status != 200:
+            raise RuntimeError(f"Creating a conversation failed with {status}")
+        ids.append(json.loads(b"".join(captured))["id"])
+    return ids
+
+
+def _turns(
+    app, ids: list[str], extra: Callable[[int], dict] = lambda i: {}
+) -> Request:
+    async def request(i: int) -> Sample:
+        start = time.perf_counter()
+        status = await call(
+            app, "POST", f"/api/ai/conversations/{ids[i % len(ids)]}/messages",
+            _body(i, **extra(i)),
+        )
+        return Sample(status == 200, time.perf_counter() - start)
+
+    return request
+
+
+async def chat(app, opts) -> Request:
+    """Non-streaming turns spread over one conversation per client."""
+    return _turns(app, await _conversations(app, opts.concurrency))
+
+
+async def stream(app, opts) -> Request:
+    """SSE turns; TTFT is the first chunk event reaching the client."""
+    ids = await _conversations(app, opts.concurrency)
+
+    async def request(i: int) -> Sample:
+        start = time.perf_counter()
+        first = None
+        failed = False
+
+        def on_body(chunk: bytes) -> None:
+            nonlocal first, failed
+            if first is None and _CHUNK_MARKER in chunk:
+                first = time.perf_counter() - start
+            if _ERROR_MARKER in chunk:
+                failed = True
+
+        status = await call(
+            app, "POST", f"/api/ai/conversations/{ids[i % len(ids)]}/stream",
+            _body(i), on_body=on_body,
+        )
+        return Sample(
+            status == 200 and not failed, time.perf_counter() - start, first
+        )
+
+    return request
+
+
+async def long_history(app, opts) -> Request:
+    """Turns on conversations that already hold ``opts.history`` messages."""
+    from app.core.database import get_db
+    from app.services import message_store
+
+    ids = await _conversations(app, opts.concurrency)
+    db = get_db()
+    for cid in ids:
+        for offset in range(0, opts.history, 100):
+            now = datetime.utcnow()
+            await message_store.append_messages(db, ObjectId(cid), [
+                {
+                    "role": "user" if (offset + n) % 2 == 0 else "assistant",
+                    "content": f"earlier message {offset + n} " + "word " * 40,
+                    "timestamp": now,
+                }
+                for n in range(min(100, opts.history - offset))
+            ])
+    return _turns(app, ids)
+
+
+async def byok_churn(app, opts) -> Request:
+    """BYOK turns cycling through more keys than the client pool holds."""
+    return _turns(
+        app,
+        await _conversations(app, opts.concurrency),
+        lambda i: {"api_key": f"sk-bench-{i % opts.byok_keys}"},
+    )
+
+
+SCENARIOS: dict[str, Callable] = {
+    "chat": chat,
+    "stream": stream,
+    "long_history": long_history,
+    "byok_churn": byok_churn,
+}
@@ -0,0 +1,141 @@
+"""Tests for the batch chat endpoint."""
+
+import asyncio
+import json
+
+import pytest
+from bson import ObjectId  # type: ignore
+from unittest.mock import AsyncMock, MagicMock
+
+from app.routers import batch
+from app.services.ai_providers import ChatResponse, ProviderRegistry
+
+
+class _Provider:
+    name = "openai"
+    default_model = "gpt-4"
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def chat(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        content = request.messages[-1].content
+        if content == "fail":
+            raise RuntimeError("upstream exploded")
+        return ChatResponse(
+            content=content.upper(),
+            model=request.model or self.default_model,
+            provider=self.name,
+            usage={"total_tokens": 3},
+        )
+
+
+def _lines(response) -> list[dict]:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.fixture
+def provider():
+    ProviderRegistry._providers = {}
+    provider = _Provider()
+    ProviderRegistry.register(provider)
+    yield provider
+    ProviderRegistry._providers = {}
+
+
+class TestBatchEndpoint:
+    @pytest.mark.asyncio
+    async def test_streams_results_with_partial_failure(self, client, provider):
+        items = [{"id": f"i{n}", "content": f"q{n}", "cache": False} for n in range(5)]
+        items.append({"id": "bad", "content": "fail", "cache": False})
+
+        response = await client.post(
+            "/api/ai/batch", json={"items": items, "concurrency": 2}
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = _lines(response)
+        results = {l["id"]: l for l in lines if l["type"] == "result"}
+        assert results["i3"]["response"] == "Q3"
+        assert results["i3"]["routing"]["provider"] == "openai"
+        assert results["bad"]["status"] == "error"
+        assert results["bad"]["status_code"] == 500
+        assert lines[-1] == {
+            "type": "summary", "total": 6, "succeeded": 5, "failed": 1,
+        }
+        assert provider.peak <= 2
+
+    @pytest.mark.asyncio
+    async def test_rejects_oversized_batch(self, client, provider, monkeypatch):
+        monkeypatch.setattr(batch.settings, "BATCH_MAX_ITEMS", 1)
+        response = await client.post("/api/ai/batch", json={
+            "items": [{"content": "a"}, {"content": "b"}],
+        })
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_unknown_provider_is_an_item_error(self, client, provider):
+        response = await client.post("/api/ai/batch", json={
+            "items": [{"content": "a", "provider": "nope"}],
+        })
+        result = _lines(response)[0]
+        assert result["status_code"] == 400
+
+    @pytest.mark.asyncio
+    async def test_conversation_reads_and_writes_are_grouped(
+        self, client, provider, monkeypatch
+    ):
+        known, missing = ObjectId(), ObjectId()
+        db = MagicMock()
+
+        class _Cursor:
+            def __aiter__(self):
+                self._it = iter([{"_id": known, "applicationId": "app-1",
+                                  "storageVersion": 2, "messageCount": 0}])
+                return self
+
+            async def __anext__(self):
+                try:
+                    return next(self._it)
+                except StopIteration:
+                    raise StopAsyncIteration
+
+        db.ai_conversations.find = MagicMock(return_value=_Cursor())
+        append_many = AsyncMock(return_value=set())
+        monkeypatch.setattr(batch, "get_db", lambda: db)
+        monkeypatch.setattr(batch.message_store, "append_many", append_many)
+
+        response = await client.post("/api/ai/batch", json={"items": [
+            {"conversation_id": str(known), "content": "one", "cache": False},
+            {"conversation_id": str(known), "content": "two", "cache": False},
+            {"conversation_id": str(missing), "content": "three"},
+        ]})
+
+        lines = _lines(response)
+        query = db.ai_conversations.find.call_args.args[0]
+        assert set(query["_id"]["$in"]) == {known, missing}
+        errors = [l for l in lines if l.get("status") == "error"]
+        assert [e["status_code"] for e in errors] == [404]
+        append_many.assert_awaited_once()
+        writes = append_many.call_args.args[1]
+        assert [w[0] for w in writes] == [known, known]
+
+
+class TestBuildRequest:
+    def test_zero_temperature_is_kept(self):
+        request = batch._build_request(
+            batch.BatchItem(content="hi", temperature=0), []
+        )
+        assert request.temperature == 0
+
+    def test_missing_temperature_uses_default(self):
+        request = batch._build_request(
+            batch.BatchItem(content="hi", temperature=None), []
+        )
+        assert request.temperature == batch.settings.DEFAULT_TEMPERATURE
@@ -0,0 +1,56 @@
+"""Smoke tests for the load-test harness, so it keeps working."""
+
+import pytest
+
+from app.core import database
+from app.services.ai_providers import ProviderRegistry
+from app.services.routing import routing
+from app.services.scheduler import scheduler
+from benchmarks import harness
+from benchmarks.__main__ import main, parse_args
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    # setup_service rewires these globals; restore them afterwards.
+    monkeypatch.setattr(database, "db", None)
+    monkeypatch.setattr(ProviderRegistry, "_providers", {})
+    monkeypatch.setattr(ProviderRegistry, "_byok_pool", ProviderRegistry._byok_pool)
+    monkeypatch.setattr(routing, "_breakers", {})
+    monkeypatch.setattr(scheduler, "_limiters", {})
+
+
+class TestHarness:
+    @pytest.mark.asyncio
+    async def test_every_scenario_runs(self):
+        report = await main(parse_args([
+            "--requests", "6", "--concurrency", "2", "--warmup", "1",
+            "--history", "120", "--byok-keys", "4", "--byok-pool-size", "2",
+        ]))
+
+        results = {r["scenario"]: r for r in report["results"]}
+        assert set(results) == {"chat", "stream", "long_history", "byok_churn"}
+        for result in results.values():
+            assert (result["requests"], result["errors"]) == (6, 0)
+            assert result["latency_ms"]["p50"] > 0
+        assert results["stream"]["ttft_ms"]["p50"] > 0
+        assert report["profile"]["seed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_are_counted(self):
+        report = await main(parse_args(
+            ["chat", "--requests", "10", "--concurrency", "1",
+             "--warmup", "0", "--error-rate", "1"]
+        ))
+        assert report["results"][0]["errors"] == 10
+        assert report["results"][0]["latency_ms"] is None
+
+    def test_comparison_table(self):
+        before = {"results": [{"scenario": "chat", "rps": 100.0,
+                               "latency_ms": {"p95": 10.0}}]}
+        after = harness.summarize(
+            "chat", [harness.Sample(True, 0.008)] * 4, elapsed=0.02
+        )
+        table = harness.format_table([after], before)
+        assert "+100.0%" in table
+        assert "-20.0%" in table
@@ -0,0 +1,87 @@
+"""Tests for the BYOK provider client pool."""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services.client_pool import ProviderClientPool
+
+
+def _factory(name: str, api_key: str):
+    if name == "unknown":
+        return None
+    provider = MagicMock()
+    provider.name = name
+    provider.aclose = AsyncMock()
+    return provider
+
+
+def _pool(max_size: int = 4, idle_ttl: float = 300.0) -> ProviderClientPool:
+    return ProviderClientPool(_factory, max_size=max_size, idle_ttl=idle_ttl)
+
+
+class TestProviderClientPool:
+    @pytest.mark.asyncio
+    async def test_same_key_reuses_client(self):
+        pool = _pool()
+        a = await pool.acquire("openai", "sk-tenant-a")
+        await pool.release(a)
+        b = await pool.acquire("openai", "sk-tenant-a")
+        assert a.provider is b.provider
+
+    @pytest.mark.asyncio
+    async def test_different_keys_never_share(self):
+        pool = _pool()
+        a = await pool.acquire("openai", "sk-tenant-a")
+        b = await pool.acquire("openai", "sk-tenant-b")
+        assert a.provider is not b.provider
+
+    @pytest.mark.asyncio
+    async def test_raw_key_not_used_as_pool_key(self):
+        pool = _pool()
+        await pool.acquire("openai", "sk-secret")
+        assert all("sk-secret" not in key for key in pool._entries)
+
+    @pytest.mark.asyncio
+    async def test_unknown_provider(self):
+        assert await _pool().acquire("unknown", "k") is None
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_closes_idle_client(self):
+        pool = _pool(max_size=1)
+        a = await pool.acquire("openai", "k1")
+        await pool.release(a)
+        await pool.acquire("openai", "k2")
+
+        assert len(pool) == 1
+        a.provider.aclose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_eviction_waits_for_in_flight_request(self):
+        pool = _pool(max_size=1)
+        a = await pool.acquire("openai", "k1")
+        await pool.acquire("openai", "k2")
+        a.provider.aclose.assert_not_awaited()
+
+        await pool.release(a)
+        a.provider.aclose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_idle_ttl_expiry(self):
+        pool = _pool(idle_ttl=0.0)
+        a = await pool.acquire("openai", "k1")
+        await pool.release(a)
+        b = await pool.acquire("openai", "k1")
+
+        assert b.provider is not a.provider
+        a.provider.aclose.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_aclose_closes_everything(self):
+        pool = _pool()
+        a = await pool.acquire("openai", "k1")
+        b = await pool.acquire("anthropic", "k2")
+        await pool.aclose()
+
+        assert len(pool) == 0
+        a.provider.aclose.assert_awaited_once()
+        b.provider.aclose.assert_awaited_once()
@@ -0,0 +1,113 @@
+"""Tests for the context budgeting pipeline stage."""
+
+import pytest
+from unittest.mock import MagicMock
+
+from app.services.ai_providers import ChatMessage, ChatRequest
+from app.services.context_budget import (
+    ContextBudget,
+    ContextBudgetExceeded,
+    context_window,
+)
+
+
+def _provider(default_model: str = "gpt-4") -> MagicMock:
+    provider = MagicMock()
+    provider.default_model = default_model
+    return provider
+
+
+def _budget() -> ContextBudget:
+    # One token per character keeps the arithmetic in the tests obvious.
+    return ContextBudget(count_tokens=len)
+
+
+class TestContextWindow:
+    def test_known_model(self):
+        assert context_window("gpt-4o") == 128000
+
+    def test_unknown_model_has_no_window(self):
+        assert context_window("some-new-model") is None
+
+
+class TestContextBudget:
+    def test_request_that_fits_is_unchanged(self):
+        request = ChatRequest(messages=[ChatMessage(role="user", content="hi")])
+        assert _budget().apply(request, _provider()) is request
+
+    def test_oldest_turns_dropped_with_placeholder(self):
+        request = ChatRequest(
+            model="gpt-4",
+            max_tokens=4000,
+            messages=[
+                ChatMessage(role="system", content="Be brief."),
+                ChatMessage(role="user", content="a" * 3000),
+                ChatMessage(role="assistant", content="b" * 3000),
+                ChatMessage(role="user", content="latest"),
+            ],
+        )
+
+        trimmed = _budget().apply(request, _provider())
+
+        roles = [m.role for m in trimmed.messages]
+        assert roles == ["system", "user"]
+        assert trimmed.messages[0].content == "Be brief."
+        assert trimmed.messages[-1].content.startswith(
+            "[2 earlier messages omitted"
+        )
+        assert trimmed.messages[-1].content.endswith("\n\nlatest")
+
+    def test_whole_turns_dropped_so_history_opens_on_user(self):
+        request = ChatRequest(
+            model="gpt-4",
+            max_tokens=2000,
+            messages=[
+                ChatMessage(role="system", content="Be brief."),
+                ChatMessage(role="assistant", content="Hello!"),
+                ChatMessage(role="user", content="a" * 3000),
+                ChatMessage(role="assistant", content="b" * 3000),
+                ChatMessage(role="user", content="c" * 500),
+                ChatMessage(role="assistant", content="d" * 500),
+                ChatMessage(role="user", content="latest"),
+            ],
+        )
+
+        trimmed = _budget().apply(request, _provider())
+
+        roles = [m.role for m in trimmed.messages]
+        assert roles == ["system", "user", "assistant", "user"]
+        assert trimmed.messages[1].content.startswith(
+            "[3 earlier messages omitted"
+        )
+        assert trimmed.messages[1].content.endswith("c" * 500)
+        assert trimmed.messages[2].content == "d" * 500
+
+    def test_unknown_model_is_not_trimmed(self):
+        request = ChatRequest(
+            model="some-new-model",
+            messages=[ChatMessage(role="user", content="x" * 50000)],
+        )
+        assert _budget().apply(request, _provider()) is request
+
+    def test_pinned_messages_too_large_raises(self):
+        request = ChatRequest(
+            model="gpt-4",
+            max_tokens=4000,
+            messages=[ChatMessage(role="user", content="x" * 5000)],
+        )
+        with pytest.raises(ContextBudgetExceeded):
+            _budget().apply(request, _provider())
+
+    def test_counts_cached_per_conversation(self):
+        calls = []
+
+        def count(text: str) -> int:
+            calls.append(text)
+            return len(text)
+
+        budget = ContextBudget(count_tokens=count)
+        request = ChatRequest(messages=[ChatMessage(role="user", content="hi")])
+        budget.apply(request, _provider(), conversation_id="c1")
+        budget.apply(request, _provider(), conversation_id="c1")
+
+        assert calls == ["hi"]
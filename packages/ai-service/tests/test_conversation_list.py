@@ -0,0 +1,156 @@
+"""Tests for keyset-paginated conversation listing."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+from app.core.database import ensure_indexes
+from app.routers import streaming as streaming_router
+from app.services import conversation_list
+from app.services.conversation_list import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = AsyncMongoMockClient()["agentbase_test"]
+    monkeypatch.setattr(streaming_router, "get_db", lambda: database)
+    monkeypatch.setattr(conversation_list, "_counts", {})
+    return database
+
+
+async def _seed(db, count: int, app: str = "app") -> list[str]:
+    base = datetime(2024, 1, 1)
+    docs = [
+        {
+            "applicationId": app,
+            "title": f"c{i}",
+            "isArchived": i % 7 == 6,
+            # Pairs share an updatedAt so the _id tiebreak is exercised.
+            "updatedAt": base + timedelta(minutes=i // 2),
+            "lastMessage": {"role": "user", "content": f"last {i}"},
+        }
+        for i in range(count)
+    ]
+    await db.ai_conversations.insert_many(docs)
+    live = [d for d in docs if not d["isArchived"]]
+    live.sort(key=lambda d: (d["updatedAt"], d["_id"]), reverse=True)
+    return [str(d["_id"]) for d in live]
+
+
+class TestCursor:
+    def test_round_trip(self):
+        from bson import ObjectId  # type: ignore
+
+        conv = {
+            "_id": ObjectId(),
+            "updatedAt": datetime(2024, 3, 1, 9, 5, 1, 123000),
+        }
+        assert decode_cursor(encode_cursor(conv)) == (
+            conv["updatedAt"], conv["_id"]
+        )
+
+    @pytest.mark.parametrize("cursor", ["", "not-base64!", "WzEsMl0", "e30"])
+    def test_rejects_garbage(self, cursor):
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+
+class TestListPage:
+    @pytest.mark.asyncio
+    async def test_pages_cover_every_conversation_once(self, db):
+        expected = await _seed(db, 23)
+        seen, cursor = [], None
+        while True:
+            page, cursor = await conversation_list.list_page(
+                db, "app", 5, cursor
+            )
+            seen += [str(c["_id"]) for c in page]
+            if cursor is None:
+                break
+
+        assert seen == expected
+
+    @pytest.mark.asyncio
+    async def test_exact_multiple_has_no_empty_last_page(self, db):
+        expected = await _seed(db, 7)  # six live conversations
+        page, cursor = await conversation_list.list_page(db, "app", 3)
+        page, cursor = await conversation_list.list_page(db, "app", 3, cursor)
+
+        assert len(expected) == 6
+        assert cursor is None
+        assert [str(c["_id"]) for c in page] == expected[3:]
+
+    @pytest.mark.asyncio
+    async def test_page_walk_projects_only_indexed_fields(self, db):
+        await _seed(db, 5)
+        indexed = {"applicationId", "isArchived", "updatedAt", "_id"}
+        assert set(conversation_list.KEY_PROJECTION) <= indexed
+
+        page, _ = await conversation_list.list_page(db, "app", 2)
+
+        assert [c["title"] for c in page] == ["c4", "c3"]
+        assert page[0]["lastMessage"]["content"] == "last 4"
+
+    @pytest.mark.asyncio
+    async def test_count_is_cached(self, db):
+        await _seed(db, 7)
+        assert await conversation_list.count(db, "app") == 6
+        await _seed(db, 7)
+        assert await conversation_list.count(db, "app") == 6
+
+    @pytest.mark.asyncio
+    async def test_count_cache_can_be_disabled(self, db, monkeypatch):
+        monkeypatch.setattr(
+            conversation_list.settings, "CONVERSATION_COUNT_TTL_SECONDS", 0
+        )
+        await _seed(db, 7)
+        assert await conversation_list.count(db, "app") == 6
+        await _seed(db, 7)
+        assert await conversation_list.count(db, "app") == 12
+
+    @pytest.mark.asyncio
+    async def test_listing_index(self, db):
+        await ensure_indexes(db, conversation_list.INDEXES)
+        info = await db.ai_conversations.index_information()
+        assert list(dict(info["app_listing"]["key"]).items()) == [
+            ("applicationId", 1), ("isArchived", 1),
+            ("updatedAt", -1), ("_id", -1),
+        ]
+
+
+class TestEndpoint:
+    @pytest.mark.asyncio
+    async def test_cursor_pages(self, client, db):
+        expected = await _seed(db, 10)
+        url = "/api/ai/conversations/by-app/app"
+
+        first = (await client.get(url, params={"limit": 4})).json()
+        second = (await client.get(url, params={
+            "limit": 4, "cursor": first["next_cursor"], "include_total": False,
+        })).json()
+
+        assert first["total"] == len(expected)
+        assert second["total"] is None
+        ids = [c["_id"] for c in first["conversations"] + second["conversations"]]
+        assert ids == expected[:8]
+        assert first["conversations"][0]["messages"][0]["content"] == "last 9"
+
+    @pytest.mark.asyncio
+    async def test_skip_still_works(self, client, db):
+        expected = await _seed(db, 10)
+        body = (await client.get(
+            "/api/ai/conversations/by-app/app", params={"limit": 2, "skip": 3}
+        )).json()
+        assert [c["_id"] for c in body["conversations"]] == expected[3:5]
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, client, db):
+        response = await client.get(
+            "/api/ai/conversations/by-app/app", params={"cursor": "bogus"}
+        )
+        assert response.status_code == 400
@@ -0,0 +1,116 @@
+"""Tests for the MongoDB bootstrap: pool options, warm-up and indexes."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+from pymongo import IndexModel  # type: ignore
+from pymongo.errors import OperationFailure, ServerSelectionTimeoutError  # type: ignore
+
+from app.core import database
+from app.core.database import client_options, ensure_indexes, warm_pool
+from app.services import jobs, message_store, stream_sessions
+
+
+class TestClientOptions:
+    def test_defaults_leave_optional_settings_out(self):
+        options = client_options()
+        assert options["maxPoolSize"] == database.settings.MONGO_MAX_POOL_SIZE
+        assert "compressors" not in options
+        assert "maxIdleTimeMS" not in options
+
+    def test_optional_settings(self, monkeypatch):
+        settings = database.settings
+        monkeypatch.setattr(settings, "MONGO_COMPRESSORS", "zstd,zlib")
+        monkeypatch.setattr(settings, "MONGO_MAX_IDLE_TIME_MS", 60000)
+        monkeypatch.setattr(
+            settings, "MONGO_READ_PREFERENCE", "primaryPreferred"
+        )
+        options = client_options()
+        assert options["compressors"] == "zstd,zlib"
+        assert options["maxIdleTimeMS"] == 60000
+        assert options["readPreference"] == "primaryPreferred"
+
+
+class TestWarmPool:
+    @pytest.mark.asyncio
+    async def test_pings_once_per_connection(self):
+        db = MagicMock()
+        db.command = AsyncMock(return_value={"ok": 1})
+        await warm_pool(db, 4)
+        assert db.command.await_count == 4
+
+    @pytest.mark.asyncio
+    async def test_checks_connectivity_with_an_empty_min_pool(self):
+        db = MagicMock()
+        db.command = AsyncMock(return_value={"ok": 1})
+        await warm_pool(db, 0)
+        assert db.command.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_connect_survives_failed_warm_up(self, monkeypatch):
+        warm = AsyncMock(side_effect=ServerSelectionTimeoutError("no servers"))
+        monkeypatch.setattr(database, "warm_pool", warm)
+        monkeypatch.setattr(database, "client", None)
+        monkeypatch.setattr(database, "db", None)
+        monkeypatch.setattr(
+            database.settings, "MONGO_URI", "mongodb://localhost:1/agentbase_test"
+        )
+
+        await database.connect_db()
+
+        warm.assert_awaited_once()
+        assert database.db is not None
+        database.client.close()
+
+
+class TestEnsureIndexes:
+    @pytest.mark.asyncio
+    async def test_declared_indexes_are_created_idempotently(self):
+        db = AsyncMongoMockClient()["agentbase_test"]
+        specs = [
+            *message_store.INDEXES, *stream_sessions.INDEXES, *jobs.INDEXES,
+        ]
+
+        await ensure_indexes(db, specs)
+        await ensure_indexes(db, specs)
+
+        for collection, model in specs:
+            info = await db[collection].index_information()
+            assert model.document["name"] in info
+
+    @pytest.mark.asyncio
+    async def test_changed_ttl_is_updated_in_place(self):
+        conflict = OperationFailure("IndexOptionsConflict", code=85)
+        collection = MagicMock()
+        collection.create_indexes = AsyncMock(
+            side_effect=[conflict, ["stream_start"], conflict]
+        )
+        db = MagicMock()
+        db.__getitem__.return_value = collection
+        db.command = AsyncMock()
+
+        await ensure_indexes(db, [
+            ("ai_streams", IndexModel([("streamId", 1)], name="stream_start")),
+            ("ai_streams", IndexModel(
+                "createdAt", expireAfterSeconds=60, name="created_at_ttl"
+            )),
+        ])
+
+        db.command.assert_awaited_once_with({
+            "collMod": "ai_streams",
+            "index": {"name": "created_at_ttl", "expireAfterSeconds": 60},
+        })
+
+    @pytest.mark.asyncio
+    async def test_other_conflicts_fail_startup(self):
+        conflict = OperationFailure("IndexKeySpecsConflict", code=86)
+        collection = MagicMock()
+        collection.create_indexes = AsyncMock(side_effect=conflict)
+        db = MagicMock()
+        db.__getitem__.return_value = collection
+
+        with pytest.raises(OperationFailure):
+            await ensure_indexes(db, [
+                ("c", IndexModel([("a", 1)], unique=True, name="a")),
+            ])
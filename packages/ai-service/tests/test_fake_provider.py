@@ -0,0 +1,62 @@
+"""Tests for the offline fake provider."""
+
+import time
+
+import pytest
+
+from app.services.ai_providers import ChatMessage, ChatRequest
+from app.services.fake_provider import FakeProvider, FakeProviderError
+from app.services.scheduler import is_rate_limited
+
+
+def _request(content: str = "a b") -> ChatRequest:
+    return ChatRequest(messages=[ChatMessage(role="user", content=content)])
+
+
+class TestFakeProvider:
+    @pytest.mark.asyncio
+    async def test_stream_matches_chat(self):
+        fake = FakeProvider()
+        chunks = [c async for c in fake.chat_stream(_request())]
+        assert "".join(chunks) == (await fake.chat(_request())).content == "echo: a b"
+
+    @pytest.mark.asyncio
+    async def test_output_padded_to_token_count(self):
+        response = await FakeProvider(output_tokens=10).chat(_request())
+        assert response.usage["completion_tokens"] == 10
+        assert response.content.startswith("echo: a b lorem")
+
+    @pytest.mark.asyncio
+    async def test_latency_then_token_rate(self):
+        fake = FakeProvider(
+            latency_ms=30, tokens_per_second=100, output_tokens=6
+        )
+        start = time.perf_counter()
+        stamps = []
+        async for _ in fake.chat_stream(_request()):
+            stamps.append(time.perf_counter() - start)
+
+        assert stamps[0] >= 0.03
+        # Five gaps of 10ms after the first token.
+        assert stamps[-1] - stamps[0] >= 0.045
+
+    @pytest.mark.asyncio
+    async def test_seeded_failures_are_reproducible(self):
+        async def outcomes(seed):
+            fake = FakeProvider(error_rate=0.3, rate_limit_rate=0.2, seed=seed)
+            seen = []
+            for _ in range(50):
+                try:
+                    await fake.chat(_request())
+                    seen.append(200)
+                except FakeProviderError as e:
+                    seen.append(e.status_code)
+            return seen
+
+        first = await outcomes(7)
+        assert first == await outcomes(7)
+        assert {200, 429, 500} == set(first)
+
+    def test_429_is_a_rate_limit(self):
+        assert is_rate_limited(FakeProviderError(429, "slow down"))
+        assert not is_rate_limited(FakeProviderError(500, "boom"))
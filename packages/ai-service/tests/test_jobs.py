@@ -0,0 +1,304 @@
+"""Tests for offline bulk jobs, run end to end against the fake provider."""
+
+import asyncio
+import json
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+from app.routers import jobs as jobs_router
+from app.routers.jobs import parse_jsonl
+from app.services import jobs
+from app.services.ai_providers import ProviderRegistry
+from app.services.fake_provider import FakeProvider
+
+
+def _jsonl(*entries) -> bytes:
+    return "\n".join(json.dumps(e) for e in entries).encode()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = AsyncMongoMockClient()["agentbase_test"]
+    monkeypatch.setattr(jobs, "get_db", lambda: database)
+    monkeypatch.setattr(jobs_router, "get_db", lambda: database)
+    return database
+
+
+@pytest.fixture
+def fake():
+    ProviderRegistry._providers = {}
+    provider = FakeProvider()
+    ProviderRegistry.register(provider)
+    yield provider
+    ProviderRegistry._providers = {}
+
+
+class _NoBatchFake(FakeProvider):
+    supports_batch = False
+
+
+class _SlowBatchFake(FakeProvider):
+    """Batches stay in progress until ``finished`` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.finished = False
+        self.cancelled: list[str] = []
+
+    async def batch_results(self, batch_id):
+        if not self.finished:
+            return None
+        return await super().batch_results(batch_id)
+
+    async def cancel_batch(self, batch_id):
+        self.cancelled.append(batch_id)
+        await super().cancel_batch(batch_id)
+
+
+def _request(content: str = "x"):
+    from app.services.ai_providers import ChatMessage, ChatRequest
+
+    return ChatRequest(messages=[ChatMessage(role="user", content=content)])
+
+
+class TestParseJsonl:
+    def test_formats(self):
+        requests = parse_jsonl(_jsonl(
+            {"custom_id": "a", "messages": [{"role": "user", "content": "hi"}]},
+            {"content": "q", "system_prompt": "be brief", "max_tokens": 5},
+            {"custom_id": "c", "body": {"model": "gpt-4o-mini",
+                                        "messages": [{"role": "user", "content": "x"}]}},
+        ), model="default-model")
+
+        assert [cid for cid, _ in requests] == ["a", "1", "c"]
+        assert requests[0][1].model == "default-model"
+        assert [m.role for m in requests[1][1].messages] == ["system", "user"]
+        assert requests[1][1].max_tokens == 5
+        assert requests[2][1].model == "gpt-4o-mini"
+
+    def test_reports_bad_line(self):
+        with pytest.raises(ValueError, match="line 2"):
+            parse_jsonl(_jsonl({"content": "ok"}, {"nothing": True}))
+
+
+class TestJobPipeline:
+    @pytest.mark.asyncio
+    async def test_provider_batch_job(self, client, db, fake):
+        body = _jsonl(*({"custom_id": f"r{i}", "content": f"q{i}"} for i in range(3)))
+        submitted = await client.post("/api/ai/jobs?provider=fake", content=body)
+        assert submitted.status_code == 202
+        job_id = submitted.json()["id"]
+        assert submitted.json()["status"] == jobs.STATUS_QUEUED
+
+        assert await jobs.JobWorker(poll_interval=0).run_once()
+
+        status = (await client.get(f"/api/ai/jobs/{job_id}")).json()
+        assert status["status"] == jobs.STATUS_COMPLETED
+        assert status["mode"] == jobs.MODE_PROVIDER_BATCH
+        assert (status["succeeded"], status["failed"]) == (3, 0)
+
+        results = await client.get(f"/api/ai/jobs/{job_id}/results")
+        lines = [json.loads(l) for l in results.text.splitlines()]
+        assert [l["custom_id"] for l in lines] == ["r0", "r1", "r2"]
+        assert lines[1]["response"] == "echo: q1"
+
+    @pytest.mark.asyncio
+    async def test_local_queue_for_providers_without_batch_api(
+        self, client, db, monkeypatch
+    ):
+        ProviderRegistry._providers = {}
+        ProviderRegistry.register(_NoBatchFake())
+        monkeypatch.setattr(jobs.settings, "JOBS_CHUNK_SIZE", 2)
+        body = _jsonl(*({"content": f"q{i}", "cache": False} for i in range(5)))
+        job_id = (await client.post("/api/ai/jobs?provider=fake", content=body)).json()["id"]
+
+        await jobs.JobWorker(poll_interval=0).run_once()
+
+        status = (await client.get(f"/api/ai/jobs/{job_id}")).json()
+        assert status["mode"] == jobs.MODE_LOCAL
+        assert status["succeeded"] == 5
+        ProviderRegistry._providers = {}
+
+    @pytest.mark.asyncio
+    async def test_items_missing_from_batch_output_fail(self, db, fake, monkeypatch):
+        from app.services.ai_providers import ChatMessage, ChatRequest
+
+        async def lossy(batch_id):
+            return (await FakeProvider.batch_results(fake, batch_id))[:1]
+
+        monkeypatch.setattr(fake, "batch_results", lossy)
+        request = ChatRequest(messages=[ChatMessage(role="user", content="x")])
+        job = await jobs.submit_job(db, [("a", request), ("b", request)], "fake")
+
+        await jobs.JobWorker(poll_interval=0).run_once()
+
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        assert (stored["succeeded"], stored["failed"]) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_job_is_not_processed(self, client, db, fake):
+        job_id = (await client.post(
+            "/api/ai/jobs?provider=fake", content=_jsonl({"content": "x"})
+        )).json()["id"]
+
+        cancelled = await client.post(f"/api/ai/jobs/{job_id}/cancel")
+        assert cancelled.status_code == 200
+        assert not await jobs.JobWorker(poll_interval=0).run_once()
+        assert (await client.post(f"/api/ai/jobs/{job_id}/cancel")).status_code == 409
+
+    @pytest.mark.asyncio
+    async def test_rejects_unknown_provider_and_bad_body(self, client, db, fake):
+        assert (await client.post(
+            "/api/ai/jobs?provider=nope", content=_jsonl({"content": "x"})
+        )).status_code == 400
+        assert (await client.post(
+            "/api/ai/jobs?provider=fake", content=b"not json"
+        )).status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self, client, db):
+        assert (await client.get("/api/ai/jobs/nope")).status_code == 404
+
+
+class TestSubmittedBatches:
+    @pytest.fixture
+    def slow(self):
+        ProviderRegistry._providers = {}
+        provider = _SlowBatchFake()
+        ProviderRegistry.register(provider)
+        yield provider
+        ProviderRegistry._providers = {}
+
+    @pytest.mark.asyncio
+    async def test_running_batch_does_not_block_queue(
+        self, db, slow, monkeypatch
+    ):
+        monkeypatch.setattr(jobs.settings, "JOBS_BATCH_POLL_SECONDS", 0)
+        worker = jobs.JobWorker(poll_interval=0)
+        first = await jobs.submit_job(db, [("a", _request())], "fake")
+        second = await jobs.submit_job(db, [("b", _request())], "fake")
+
+        assert await worker.run_once()
+        assert await worker.run_once()
+
+        stored = db[jobs.JOBS_COLLECTION]
+        for job in (first, second):
+            status = (await stored.find_one({"_id": job["_id"]}))["status"]
+            assert status == jobs.STATUS_SUBMITTED
+
+        slow.finished = True
+        assert await worker.run_once()
+
+        for job in (first, second):
+            done = await stored.find_one({"_id": job["_id"]})
+            assert done["status"] == jobs.STATUS_COMPLETED
+            assert done["succeeded"] == 1
+        assert not await worker.run_once()
+
+    @pytest.mark.asyncio
+    async def test_poll_waits_for_next_poll_time(self, db, slow):
+        worker = jobs.JobWorker(poll_interval=0)
+        await jobs.submit_job(db, [("a", _request())], "fake")
+        await worker.run_once()
+
+        slow.finished = True
+        # Polled once on submission; the next poll is JOBS_BATCH_POLL_SECONDS away.
+        assert not await worker.run_once()
+
+    @pytest.mark.asyncio
+    async def test_failed_poll_is_retried(self, db, slow, monkeypatch):
+        monkeypatch.setattr(jobs.settings, "JOBS_BATCH_POLL_SECONDS", 0)
+        worker = jobs.JobWorker(poll_interval=0)
+        job = await jobs.submit_job(db, [("a", _request())], "fake")
+        await worker.run_once()
+        slow.finished = True
+        finished_results = slow.batch_results
+        calls = []
+
+        async def flaky(batch_id):
+            calls.append(batch_id)
+            if len(calls) == 1:
+                raise ConnectionError("provider unreachable")
+            return await finished_results(batch_id)
+
+        monkeypatch.setattr(slow, "batch_results", flaky)
+
+        await worker.run_once()
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        assert stored["status"] == jobs.STATUS_SUBMITTED
+        assert stored["pollFailures"] == 1
+
+        await worker.run_once()
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        assert stored["status"] == jobs.STATUS_COMPLETED
+        assert stored["succeeded"] == 1
+        assert stored["pollFailures"] == 0
+        assert slow.cancelled == []
+
+    @pytest.mark.asyncio
+    async def test_repeated_poll_failures_cancel_batches(
+        self, db, slow, monkeypatch
+    ):
+        monkeypatch.setattr(jobs.settings, "JOBS_BATCH_POLL_SECONDS", 0)
+        monkeypatch.setattr(jobs.settings, "JOBS_BATCH_POLL_MAX_FAILURES", 2)
+        worker = jobs.JobWorker(poll_interval=0)
+        job = await jobs.submit_job(db, [("a", _request())], "fake")
+        await worker.run_once()
+
+        async def broken(batch_id):
+            raise ConnectionError("provider unreachable")
+
+        monkeypatch.setattr(slow, "batch_results", broken)
+        await worker.run_once()
+        await worker.run_once()
+
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        assert stored["status"] == jobs.STATUS_FAILED
+        assert slow.cancelled == stored["providerBatches"]
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_upstream_batch(self, client, db, slow):
+        job = await jobs.submit_job(db, [("a", _request())], "fake")
+        await jobs.JobWorker(poll_interval=0).run_once()
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+
+        assert await jobs.cancel_job(db, job["_id"])
+
+        assert slow.cancelled == stored["providerBatches"]
+        cancelled = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        assert cancelled["status"] == jobs.STATUS_CANCELLED
+
+
+class TestWorkerOwnership:
+    @pytest.mark.asyncio
+    async def test_taken_over_job_is_not_written(self, db):
+        ProviderRegistry._providers = {}
+        ProviderRegistry.register(_NoBatchFake())
+        job = await jobs.submit_job(db, [("a", _request())], "fake")
+        claimed = await jobs.claim_next(db, "worker-a")
+        # Another worker reclaimed it, e.g. after a missed heartbeat.
+        await db[jobs.JOBS_COLLECTION].update_one(
+            {"_id": job["_id"]}, {"$set": {"worker": "worker-b"}}
+        )
+
+        await jobs.process_job(db, claimed)
+
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        item = await db[jobs.ITEMS_COLLECTION].find_one({"jobId": job["_id"]})
+        assert stored["status"] == jobs.STATUS_RUNNING
+        assert stored["succeeded"] == 0
+        assert item["status"] == jobs.ITEM_PENDING
+        ProviderRegistry._providers = {}
+
+    @pytest.mark.asyncio
+    async def test_heartbeat_runs_while_job_works(self, db, monkeypatch):
+        monkeypatch.setattr(jobs.settings, "JOBS_HEARTBEAT_SECONDS", 0.01)
+        job = await jobs.submit_job(db, [("a", _request())], "fake")
+        claimed = await jobs.claim_next(db, "worker-a")
+
+        async with jobs._heartbeat(db, job["_id"], "worker-a"):
+            await asyncio.sleep(0.05)
+
+        stored = await db[jobs.JOBS_COLLECTION].find_one({"_id": job["_id"]})
+        assert stored["updatedAt"] > claimed["updatedAt"]
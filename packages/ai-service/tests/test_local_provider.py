@@ -0,0 +1,209 @@
+"""Tests for the OpenAI-compatible local provider against a stub server."""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from app.services.ai_providers import ChatMessage, ChatRequest
+from app.services.local_provider import LocalProvider, MicroBatcher, api_base
+
+
+class StubServer:
+    """Minimal OpenAI-compatible server: echoes the last message."""
+
+    def __init__(self, models=("llama-3.1-8b", "qwen-2.5-7b")):
+        self.models = list(models)
+        self.requests: list[dict] = []
+        self.arrivals: list[float] = []
+        self.app = Starlette(routes=[
+            Route("/v1/models", self.list_models),
+            Route("/v1/chat/completions", self.completions, methods=["POST"]),
+        ])
+
+    async def list_models(self, request: Request):
+        if not self.models:
+            return JSONResponse({"error": "loading"}, status_code=503)
+        return JSONResponse({
+            "object": "list",
+            "data": [
+                {"id": m, "object": "model", "max_model_len": 32768}
+                for m in self.models
+            ],
+        })
+
+    async def completions(self, request: Request):
+        body = await request.json()
+        self.requests.append(body)
+        self.arrivals.append(time.monotonic())
+        text = f"echo: {body['messages'][-1]['content']}"
+        if body.get("stream"):
+            frames = [
+                b'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n',
+                *(
+                    b'data: {"choices":[{"delta":{"content":"%s"}}]}\n\n'
+                    % word.encode()
+                    for word in ["echo:", " ", "hi"]
+                ),
+                b'data: {"choices":[]}\n\n',
+                b"data: [DONE]\n\n",
+            ]
+            return Response(b"".join(frames), media_type="text/event-stream")
+        return JSONResponse({
+            "model": body["model"],
+            "choices": [{"message": {"role": "assistant", "content": text}}],
+            "usage": {
+                "prompt_tokens": 5,
+                "completion_tokens": 2,
+                "prompt_tokens_details": {"cached_tokens": 4},
+            },
+        })
+
+
+def _provider(server: StubServer, **kwargs) -> LocalProvider:
+    return LocalProvider(
+        "http://stub:8000",
+        transport=httpx.ASGITransport(app=server.app),
+        **kwargs,
+    )
+
+
+def _request(content: str = "hi", **kwargs) -> ChatRequest:
+    return ChatRequest(
+        messages=[ChatMessage(role="user", content=content)], **kwargs
+    )
+
+
+class TestApiBase:
+    @pytest.mark.parametrize("url", [
+        "http://vllm:8000", "http://vllm:8000/", "http://vllm:8000/v1",
+        "http://vllm:8000/v1/",
+    ])
+    def test_adds_v1_once(self, url):
+        assert api_base(url) == "http://vllm:8000/v1"
+
+
+class TestLocalProvider:
+    @pytest.mark.asyncio
+    async def test_discovers_models(self):
+        provider = _provider(StubServer())
+
+        assert provider.available_models == []
+        await provider.refresh_models()
+
+        assert provider.available_models == ["llama-3.1-8b", "qwen-2.5-7b"]
+        assert provider.default_model == "llama-3.1-8b"
+
+    @pytest.mark.asyncio
+    async def test_list_models_reports_context_window(self):
+        provider = _provider(StubServer(models=["llama-3.1-8b"]), model="other")
+
+        models = await provider.list_models()
+
+        assert models == [
+            {"id": "other", "context_window": None},
+            {"id": "llama-3.1-8b", "context_window": 32768},
+        ]
+        assert provider.default_model == "other"
+
+    @pytest.mark.asyncio
+    async def test_configured_model_is_default(self):
+        provider = _provider(StubServer(), model="qwen-2.5-7b")
+        await provider.refresh_models()
+        assert provider.default_model == "qwen-2.5-7b"
+
+    @pytest.mark.asyncio
+    async def test_failed_discovery_keeps_models(self):
+        server = StubServer()
+        provider = _provider(server)
+        await provider.refresh_models()
+
+        server.models = []
+        await provider.refresh_models()
+
+        assert provider.available_models == ["llama-3.1-8b", "qwen-2.5-7b"]
+
+    @pytest.mark.asyncio
+    async def test_chat(self):
+        server = StubServer()
+        provider = _provider(server, api_key="local-key")
+
+        response = await provider.chat(_request(temperature=0.2, max_tokens=9))
+
+        assert response.content == "echo: hi"
+        assert response.provider == "local"
+        assert response.model == "llama-3.1-8b"
+        assert response.usage == {
+            "prompt_tokens": 5,
+            "completion_tokens": 2,
+            "total_tokens": 7,
+            "cache_read_tokens": 4,
+        }
+        assert server.requests[0] == {
+            "model": "llama-3.1-8b",
+            "messages": [{"role": "user", "content": "hi"}],
+            "temperature": 0.2,
+            "max_tokens": 9,
+        }
+
+    @pytest.mark.asyncio
+    async def test_chat_without_models_fails(self):
+        provider = _provider(StubServer(models=()))
+        with pytest.raises(ValueError):
+            await provider.chat(_request())
+
+    @pytest.mark.asyncio
+    async def test_stream(self):
+        provider = _provider(StubServer())
+        chunks = [c async for c in provider.chat_stream(_request(model="m"))]
+        assert "".join(chunks) == "echo: hi"
+
+    @pytest.mark.asyncio
+    async def test_micro_batch_sends_concurrent_calls_together(self):
+        server = StubServer()
+        provider = _provider(
+            server, model="m", micro_batch_window_ms=50, micro_batch_max_size=3
+        )
+
+        started = time.monotonic()
+        await asyncio.gather(*(provider.chat(_request(f"q{i}")) for i in range(3)))
+
+        # A full batch is released at once, without waiting out the window.
+        assert len(server.arrivals) == 3
+        assert max(server.arrivals) - started < 0.05
+
+    @pytest.mark.asyncio
+    async def test_long_generations_skip_micro_batch(self):
+        provider = _provider(
+            StubServer(), model="m", micro_batch_window_ms=10_000,
+            micro_batch_max_tokens=100,
+        )
+        response = await asyncio.wait_for(
+            provider.chat(_request(max_tokens=500)), timeout=1
+        )
+        assert response.content == "echo: hi"
+
+
+class TestMicroBatcher:
+    @pytest.mark.asyncio
+    async def test_releases_after_window(self):
+        batcher = MicroBatcher(window=0.02, max_size=10)
+        started = time.monotonic()
+
+        await asyncio.gather(batcher.wait(), batcher.wait())
+
+        assert time.monotonic() - started >= 0.015
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_block_batch(self):
+        batcher = MicroBatcher(window=0.01, max_size=10)
+        cancelled = asyncio.ensure_future(batcher.wait())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        await asyncio.wait_for(batcher.wait(), timeout=1)
@@ -0,0 +1,255 @@
+"""Tests for bucketed conversation message storage."""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from app.services import message_store
+from app.services.message_store import (
+    MESSAGES_COLLECTION,
+    STORAGE_VERSION,
+    load_recent_messages,
+    plan_buckets,
+)
+
+
+def _msg(i: int) -> dict:
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"}
+
+
+class _Cursor:
+    """Minimal async Motor cursor over a fixed list of documents."""
+
+    def __init__(self, docs: list[dict]):
+        self._docs = docs
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def __aiter__(self):
+        self._it = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def _mock_db() -> MagicMock:
+    db = MagicMock()
+    buckets = MagicMock()
+    buckets.bulk_write = AsyncMock()
+    db.__getitem__.side_effect = lambda name: {MESSAGES_COLLECTION: buckets}[name]
+    db.ai_conversations.find_one_and_update = AsyncMock()
+    db.ai_conversations.update_one = AsyncMock()
+    db.ai_conversations.find_one = AsyncMock()
+    return db
+
+
+class TestPlanBuckets:
+    def test_single_bucket(self):
+        buckets = plan_buckets(0, [_msg(0), _msg(1)], bucket_size=50)
+        assert list(buckets) == [0]
+        assert [m["index"] for m in buckets[0]] == [0, 1]
+
+    def test_turn_straddles_bucket_boundary(self):
+        buckets = plan_buckets(49, [_msg(49), _msg(50)], bucket_size=50)
+        assert [m["index"] for m in buckets[0]] == [49]
+        assert [m["index"] for m in buckets[1]] == [50]
+
+
+class TestAppendMessages:
+    @pytest.mark.asyncio
+    async def test_only_tail_bucket_is_written(self):
+        db = _mock_db()
+        db.ai_conversations.find_one_and_update.return_value = {
+            "messageCount": 122,
+            "bucketSize": 50,
+        }
+
+        ok = await message_store.append_messages(db, "c1", [_msg(0), _msg(1)])
+
+        assert ok is True
+        ops = db[MESSAGES_COLLECTION].bulk_write.call_args.args[0]
+        assert len(ops) == 1
+        assert ops[0]._filter == {"conversationId": "c1", "bucket": 2}
+
+    @pytest.mark.asyncio
+    async def test_missing_conversation(self):
+        db = _mock_db()
+        db.ai_conversations.find_one_and_update.return_value = None
+        db.ai_conversations.find_one.return_value = None
+
+        ok = await message_store.append_messages(db, "nope", [_msg(0)])
+
+        assert ok is False
+        db[MESSAGES_COLLECTION].bulk_write.assert_not_called()
+
+
+class TestAppendMany:
+    @pytest.mark.asyncio
+    async def test_one_bulk_write_across_conversations(self):
+        db = _mock_db()
+        counts = {"c1": 2, "c2": 4}
+        db.ai_conversations.find_one_and_update.side_effect = (
+            lambda query, update, **kw: {
+                "messageCount": counts[query["_id"]], "bucketSize": 50,
+            }
+        )
+
+        missing = await message_store.append_many(db, [
+            ("c1", [_msg(0)], None),
+            ("c2", [_msg(0), _msg(1)], None),
+            ("c1", [_msg(1)], {"metadata": {"provider": "openai"}}),
+        ])
+
+        assert missing == set()
+        # Two entries for c1 are merged into one reservation.
+        assert db.ai_conversations.find_one_and_update.await_count == 2
+        db[MESSAGES_COLLECTION].bulk_write.assert_awaited_once()
+        ops = db[MESSAGES_COLLECTION].bulk_write.call_args.args[0]
+        assert {op._filter["conversationId"] for op in ops} == {"c1", "c2"}
+
+    @pytest.mark.asyncio
+    async def test_reports_missing_conversations(self):
+        db = _mock_db()
+        db.ai_conversations.find_one_and_update.return_value = None
+        db.ai_conversations.find_one.return_value = None
+
+        missing = await message_store.append_many(db, [("gone", [_msg(0)], None)])
+
+        assert missing == {"gone"}
+        db[MESSAGES_COLLECTION].bulk_write.assert_not_called()
+
+
+class TestMigrateConversation:
+    @pytest.mark.asyncio
+    async def test_legacy_messages_move_to_buckets(self):
+        db = _mock_db()
+        db.ai_conversations.update_one.return_value = MagicMock(modified_count=1)
+        legacy = {"_id": "c1", "messages": [_msg(i) for i in range(3)]}
+
+        header = await message_store.migrate_conversation(db, legacy)
+
+        assert "messages" not in header
+        assert header["storageVersion"] == STORAGE_VERSION
+        assert header["messageCount"] == 3
+        assert header["lastMessage"]["content"] == "m2"
+        update = db.ai_conversations.update_one.call_args.args[1]
+        assert update["$unset"] == {"messages": ""}
+
+    @pytest.mark.asyncio
+    async def test_already_bucketed_is_noop(self):
+        db = _mock_db()
+        conv = {"_id": "c1", "storageVersion": STORAGE_VERSION}
+
+        assert await message_store.ensure_bucketed(db, conv) is conv
+        db.ai_conversations.update_one.assert_not_called()
+
+
+class TestLoadRecentMessages:
+    @pytest.mark.asyncio
+    async def test_reads_only_buckets_in_window(self):
+        db = _mock_db()
+        buckets = plan_buckets(0, [_msg(i) for i in range(120)], 50)
+        newest_first = [{"messages": buckets[b]} for b in (2, 1)]
+        db[MESSAGES_COLLECTION].find = MagicMock(return_value=_Cursor(newest_first))
+        conv = {
+            "_id": "c1",
+            "storageVersion": STORAGE_VERSION,
+            "messageCount": 120,
+            "bucketSize": 50,
+        }
+
+        window = await load_recent_messages(db, conv, 30, 10_000)
+
+        query = db[MESSAGES_COLLECTION].find.call_args.args[0]
+        assert query["bucket"] == {"$gte": 1}
+        assert [m["index"] for m in window] == list(range(90, 120))
+
+    @pytest.mark.asyncio
+    async def test_token_budget_trims_oldest(self):
+        db = _mock_db()
+        conv = {"_id": "c1", "messages": [
+            {"role": "user", "content": "x" * 400},
+            {"role": "assistant", "content": "short"},
+            {"role": "user", "content": "short"},
+        ]}
+
+        window = await load_recent_messages(db, conv, 10, 20)
+
+        assert [m["content"] for m in window] == ["short", "short"]
+
+
+class TestWindowStride:
+    def _conv(self, count: int) -> dict:
+        return {
+            "_id": "c1",
+            "storageVersion": STORAGE_VERSION,
+            "messageCount": count,
+            "bucketSize": 50,
+        }
+
+    async def _window(self, count: int, max_tokens: int = 10_000) -> list[int]:
+        db = _mock_db()
+        buckets = plan_buckets(0, [_msg(i) for i in range(count)], 50)
+        newest_first = [{"messages": buckets[b]} for b in sorted(buckets)[::-1]]
+        db[MESSAGES_COLLECTION].find = MagicMock(
+            return_value=_Cursor(newest_first)
+        )
+        window = await load_recent_messages(
+            db, self._conv(count), 30, max_tokens
+        )
+        return [m["index"] for m in window]
+
+    @pytest.mark.asyncio
+    async def test_prefix_is_stable_across_turns(self, monkeypatch):
+        monkeypatch.setattr(message_store.settings, "HISTORY_WINDOW_STRIDE", 10)
+        starts = [
+            (await self._window(count))[0] for count in range(102, 114, 2)
+        ]
+
+        assert starts == [80, 80, 80, 80, 80, 90]
+        assert len(await self._window(101)) == 21
+
+    @pytest.mark.asyncio
+    async def test_token_cut_is_aligned(self, monkeypatch):
+        monkeypatch.setattr(message_store.settings, "HISTORY_WINDOW_STRIDE", 10)
+        # Each message costs 4 tokens; 60 tokens fit 15 of them.
+        indexes = await self._window(100, max_tokens=60)
+
+        assert indexes == list(range(90, 100))
+
+    @pytest.mark.asyncio
+    async def test_stride_of_one_slides(self, monkeypatch):
+        monkeypatch.setattr(message_store.settings, "HISTORY_WINDOW_STRIDE", 1)
+        assert (await self._window(103))[0] == 73
+
+
+class TestLoadRecentMany:
+    @pytest.mark.asyncio
+    async def test_single_query_for_all_conversations(self):
+        db = _mock_db()
+        c1 = plan_buckets(0, [_msg(i) for i in range(60)], 50)
+        c2 = plan_buckets(0, [_msg(i) for i in range(3)], 50)
+        docs = [
+            {"conversationId": "c1", "bucket": 1, "messages": c1[1]},
+            {"conversationId": "c2", "bucket": 0, "messages": c2[0]},
+            {"conversationId": "c1", "bucket": 0, "messages": c1[0]},
+        ]
+        db[MESSAGES_COLLECTION].find = MagicMock(return_value=_Cursor(docs))
+        header = {"storageVersion": STORAGE_VERSION, "bucketSize": 50}
+
+        windows = await message_store.load_recent_many(db, [
+            ({**header, "_id": "c1", "messageCount": 60}, 20, 10_000),
+            ({**header, "_id": "c2", "messageCount": 3}, 20, 10_000),
+            ({**header, "_id": "c3", "messageCount": 0}, 20, 10_000),
+        ])
+
+        db[MESSAGES_COLLECTION].find.assert_called_once()
+        query = db[MESSAGES_COLLECTION].find.call_args.args[0]
+        assert len(query["$or"]) == 2
+        assert [m["index"] for m in windows["c1"]] == list(range(40, 60))
+        assert [m["index"] for m in windows["c2"]] == [0, 1, 2]
+        assert windows["c3"] == []
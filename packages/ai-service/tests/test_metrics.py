@@ -0,0 +1,175 @@
+"""Tests for Prometheus instrumentation."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+from prometheus_client import REGISTRY as DEFAULT_REGISTRY  # type: ignore
+
+from app.core import metrics
+from app.services import chat_pipeline
+from app.services.ai_providers import ChatMessage, ChatRequest
+from app.services.chat_pipeline import ChatOptions
+from app.services.fake_provider import FakeProvider
+
+
+def _sample(name: str, **labels) -> float:
+    return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def _request(content: str, model: str) -> ChatRequest:
+    return ChatRequest(
+        messages=[ChatMessage(role="user", content=content)], model=model
+    )
+
+
+class _FailingProvider(FakeProvider):
+    async def chat(self, request):
+        raise TimeoutError("upstream timed out")
+
+
+class TestProviderMetrics:
+    @pytest.mark.asyncio
+    async def test_chat_records_latency_and_tokens(self):
+        before = _sample(
+            "agentbase_ai_tokens_total",
+            provider="fake", model="m-chat", direction="out",
+        )
+        await chat_pipeline.complete(
+            FakeProvider(), _request("one two three", "m-chat"),
+            ChatOptions(cache=False),
+        )
+
+        assert _sample(
+            "agentbase_ai_provider_request_duration_seconds_count",
+            provider="fake", model="m-chat", outcome="ok",
+        ) == 1
+        # "echo: one two three" is four words.
+        assert _sample(
+            "agentbase_ai_tokens_total",
+            provider="fake", model="m-chat", direction="out",
+        ) == before + 4
+        assert _sample(
+            "agentbase_ai_tokens_total",
+            provider="fake", model="m-chat", direction="in",
+        ) == 3
+
+    @pytest.mark.asyncio
+    async def test_errors_counted_by_type(self):
+        with pytest.raises(TimeoutError):
+            await chat_pipeline.complete(
+                _FailingProvider(), _request("x", "m-err"),
+                ChatOptions(cache=False),
+            )
+        assert _sample(
+            "agentbase_ai_provider_errors_total",
+            provider="fake", model="m-err", error="TimeoutError",
+        ) == 1
+        assert _sample(
+            "agentbase_ai_provider_request_duration_seconds_count",
+            provider="fake", model="m-err", outcome="error",
+        ) == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_records_ttft_and_inter_token(self):
+        stream = chat_pipeline.stream(
+            FakeProvider(), _request("a b c", "m-stream"),
+            ChatOptions(cache=False),
+        )
+        chunks = [c async for c in stream]
+
+        assert _sample(
+            "agentbase_ai_stream_time_to_first_token_seconds_count",
+            provider="fake", model="m-stream",
+        ) == 1
+        assert _sample(
+            "agentbase_ai_stream_inter_token_seconds_count",
+            provider="fake", model="m-stream",
+        ) == len(chunks) - 1
+
+    def test_prompt_cache_tokens(self):
+        metrics.for_model("fake", "m-cache").usage({
+            "prompt_tokens": 1200,
+            "completion_tokens": 5,
+            "cache_read_tokens": 1000,
+            "cache_write_tokens": 150,
+        }, 0.5)
+
+        for direction, expected in (
+            ("in", 1200), ("cache_read", 1000), ("cache_write", 150),
+        ):
+            assert _sample(
+                "agentbase_ai_tokens_total",
+                provider="fake", model="m-cache", direction=direction,
+            ) == expected
+
+    def test_label_children_are_reused(self):
+        assert metrics.for_model("fake", "m-reuse") is metrics.for_model(
+            "fake", "m-reuse"
+        )
+
+    def test_model_labels_are_capped(self, monkeypatch):
+        monkeypatch.setattr(metrics, "_provider_children", {})
+        monkeypatch.setattr(metrics.settings, "METRICS_MAX_MODELS", 1)
+        assert metrics.for_model("fake", "first").model == "first"
+        assert metrics.for_model("fake", "second").model == "other"
+        assert metrics.for_model("fake", "first").model == "first"
+
+
+class TestMongoListener:
+    def test_observes_driver_durations(self):
+        class Event:
+            command_name = "find"
+            duration_micros = 1500
+
+        metrics.MongoCommandMetrics().succeeded(Event())
+        assert _sample(
+            "agentbase_ai_mongo_operation_duration_seconds_count",
+            command="find", outcome="ok",
+        ) >= 1
+
+
+class TestEndpoint:
+    @pytest.mark.asyncio
+    async def test_exposes_http_metrics_by_route_template(self, client):
+        await client.get("/api/ai/cache/stats")
+        response = await client.get("/api/ai/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert (
+            'agentbase_ai_http_request_duration_seconds_count{method="GET",'
+            'route="/api/ai/cache/stats",status="200"}'
+        ) in response.text
+
+    def test_private_registry(self):
+        assert DEFAULT_REGISTRY.get_sample_value(
+            "agentbase_ai_tokens_total",
+            {"provider": "fake", "model": "m-chat", "direction": "out"},
+        ) is None
+
+
+_WORKER = """
+from app.core import metrics
+metrics.for_model("fake", "m-workers").tokens_out.inc({n})
+"""
+
+
+class TestMultiprocess:
+    def test_scrape_aggregates_workers(self, tmp_path):
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+        for n in (3, 4):
+            subprocess.run(
+                [sys.executable, "-c", _WORKER.format(n=n)], env=env, check=True
+            )
+        scrape = subprocess.run(
+            [sys.executable, "-c",
+             "from app.core import metrics; print(metrics.render()[0].decode())"],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+
+        assert (
+            'agentbase_ai_tokens_total{direction="out",model="m-workers",'
+            'provider="fake"} 7.0'
+        ) in scrape
@@ -0,0 +1,64 @@
+"""Tests for the internal auth and request logging middleware."""
+
+import pytest
+
+from app.core import middleware
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(middleware.settings, "INTERNAL_SERVICE_TOKEN", "s3cret")
+    return "s3cret"
+
+
+class TestInternalToken:
+    @pytest.mark.asyncio
+    async def test_missing_or_wrong_token_rejected(self, client, token):
+        assert (await client.get("/api/ai/cache/stats")).status_code == 401
+        wrong = await client.get(
+            "/api/ai/cache/stats", headers={"X-Internal-Token": "nope"}
+        )
+        assert wrong.status_code == 401
+        assert wrong.json() == {"detail": "Unauthorized"}
+
+    @pytest.mark.asyncio
+    async def test_valid_token_accepted(self, client, token):
+        response = await client.get(
+            "/api/ai/cache/stats", headers={"X-Internal-Token": token}
+        )
+        assert response.status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_open_paths_bypass(self, client, token):
+        assert (await client.get("/openapi.json")).status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_token(self, client, monkeypatch):
+        monkeypatch.setattr(middleware.settings, "INTERNAL_SERVICE_TOKEN", None)
+        assert (await client.get("/api/ai/cache/stats")).status_code == 200
+
+
+class TestRequestLog:
+    @pytest.mark.asyncio
+    async def test_logs_status_and_route(self, client, token, monkeypatch):
+        lines = []
+        monkeypatch.setattr(
+            middleware.logger, "info", lambda event, **kw: lines.append((event, kw))
+        )
+        await client.get("/api/ai/cache/stats")
+
+        event, fields = lines[-1]
+        assert event == "http_request"
+        assert fields["status"] == 401
+        assert fields["path"] == "/api/ai/cache/stats"
+        assert fields["duration_ms"] >= 0
+
+    @pytest.mark.asyncio
+    async def test_passes_non_http_scopes_through(self):
+        seen = []
+
+        async def app(scope, receive, send):
+            seen.append(scope["type"])
+
+        await middleware.RequestLogMiddleware(app)({"type": "lifespan"}, None, None)
+        assert seen == ["lifespan"]
@@ -0,0 +1,183 @@
+"""Tests for the model catalog and the cached /providers listing."""
+
+import asyncio
+
+import pytest
+
+from app.routers import models as models_router
+from app.services import context_budget, model_catalog
+from app.services.ai_providers import ProviderRegistry
+from app.services.context_budget import context_window
+from app.services.fake_provider import FakeProvider
+from app.services.model_catalog import ModelCatalog
+
+
+class ListingProvider(FakeProvider):
+    """Fake provider with a list-models API."""
+
+    def __init__(self, name: str, listing):
+        super().__init__()
+        self._name = name
+        self.listing = listing
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def available_models(self) -> list[str]:
+        return ["gpt-4"]
+
+    async def list_models(self):
+        self.calls += 1
+        if isinstance(self.listing, Exception):
+            raise self.listing
+        return self.listing
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    providers: dict = {}
+    monkeypatch.setattr(ProviderRegistry, "_providers", providers)
+    return providers
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    fresh = ModelCatalog()
+    monkeypatch.setattr(model_catalog, "catalog", fresh)
+    monkeypatch.setattr(models_router, "catalog", fresh)
+    monkeypatch.setattr(context_budget, "catalog", fresh)
+    return fresh
+
+
+def _register(registry, provider):
+    registry[provider.name] = provider
+    return provider
+
+
+class TestModelCatalog:
+    def test_static_models_get_snapshot_metadata(self, registry, catalog):
+        _register(registry, FakeProvider())
+        _register(registry, ListingProvider("openai", None))
+
+        fake, openai = catalog.providers()
+
+        assert fake["models"] == ["fake-echo"]
+        assert fake["model_details"][0]["context_window"] is None
+        assert openai["models"] == ["gpt-4"]
+        assert openai["model_details"][0] == {
+            "id": "gpt-4",
+            "context_window": 8192,
+            "max_output_tokens": 8192,
+            "input_price": 30.0,
+            "output_price": 60.0,
+            "modalities": ["text"],
+        }
+
+    @pytest.mark.asyncio
+    async def test_live_listing_decides_models(self, registry, catalog):
+        _register(registry, ListingProvider("openai", [
+            {"id": "gpt-4o"},
+            {"id": "gpt-4-next", "context_window": 256000},
+        ]))
+
+        await catalog.refresh()
+
+        (entry,) = catalog.providers()
+        assert entry["models"] == ["gpt-4o", "gpt-4-next"]
+        # Snapshot metadata fills what the listing does not report.
+        assert entry["model_details"][0]["max_output_tokens"] == 16384
+        assert catalog.get("gpt-4-next")["context_window"] == 256000
+
+    @pytest.mark.asyncio
+    async def test_failed_listing_keeps_last_good(self, registry, catalog):
+        provider = _register(
+            registry, ListingProvider("local", [{"id": "llama"}])
+        )
+        await catalog.refresh()
+
+        provider.listing = RuntimeError("server down")
+        await catalog.refresh()
+
+        assert provider.calls == 2
+        assert catalog.providers()[0]["models"] == ["llama"]
+
+    @pytest.mark.asyncio
+    async def test_etag_follows_content(self, registry, catalog):
+        provider = _register(
+            registry, ListingProvider("local", [{"id": "llama"}])
+        )
+        await catalog.refresh()
+        body, etag = catalog.payload()
+
+        await catalog.refresh()
+        assert catalog.payload() == (body, etag)
+
+        provider.listing = [{"id": "llama"}, {"id": "qwen"}]
+        await catalog.refresh()
+        assert catalog.payload()[1] != etag
+
+    def test_rebuilds_when_providers_change(self, registry, catalog):
+        assert catalog.providers() == []
+        _register(registry, FakeProvider())
+        assert [p["name"] for p in catalog.providers()] == ["fake"]
+
+    def test_get_falls_back_to_snapshot(self, registry, catalog):
+        assert catalog.get("gemini-1.5-pro")["context_window"] == 2097152
+        assert catalog.get("unknown-model") is None
+
+    @pytest.mark.asyncio
+    async def test_context_budget_reads_catalog(self, registry, catalog):
+        _register(registry, ListingProvider(
+            "local", [{"id": "llama", "context_window": 32768}]
+        ))
+        assert context_window("llama") is None
+
+        await catalog.refresh()
+
+        assert context_window("llama") == 32768
+
+    @pytest.mark.asyncio
+    async def test_background_refresh(self, registry, catalog, monkeypatch):
+        monkeypatch.setattr(
+            model_catalog.settings, "MODEL_CATALOG_REFRESH_SECONDS", 0.01
+        )
+        provider = _register(
+            registry, ListingProvider("local", [{"id": "llama"}])
+        )
+
+        catalog.start()
+        await asyncio.sleep(0.05)
+        await catalog.stop()
+
+        assert provider.calls >= 2
+
+
+class TestProvidersRoute:
+    @pytest.mark.asyncio
+    async def test_etag_and_not_modified(self, client, registry, catalog):
+        _register(registry, FakeProvider())
+
+        response = await client.get("/api/ai/providers")
+        etag = response.headers["etag"]
+
+        assert response.status_code == 200
+        assert response.json()["providers"][0]["models"] == ["fake-echo"]
+
+        cached = await client.get(
+            "/api/ai/providers", headers={"If-None-Match": f"W/{etag}"}
+        )
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+        assert cached.content == b""
+
+    @pytest.mark.asyncio
+    async def test_provider_models(self, client, registry, catalog):
+        _register(registry, FakeProvider())
+
+        response = await client.get("/api/ai/providers/fake/models")
+
+        assert response.json()["models"] == ["fake-echo"]
+        assert response.json()["model_details"][0]["id"] == "fake-echo"
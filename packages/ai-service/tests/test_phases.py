@@ -0,0 +1,125 @@
+"""Tests for per-turn phase timing."""
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+from app.core import phases
+from app.routers import conversations
+from app.services import chat_pipeline
+from app.services.ai_providers import ChatMessage, ChatRequest, ProviderRegistry
+from app.services.chat_pipeline import ChatOptions
+from app.services.fake_provider import FakeProvider
+
+
+def _request(content: str = "hello there") -> ChatRequest:
+    return ChatRequest(messages=[ChatMessage(role="user", content=content)])
+
+
+class TestPhaseTimer:
+    def test_phases_accumulate(self):
+        timer = phases.PhaseTimer()
+        timer.record(phases.DB_READ, 0, 2_000_000)
+        timer.record(phases.DB_READ, 5_000_000, 6_500_000)
+        with timer.phase(phases.PROMPT_BUILD):
+            pass
+
+        timings = timer.as_dict()
+        assert timings["db_read_ms"] == 3.5
+        assert timings["prompt_build_ms"] >= 0
+
+    def test_disabled_returns_shared_noop(self, monkeypatch):
+        monkeypatch.setattr(phases.settings, "PHASE_TIMING_ENABLED", False)
+        timer = phases.start()
+
+        assert timer is phases.NOOP
+        assert timer.phase(phases.DB_READ) is timer.phase(phases.DB_WRITE)
+        timer.record(phases.DB_READ, 0, 1)
+        assert timer.as_dict() == {}
+
+    def test_no_turn_in_context(self):
+        assert phases.current() is phases.NOOP
+
+
+class TestPipelineTiming:
+    @pytest.mark.asyncio
+    async def test_complete_records_generation(self):
+        timer = phases.start()
+        await chat_pipeline.complete(
+            FakeProvider(), _request(), ChatOptions(cache=False)
+        )
+        assert set(timer.as_dict()) == {"generation_ms"}
+
+    @pytest.mark.asyncio
+    async def test_stream_records_ttft_and_generation(self):
+        timer = phases.start()
+        stream = chat_pipeline.stream(
+            FakeProvider(), _request(), ChatOptions(cache=False)
+        )
+        _ = [c async for c in stream]
+        assert set(timer.as_dict()) == {"ttft_ms", "generation_ms"}
+
+    @pytest.mark.asyncio
+    async def test_failed_call_records_nothing(self):
+        class Failing(FakeProvider):
+            async def chat(self, request):
+                raise RuntimeError("boom")
+
+        timer = phases.start()
+        with pytest.raises(RuntimeError):
+            await chat_pipeline.complete(
+                Failing(), _request(), ChatOptions(cache=False)
+            )
+        assert timer.as_dict() == {}
+
+
+class TestSendMessage:
+    @pytest.mark.asyncio
+    async def test_timings_stored_on_assistant_message(self, client, monkeypatch):
+        db = AsyncMongoMockClient()["agentbase_test"]
+        monkeypatch.setattr(conversations, "get_db", lambda: db)
+        monkeypatch.setattr(ProviderRegistry, "_providers", {})
+        ProviderRegistry.register(FakeProvider())
+
+        created = await client.post(
+            "/api/ai/conversations",
+            json={"application_id": "app", "user_id": "u"},
+        )
+        cid = created.json()["id"]
+        sent = await client.post(
+            f"/api/ai/conversations/{cid}/messages",
+            json={"content": "hi", "provider": "fake", "cache": False},
+        )
+        assert sent.status_code == 200
+
+        conv = (await client.get(f"/api/ai/conversations/{cid}")).json()
+        timings = conv["messages"][-1]["metadata"]["timings"]
+        assert {"db_read_ms", "prompt_build_ms", "generation_ms"} <= set(timings)
+        # Written by the very write it would time.
+        assert "db_write_ms" not in timings
+
+
+class TestOpenTelemetryExport:
+    def test_turn_exported_with_child_spans(self, monkeypatch):
+        pytest.importorskip("opentelemetry.sdk")
+        from opentelemetry.sdk.trace import TracerProvider  # type: ignore
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor  # type: ignore
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # type: ignore
+            InMemorySpanExporter,
+        )
+
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        monkeypatch.setattr(phases, "_tracer", lambda: provider.get_tracer("t"))
+
+        timer = phases.PhaseTimer()
+        timer.record(phases.DB_READ, 1_000, 2_000)
+        timer.record(phases.GENERATION, 3_000, 9_000)
+        timer.report("chat_turn", conversation_id="c1", model=None)
+
+        spans = {s.name: s for s in exporter.get_finished_spans()}
+        assert set(spans) == {"chat_turn", "db_read", "generation"}
+        root = spans["chat_turn"]
+        assert spans["generation"].parent.span_id == root.context.span_id
+        assert root.end_time - root.start_time == 8_000
+        assert root.attributes["conversation_id"] == "c1"
@@ -151,6 +151,32 @@ class TestOpenAIProvider:
         assert "gpt-4o" in models
 
 
+    @pytest.mark.asyncio
+    async def test_cached_prompt_tokens_are_reported(self):
+        from app.services.ai_providers import OpenAIProvider
+
+        provider = OpenAIProvider.__new__(OpenAIProvider)
+        provider.client = MagicMock()
+        usage = MagicMock(prompt_tokens=2000, completion_tokens=20)
+        usage.prompt_tokens_details.cached_tokens = 1792
+        response = MagicMock(usage=usage)
+        response.choices[0].message.content = "ok"
+        provider.client.chat.completions.create = AsyncMock(
+            return_value=response
+        )
+
+        result = await provider.chat(ChatRequest(
+            messages=[ChatMessage(role="user", content="Hi")],
+        ))
+
+        assert result.usage == {
+            "prompt_tokens": 2000,
+            "completion_tokens": 20,
+            "total_tokens": 2020,
+            "cache_read_tokens": 1792,
+        }
+
+
 # ─── Anthropic Provider ────────────────────────────────────
 
 class TestAnthropicProvider:
@@ -184,6 +210,68 @@ class TestAnthropicProvider:
         assert result.provider == "anthropic"
         assert result.usage["total_tokens"] == 12
 
+    @pytest.mark.asyncio
+    async def test_prompt_cache_breakpoints_and_usage(self):
+        from app.services.ai_providers import AnthropicProvider
+
+        provider = AnthropicProvider.__new__(AnthropicProvider)
+        provider.client = MagicMock()
+        usage = MagicMock(
+            input_tokens=50, output_tokens=10,
+            cache_read_input_tokens=3000, cache_creation_input_tokens=200,
+        )
+        provider.client.messages.create = AsyncMock(return_value=MagicMock(
+            content=[MagicMock(text="ok")], usage=usage,
+        ))
+        request = ChatRequest(messages=[
+            ChatMessage(role="system", content="policy " * 800),
+            ChatMessage(role="user", content="first"),
+            ChatMessage(role="assistant", content="answer"),
+            ChatMessage(role="user", content="second"),
+        ])
+
+        result = await provider.chat(request)
+
+        kwargs = provider.client.messages.create.call_args.kwargs
+        assert kwargs["system"][0]["cache_control"] == {"type": "ephemeral"}
+        assert kwargs["messages"][0] == {"role": "user", "content": "first"}
+        assert kwargs["messages"][-1]["content"] == [{
+            "type": "text", "text": "second",
+            "cache_control": {"type": "ephemeral"},
+        }]
+        assert result.usage == {
+            "prompt_tokens": 3250,
+            "completion_tokens": 10,
+            "total_tokens": 3260,
+            "cache_read_tokens": 3000,
+            "cache_write_tokens": 200,
+        }
+
+    def test_short_prompts_get_no_breakpoints(self):
+        from app.services.ai_providers import AnthropicProvider
+
+        provider = AnthropicProvider.__new__(AnthropicProvider)
+        system, messages = provider._prompt([
+            ChatMessage(role="user", content="Hi"),
+        ])
+
+        assert system == [{"type": "text", "text": "You are a helpful assistant."}]
+        assert messages == [{"role": "user", "content": "Hi"}]
+
+    def test_breakpoints_can_be_disabled(self, monkeypatch):
+        from app.services import ai_providers
+        from app.services.ai_providers import AnthropicProvider
+
+        monkeypatch.setattr(ai_providers.settings, "PROMPT_CACHE_ENABLED", False)
+        provider = AnthropicProvider.__new__(AnthropicProvider)
+        system, messages = provider._prompt([
+            ChatMessage(role="system", content="policy " * 800),
+            ChatMessage(role="user", content="Hi"),
+        ])
+
+        assert "cache_control" not in system[0]
+        assert messages == [{"role": "user", "content": "Hi"}]
+
     def test_name(self):
         from app.services.ai_providers import AnthropicProvider
 
@@ -205,7 +293,8 @@ class TestGeminiProvider:
     async def test_chat_returns_response(self):
         from app.services.ai_providers import GeminiProvider
 
-        provider = GeminiProvider.__new__(GeminiProvider)
+        provider = GeminiProvider("test-key")
+        provider._async_client = MagicMock()
 
         # Mock the genai module and GenerativeModel
         mock_genai = MagicMock()
@@ -246,7 +335,8 @@ class TestGeminiProvider:
     async def test_chat_without_system_message(self):
         from app.services.ai_providers import GeminiProvider
 
-        provider = GeminiProvider.__new__(GeminiProvider)
+        provider = GeminiProvider("test-key")
+        provider._async_client = MagicMock()
 
         mock_genai = MagicMock()
         provider._genai = mock_genai
@@ -271,6 +361,130 @@ class TestGeminiProvider:
         call_kwargs = mock_genai.GenerativeModel.call_args
         assert "system_instruction" not in call_kwargs.kwargs
 
+    def _cached_provider(self):
+        from app.services.ai_providers import GeminiProvider
+
+        provider = GeminiProvider("test-key")
+        provider._async_client = MagicMock()
+        provider._genai = MagicMock()
+        provider._genai.GenerativeModel.side_effect = lambda **kw: MagicMock()
+        return provider
+
+    def test_model_handles_are_reused(self):
+        provider = self._cached_provider()
+        request = ChatRequest(messages=[ChatMessage(role="user", content="a")])
+
+        first = provider._model("gemini-2.0-flash", "sys", request)
+        again = provider._model("gemini-2.0-flash", "sys", request)
+        other = provider._model("gemini-2.0-flash", "other sys", request)
+
+        assert first is again
+        assert other is not first
+        assert provider._genai.GenerativeModel.call_count == 2
+
+    def test_model_handles_are_evicted_lru(self, monkeypatch):
+        from app.services import ai_providers
+
+        monkeypatch.setattr(ai_providers.settings, "GEMINI_MODEL_CACHE_SIZE", 2)
+        provider = self._cached_provider()
+        request = ChatRequest(messages=[ChatMessage(role="user", content="a")])
+
+        a = provider._model("m", "a", request)
+        provider._model("m", "b", request)
+        provider._model("m", "a", request)
+        provider._model("m", "c", request)
+
+        assert provider._model("m", "a", request) is a
+        assert provider._genai.GenerativeModel.call_count == 3
+        provider._model("m", "b", request)
+        assert provider._genai.GenerativeModel.call_count == 4
+
+    @pytest.mark.asyncio
+    async def test_long_system_instruction_uses_context_cache(self, monkeypatch):
+        from app.services import ai_providers
+
+        monkeypatch.setattr(
+            ai_providers.settings, "GEMINI_CONTEXT_CACHE_ENABLED", True
+        )
+        monkeypatch.setattr(
+            ai_providers.settings, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 10
+        )
+        provider = self._cached_provider()
+        create = AsyncMock(return_value="cachedContents/abc")
+        monkeypatch.setattr(provider, "_create_context", create)
+        response = MagicMock(text="ok", usage_metadata=None)
+        provider._genai.GenerativeModel.side_effect = lambda **kw: MagicMock(
+            generate_content_async=AsyncMock(return_value=response)
+        )
+        request = ChatRequest(messages=[
+            ChatMessage(role="system", content="document " * 20),
+            ChatMessage(role="user", content="question"),
+        ])
+
+        for _ in range(3):
+            await provider.chat(request)
+
+        create.assert_awaited_once()
+        factory = provider._genai.GenerativeModel
+        assert factory.call_count == 1
+        # The instruction lives in the cached content, not on the model.
+        assert "system_instruction" not in factory.call_args.kwargs
+        model = next(iter(provider._models.values()))
+        assert model._cached_content == "cachedContents/abc"
+
+    @pytest.mark.asyncio
+    async def test_create_context_uploads_system_instruction(self):
+        provider = self._cached_provider()
+        cached = MagicMock()
+        cached.name = "cachedContents/xyz"
+        provider._cache_client = MagicMock()
+        provider._cache_client.create_cached_content = AsyncMock(
+            return_value=cached
+        )
+
+        name = await provider._create_context("gemini-1.5-pro", "docs", 600)
+
+        assert name == "cachedContents/xyz"
+        sent = provider._cache_client.create_cached_content.call_args.kwargs[
+            "cached_content"
+        ]
+        assert sent.model == "models/gemini-1.5-pro"
+        assert sent.system_instruction.parts[0].text == "docs"
+        assert sent.ttl.total_seconds() == 600
+
+    @pytest.mark.asyncio
+    async def test_context_cache_failure_falls_back(self, monkeypatch):
+        from app.services import ai_providers
+
+        monkeypatch.setattr(
+            ai_providers.settings, "GEMINI_CONTEXT_CACHE_ENABLED", True
+        )
+        monkeypatch.setattr(
+            ai_providers.settings, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 10
+        )
+        provider = self._cached_provider()
+        create = AsyncMock(side_effect=RuntimeError("too small"))
+        monkeypatch.setattr(provider, "_create_context", create)
+        system = "document " * 20
+
+        assert await provider._cached_context("m", system) is None
+        assert await provider._cached_context("m", system) is None
+        create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_short_system_instruction_is_not_cached(self, monkeypatch):
+        from app.services import ai_providers
+
+        monkeypatch.setattr(
+            ai_providers.settings, "GEMINI_CONTEXT_CACHE_ENABLED", True
+        )
+        provider = self._cached_provider()
+        create = AsyncMock()
+        monkeypatch.setattr(provider, "_create_context", create)
+
+        assert await provider._cached_context("m", "be brief") is None
+        create.assert_not_awaited()
+
     def test_name(self):
         from app.services.ai_providers import GeminiProvider
 
@@ -305,6 +519,22 @@ class TestGeminiProvider:
         assert contents[2]["role"] == "user"
 
 
+class TestOpenAIModelFilter:
+    @pytest.mark.parametrize("model_id,expected", [
+        ("gpt-4o", True),
+        ("gpt-4o-2024-08-06", True),
+        ("o1-mini", True),
+        ("gpt-4o-audio-preview", False),
+        ("gpt-3.5-turbo-instruct", False),
+        ("text-embedding-3-small", False),
+        ("whisper-1", False),
+    ])
+    def test_chat_models_only(self, model_id, expected):
+        from app.services.ai_providers import _is_openai_chat_model
+
+        assert _is_openai_chat_model(model_id) is expected
+
+
 # ─── HuggingFace Provider ──────────────────────────────────
 
 class TestHuggingFaceProvider:
@@ -387,3 +617,98 @@ class TestHuggingFaceProvider:
         assert "<|user|>" in prompt
         assert "<|assistant|>" in prompt
         assert prompt.endswith("<|assistant|>\n")
+
+
+class TestHuggingFaceTransport:
+    @pytest.fixture
+    def server(self, monkeypatch):
+        """Serve every HuggingFace client from an in-process handler."""
+        import httpx
+        from app.services.ai_providers import HuggingFaceProvider
+
+        requests = []
+        body = (
+            b'data:{"token":{"text":"Hel","special":false}}\n\n'
+            b'data:{"token":{"text":"lo","special":false}}\r\n\r\n'
+            b': keep-alive\n\n'
+            b'data:{"token":{"text":"</s>","special":true},'
+            b'"generated_text":"Hello"}\n\n'
+        )
+
+        async def stream():
+            # Frames split mid-line to exercise the incremental parser.
+            for i in range(0, len(body), 7):
+                yield body[i:i + 7]
+
+        def handler(request):
+            requests.append(request)
+            if b'"stream"' in request.content:
+                return httpx.Response(200, content=stream())
+            return httpx.Response(200, json={"generated_text": " hi "})
+
+        monkeypatch.setattr(
+            HuggingFaceProvider, "_transport", httpx.MockTransport(handler)
+        )
+        return requests
+
+    @pytest.mark.asyncio
+    async def test_stream_parses_sse_bytes(self, server):
+        from app.services.ai_providers import HuggingFaceProvider
+
+        provider = HuggingFaceProvider("hf-key")
+        request = ChatRequest(messages=[ChatMessage(role="user", content="Hi")])
+        tokens = [t async for t in provider.chat_stream(request)]
+
+        assert tokens == ["Hel", "lo"]
+        assert server[0].url.path == f"/models/{provider.default_model}"
+        assert server[0].headers["authorization"] == "Bearer hf-key"
+
+    @pytest.mark.asyncio
+    async def test_self_hosted_endpoints(self, server, monkeypatch):
+        from app.services import ai_providers
+
+        monkeypatch.setattr(
+            ai_providers.settings, "HUGGINGFACE_BASE_URL", "http://tgi:8080/"
+        )
+        provider = ai_providers.HuggingFaceProvider("")
+        request = ChatRequest(messages=[ChatMessage(role="user", content="Hi")])
+
+        response = await provider.chat(request)
+        tokens = [t async for t in provider.chat_stream(request)]
+
+        assert response.content == "hi"
+        assert tokens == ["Hel", "lo"]
+        assert [str(r.url) for r in server] == [
+            "http://tgi:8080/generate", "http://tgi:8080/generate_stream",
+        ]
+        assert "authorization" not in server[0].headers
+
+    @pytest.mark.asyncio
+    async def test_clients_share_one_transport(self, monkeypatch):
+        from app.services.ai_providers import HuggingFaceProvider
+
+        monkeypatch.setattr(HuggingFaceProvider, "_transport", None)
+        first = HuggingFaceProvider("a")
+        second = HuggingFaceProvider("b")
+        transport = HuggingFaceProvider._transport
+
+        assert transport is not None
+        await first.aclose()
+        # Closing one client leaves the pool to the others.
+        assert HuggingFaceProvider.shared_transport() is transport
+
+        await second.aclose()
+        await HuggingFaceProvider.close_transport()
+        assert HuggingFaceProvider._transport is None
+
+    @pytest.mark.asyncio
+    async def test_registry_closes_transport(self, monkeypatch):
+        from app.services.ai_providers import HuggingFaceProvider
+
+        monkeypatch.setattr(HuggingFaceProvider, "_transport", None)
+        monkeypatch.setattr(ProviderRegistry, "_providers", {})
+        ProviderRegistry.register(HuggingFaceProvider("a"))
+
+        await ProviderRegistry.aclose()
+
+        assert HuggingFaceProvider._transport is None
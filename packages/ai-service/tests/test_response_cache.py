@@ -0,0 +1,151 @@
+"""Tests for the exact-match response cache and its pipeline integration."""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+from app.routers import conversations as conversations_router
+from app.services import chat_pipeline, message_store
+from app.services.ai_providers import (
+    ChatMessage,
+    ChatRequest,
+    ChatResponse,
+    ProviderRegistry,
+)
+from app.services.chat_pipeline import ChatOptions
+from app.services.fake_provider import FakeProvider
+from app.services.response_cache import ResponseCache, cache_key, response_cache
+
+
+def _request(content: str = "Classify: spam?", temperature: float = 0.0):
+    return ChatRequest(
+        messages=[ChatMessage(role="user", content=content)],
+        temperature=temperature,
+    )
+
+
+def _provider() -> MagicMock:
+    provider = MagicMock()
+    provider.name = "openai"
+    provider.default_model = "gpt-4"
+    provider.chat = AsyncMock(return_value=ChatResponse(
+        content="spam",
+        model="gpt-4",
+        provider="openai",
+        usage={"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+    ))
+
+    async def chat_stream(request):
+        for part in ("sp", "am"):
+            yield part
+
+    provider.chat_stream = chat_stream
+    return provider
+
+
+class TestCacheKey:
+    def test_stable_for_equal_requests(self):
+        assert cache_key("openai", "gpt-4", _request()) == cache_key(
+            "openai", "gpt-4", _request()
+        )
+
+    def test_differs_on_each_input(self):
+        base = cache_key("openai", "gpt-4", _request())
+        assert base != cache_key("anthropic", "gpt-4", _request())
+        assert base != cache_key("openai", "gpt-4o", _request())
+        assert base != cache_key("openai", "gpt-4", _request("other"))
+        assert base != cache_key("openai", "gpt-4", _request(), scope="app-2")
+
+
+class TestResponseCache:
+    def test_non_deterministic_request_not_cacheable(self):
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        assert cache.key_for(_provider(), _request(temperature=0.7), True) is None
+
+    def test_bypass(self):
+        cache = ResponseCache(max_entries=8, ttl_seconds=60)
+        assert cache.key_for(_provider(), _request(), False) is None
+
+    @pytest.mark.asyncio
+    async def test_lru_bound(self):
+        cache = ResponseCache(max_entries=1, ttl_seconds=60)
+        response = ChatResponse(content="x", model="m", provider="p")
+        await cache.put("a", response)
+        await cache.put("b", response)
+
+        assert await cache.get("a") is None
+        assert (await cache.get("b")).usage["cache"] == "hit"
+
+
+class TestPipelineCaching:
+    def setup_method(self):
+        response_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_second_identical_call_is_served_from_cache(self):
+        provider = _provider()
+        options = ChatOptions(application_id="app-1", cache=True)
+
+        first = await chat_pipeline.complete(provider, _request(), options)
+        second = await chat_pipeline.complete(provider, _request(), options)
+
+        assert provider.chat.await_count == 1
+        assert first.usage["cache"] == "miss"
+        assert second.content == "spam"
+        assert second.usage["cache"] == "hit"
+        assert second.usage["total_tokens"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_miss_populates_cache_for_replay(self):
+        provider = _provider()
+        options = ChatOptions(cache=True)
+
+        first = chat_pipeline.stream(provider, _request(), options)
+        assert [c async for c in first] == ["sp", "am"]
+        assert first.usage == {"cache": "miss"}
+
+        replay = chat_pipeline.stream(provider, _request(), options)
+        assert [c async for c in replay] == ["spam"]
+        assert replay.usage["cache"] == "hit"
+
+
+class TestRouterCaching:
+    @pytest.fixture
+    def db(self, monkeypatch):
+        response_cache.clear()
+        database = AsyncMongoMockClient()["agentbase_test"]
+        monkeypatch.setattr(conversations_router, "get_db", lambda: database)
+        monkeypatch.setattr(ProviderRegistry, "_providers", {})
+        ProviderRegistry.register(FakeProvider())
+        yield database
+        response_cache.clear()
+
+    async def _conversation(self, db) -> str:
+        result = await db.ai_conversations.insert_one({
+            "applicationId": "app-1",
+            "title": "t",
+            **message_store.new_header_fields(),
+        })
+        return str(result.inserted_id)
+
+    @pytest.mark.asyncio
+    async def test_explicit_zero_temperature_is_cached(self, client, db):
+        body = {
+            "content": "Classify: spam?",
+            "provider": "fake",
+            "temperature": 0,
+            "cache": True,
+        }
+        # Two empty conversations send identical prompts.
+        responses = [
+            await client.post(
+                f"/api/ai/conversations/{await self._conversation(db)}/messages",
+                json=body,
+            )
+            for _ in range(2)
+        ]
+
+        assert [r.status_code for r in responses] == [200, 200]
+        assert [r.json()["usage"]["cache"] for r in responses] == ["miss", "hit"]
+        assert response_cache.stats()["hits"] == 1
@@ -0,0 +1,281 @@
+"""Tests for provider routing: fallbacks, circuit breakers and hedging."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.ai_providers import (
+    ChatMessage,
+    ChatRequest,
+    ChatResponse,
+    ProviderRegistry,
+)
+from app.services.chat_pipeline import ChatOptions
+from app.services.context_budget import ContextBudgetExceeded
+from app.services.routing import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    NoHealthyProvider,
+    RoutingPolicy,
+    is_provider_fault,
+)
+
+
+class _Provider:
+    def __init__(self, name, delay=0.0, error=None, model="m"):
+        self.name = name
+        self.default_model = model
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def chat(self, request):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error:
+            raise self.error
+        return ChatResponse(content=self.name, model=request.model, provider=self.name)
+
+
+def _request():
+    return ChatRequest(messages=[ChatMessage(role="user", content="Hi")])
+
+
+def _options():
+    return ChatOptions(cache=False)
+
+
+def _http_error(status: int) -> httpx.HTTPStatusError:
+    response = httpx.Response(status, request=httpx.Request("POST", "http://x"))
+    return httpx.HTTPStatusError(
+        str(status), request=response.request, response=response
+    )
+
+
+def _breaker(**overrides) -> CircuitBreaker:
+    config = dict(
+        window_seconds=60, min_requests=4, error_threshold=0.5, open_seconds=30
+    )
+    config.update(overrides)
+    return CircuitBreaker("openai", **config)
+
+
+class TestCircuitBreaker:
+    def test_opens_on_error_rate(self):
+        breaker = _breaker()
+        for ok in (True, False, True, False):
+            breaker.record(ok, 10)
+        assert breaker.state == STATE_OPEN
+        assert not breaker.allow()
+
+    def test_needs_minimum_volume(self):
+        breaker = _breaker()
+        breaker.record(False, 10)
+        assert breaker.state == STATE_CLOSED
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record(False, 10)
+        assert breaker.allow()
+        assert breaker.state == STATE_HALF_OPEN
+        assert not breaker.allow()
+        breaker.record(True, 10)
+        assert breaker.state == STATE_CLOSED
+
+    def test_failed_probe_reopens(self):
+        breaker = _breaker(open_seconds=0)
+        for _ in range(4):
+            breaker.record(False, 10)
+        breaker.allow()
+        breaker.record(False, 10)
+        assert breaker.state == STATE_OPEN
+
+    def test_slow_calls_count_as_errors(self):
+        breaker = _breaker(slow_call_ms=100)
+        for _ in range(4):
+            breaker.record(True, 500)
+        assert breaker.state == STATE_OPEN
+
+    def test_p95(self):
+        breaker = _breaker()
+        for latency in range(1, 101):
+            breaker.record(True, latency)
+        assert breaker.p95_ms() == 96
+
+
+class TestRoutingPolicy:
+    def setup_method(self):
+        ProviderRegistry._providers = {}
+
+    def _register(self, *providers):
+        for provider in providers:
+            ProviderRegistry.register(provider)
+
+    def test_chain_skips_unregistered_fallbacks(self):
+        self._register(_Provider("openai"), _Provider("gemini", model="g"))
+        policy = RoutingPolicy({"openai": ["anthropic:c", "gemini"]})
+        chain = policy.chain("openai", "gpt-4o")
+        assert [(p.name, m) for p, m in chain] == [("openai", "gpt-4o"), ("gemini", "g")]
+
+    @pytest.mark.asyncio
+    async def test_primary_serves_when_healthy(self):
+        self._register(_Provider("openai"), _Provider("anthropic"))
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+        route = await policy.complete("openai", _request(), _options())
+
+        assert route.response.provider == "openai"
+        assert route.summary()["fallback"] is False
+
+    @pytest.mark.asyncio
+    async def test_fails_over_to_next_provider(self):
+        broken = _Provider("openai", error=RuntimeError("503"))
+        self._register(broken, _Provider("anthropic", model="claude"))
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+        route = await policy.complete("openai", _request(), _options())
+
+        assert route.response.provider == "anthropic"
+        assert route.response.model == "claude"
+        assert route.fallback
+        assert [a["outcome"] for a in route.attempts] == ["error", "ok"]
+
+    @pytest.mark.asyncio
+    async def test_raises_last_error_when_all_fail(self):
+        self._register(
+            _Provider("openai", error=RuntimeError("a")),
+            _Provider("anthropic", error=RuntimeError("b")),
+        )
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+        with pytest.raises(RuntimeError, match="b"):
+            await policy.complete("openai", _request(), _options())
+
+    @pytest.mark.asyncio
+    async def test_client_error_is_raised_without_failover(self):
+        fallback = _Provider("anthropic")
+        self._register(_Provider("openai", error=_http_error(400)), fallback)
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.complete("openai", _request(), _options())
+
+        assert fallback.calls == 0
+        assert policy.breaker("openai").stats()["requests"] == 0
+
+    @pytest.mark.asyncio
+    async def test_provider_faults_are_recorded(self):
+        self._register(
+            _Provider("openai", error=_http_error(503)),
+            _Provider("anthropic", error=RuntimeError("unclassified")),
+            _Provider("gemini"),
+        )
+        policy = RoutingPolicy({"openai": ["anthropic", "gemini"]})
+
+        route = await policy.complete("openai", _request(), _options())
+
+        assert route.response.provider == "gemini"
+        assert policy.breaker("openai").stats()["error_rate"] == 1.0
+        assert policy.breaker("anthropic").stats()["requests"] == 0
+
+    def test_fault_classification(self):
+        assert is_provider_fault(_http_error(500))
+        assert is_provider_fault(_http_error(429))
+        assert is_provider_fault(httpx.ConnectError("refused"))
+        assert is_provider_fault(asyncio.TimeoutError())
+        assert not is_provider_fault(_http_error(404))
+        assert not is_provider_fault(ValueError("bad"))
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_is_skipped(self):
+        primary = _Provider("openai")
+        self._register(primary, _Provider("anthropic"))
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+        policy.breaker("openai")._open(0)
+        policy.breaker("openai")._opened_at = float("inf")
+
+        route = await policy.complete("openai", _request(), _options())
+        assert route.response.provider == "anthropic"
+        assert primary.calls == 0
+        assert route.attempts[0]["outcome"] == "circuit_open"
+
+    @pytest.mark.asyncio
+    async def test_no_healthy_provider(self):
+        self._register(_Provider("openai"))
+        policy = RoutingPolicy({})
+        policy.breaker("openai")._open(0)
+        policy.breaker("openai")._opened_at = float("inf")
+        with pytest.raises(NoHealthyProvider):
+            await policy.complete("openai", _request(), _options())
+
+    @pytest.mark.asyncio
+    async def test_hedge_takes_faster_provider_and_cancels_loser(self, monkeypatch):
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "ROUTING_HEDGE_DEFAULT_DELAY_MS", 10.0)
+        slow = _Provider("openai", delay=5.0)
+        fast = _Provider("anthropic")
+        self._register(slow, fast)
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+
+        route = await policy.complete("openai", _request(), _options(), hedge=True)
+
+        assert route.response.provider == "anthropic"
+        assert route.hedged and route.fallback
+        assert slow.cancelled == 1
+        assert {a["outcome"] for a in route.attempts} == {"ok", "cancelled"}
+
+    @pytest.mark.asyncio
+    async def test_no_hedge_when_primary_is_fast(self, monkeypatch):
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "ROUTING_HEDGE_DEFAULT_DELAY_MS", 1000.0)
+        fallback = _Provider("anthropic")
+        self._register(_Provider("openai"), fallback)
+        policy = RoutingPolicy({"openai": ["anthropic"]})
+
+        route = await policy.complete("openai", _request(), _options(), hedge=True)
+        assert not route.hedged
+        assert fallback.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_hedge_delay_restarts_for_fallback_attempt(self, monkeypatch):
+        from app.core.config import settings
+
+        monkeypatch.setattr(settings, "ROUTING_HEDGE_DEFAULT_DELAY_MS", 200.0)
+        spare = _Provider("gemini")
+        self._register(
+            _Provider("openai", delay=0.15, error=_http_error(503)),
+            _Provider("anthropic", delay=0.1),
+            spare,
+        )
+        policy = RoutingPolicy({"openai": ["anthropic", "gemini"]})
+
+        route = await policy.complete("openai", _request(), _options(), hedge=True)
+
+        assert route.response.provider == "anthropic"
+        assert not route.hedged
+        assert spare.calls == 0
+
+    @pytest.mark.asyncio
+    async def test_context_overflow_falls_back_to_larger_window(self, monkeypatch):
+        from app.services import chat_pipeline
+
+        def prepare(provider, request, options):
+            if provider.name == "openai":
+                raise ContextBudgetExceeded("too long")
+            return request
+
+        monkeypatch.setattr(chat_pipeline, "prepare", prepare)
+        self._register(_Provider("openai"), _Provider("gemini"))
+        policy = RoutingPolicy({"openai": ["gemini"]})
+
+        route = await policy.complete("openai", _request(), _options())
+        assert route.response.provider == "gemini"
+        assert route.attempts[0]["outcome"] == "context_exceeded"
@@ -0,0 +1,281 @@
+"""Tests for the adaptive provider scheduler."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import chat_pipeline
+from app.services.ai_providers import ChatMessage, ChatRequest, ChatResponse
+from app.services.chat_pipeline import ChatOptions
+from app.services.scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    ModelLimiter,
+    Scheduler,
+    TokenBucket,
+    _parse_reset,
+    is_rate_limited,
+    observe_response,
+    scheduler,
+)
+
+
+def _scheduler(**limits) -> Scheduler:
+    return Scheduler(enabled=True, max_concurrency=4, limits=limits)
+
+
+class TestParseReset:
+    def test_openai_durations(self):
+        assert _parse_reset("6m0s") == 360.0
+        assert _parse_reset("20ms") == pytest.approx(0.02)
+        assert _parse_reset("1.5") == 1.5
+
+    def test_unparseable(self):
+        assert _parse_reset("soon") is None
+
+
+class TestTokenBucket:
+    def test_unlimited_never_waits(self):
+        assert TokenBucket(0).wait_time(10**9) == 0.0
+
+    def test_waits_for_refill_once_exhausted(self):
+        bucket = TokenBucket(60)
+        bucket.take(60)
+        assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_clamp_to_provider_remaining(self):
+        bucket = TokenBucket(100)
+        bucket.clamp(0)
+        assert bucket.wait_time(1) > 0
+
+    def test_oversized_request_waits_for_full_bucket_only(self):
+        bucket = TokenBucket(60)
+        assert bucket.wait_time(1000) == 0.0
+
+
+class TestModelLimiter:
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_queues_excess(self):
+        limiter = ModelLimiter("openai", "gpt-4", concurrency=1)
+        await limiter.acquire(1, PRIORITY_INTERACTIVE)
+        waiter = asyncio.create_task(limiter.acquire(1, PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+
+        assert limiter.queue_depth == 1
+        limiter.release()
+        await waiter
+        assert limiter.in_flight == 1
+        assert limiter.stats()["waited"] == 2
+
+    @pytest.mark.asyncio
+    async def test_interactive_dispatched_before_batch(self):
+        limiter = ModelLimiter("openai", "gpt-4", concurrency=1)
+        await limiter.acquire(1, PRIORITY_INTERACTIVE)
+        order = []
+
+        async def run(name, priority):
+            await limiter.acquire(1, priority)
+            order.append(name)
+            limiter.release()
+
+        tasks = [
+            asyncio.create_task(run("batch", PRIORITY_BATCH)),
+            asyncio.create_task(run("interactive", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+
+        assert order == ["interactive", "batch"]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        limiter = ModelLimiter("openai", "gpt-4", concurrency=1)
+        await limiter.acquire(1, PRIORITY_INTERACTIVE)
+        waiter = asyncio.create_task(limiter.acquire(1, PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert limiter.queue_depth == 0
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    def test_aimd(self):
+        limiter = ModelLimiter("openai", "gpt-4", concurrency=8)
+        limiter.on_rate_limited(0)
+        assert limiter.concurrency == 4
+        # A second 429 inside the cooldown is the same congestion signal.
+        limiter.on_rate_limited(0)
+        assert limiter.concurrency == 4
+        for _ in range(4):
+            limiter.on_success()
+        assert 4.9 < limiter.concurrency < 5.1
+
+    @pytest.mark.asyncio
+    async def test_learns_budgets_from_openai_headers(self):
+        limiter = ModelLimiter("openai", "gpt-4", concurrency=4)
+        limiter.observe_headers(httpx.Headers({
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-limit-tokens": "30000",
+            "x-ratelimit-remaining-tokens": "29000",
+        }), 200)
+
+        assert limiter.requests.limit == 500
+        assert limiter.tokens.limit == 30000
+        assert limiter.requests.wait_time(1) > 0
+
+    def test_budgets_split_across_workers(self):
+        limiter = ModelLimiter(
+            "openai", "gpt-4", concurrency=8, rpm=600, tpm=0, workers=4
+        )
+
+        assert limiter.max_concurrency == 2
+        assert limiter.requests.limit == 150
+        assert limiter.tokens.limit == 0
+        # A small budget still leaves every worker at least one slot.
+        assert ModelLimiter("openai", "gpt-4", 2, workers=4).max_concurrency == 1
+
+    def test_learned_budgets_split_across_workers(self):
+        limiter = ModelLimiter("openai", "gpt-4", concurrency=4, workers=4)
+        limiter.observe_headers(httpx.Headers({
+            "x-ratelimit-limit-requests": "500",
+            "x-ratelimit-remaining-requests": "400",
+        }), 200)
+
+        assert limiter.requests.limit == 125
+        assert limiter.requests._level <= 100
+
+    @pytest.mark.asyncio
+    async def test_429_pauses_until_retry_after(self):
+        limiter = ModelLimiter("anthropic", "claude", concurrency=4)
+        limiter.observe_headers(httpx.Headers({"retry-after": "30"}), 429)
+
+        waiter = asyncio.create_task(limiter.acquire(1, PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        assert limiter.concurrency == 2
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+
+class TestScheduler:
+    def test_model_limits_override_provider_limits(self):
+        sched = _scheduler(
+            openai={"concurrency": 2, "rpm": 100},
+            **{"openai:gpt-4o": {"rpm": 10}},
+        )
+        limiter = sched.limiter("openai", "gpt-4o")
+        assert (limiter.max_concurrency, limiter.requests.limit) == (2, 10)
+
+    @pytest.mark.asyncio
+    async def test_slot_feeds_rate_limit_errors_back(self):
+        sched = _scheduler()
+        response = httpx.Response(429, request=httpx.Request("POST", "http://x"))
+        error = httpx.HTTPStatusError("429", request=response.request, response=response)
+        assert is_rate_limited(error)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            async with sched.slot("huggingface", "m", 10):
+                raise error
+        limiter = sched.limiter("huggingface", "m")
+        assert limiter.rate_limited == 1
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_response_hook_updates_active_slot(self):
+        sched = _scheduler()
+        async with sched.slot("openai", "gpt-4", 10):
+            await observe_response(httpx.Response(
+                200, headers={"x-ratelimit-limit-requests": "60"}
+            ))
+        assert sched.limiter("openai", "gpt-4").requests.limit == 60
+
+    @pytest.mark.asyncio
+    async def test_usage_corrects_token_estimate(self):
+        sched = _scheduler(openai={"tpm": 1000})
+        async with sched.slot("openai", "gpt-4", 600) as slot:
+            slot.record_usage(100)
+        assert sched.limiter("openai", "gpt-4").tokens.wait_time(900) == 0.0
+
+    @pytest.mark.asyncio
+    async def test_tenant_rate_limit_does_not_pause_platform(self):
+        sched = _scheduler()
+        async with sched.slot("openai", "gpt-4", 10, tenant="byok-a"):
+            await observe_response(httpx.Response(
+                429,
+                headers={"retry-after": "30", "x-ratelimit-limit-requests": "5"},
+            ))
+
+        tenant = sched.limiter("openai", "gpt-4", tenant="byok-a")
+        platform = sched.limiter("openai", "gpt-4")
+        assert tenant.rate_limited == 1
+        assert tenant.requests.limit == 5
+        assert platform.rate_limited == 0
+        assert platform.paused_until == 0.0
+        assert platform.requests.limit == 0
+        assert [s["model"] for s in sched.stats()] == ["gpt-4"]
+
+    def test_idle_tenant_limiters_are_bounded(self):
+        sched = Scheduler(
+            enabled=True, max_concurrency=4, limits={}, max_tenant_limiters=2
+        )
+        first = sched.limiter("openai", "gpt-4", tenant="a")
+        sched.limiter("openai", "gpt-4", tenant="b")
+        sched.limiter("openai", "gpt-4", tenant="c")
+
+        assert len(sched._tenant_limiters) == 2
+        assert sched.limiter("openai", "gpt-4", tenant="a") is not first
+
+    @pytest.mark.asyncio
+    async def test_disabled_is_a_no_op(self):
+        sched = Scheduler(enabled=False, max_concurrency=1, limits={})
+        async with sched.slot("openai", "gpt-4", 10) as slot:
+            assert slot is None
+        assert sched.stats() == []
+
+
+class TestPipelineScheduling:
+    @pytest.mark.asyncio
+    async def test_calls_take_and_release_a_slot(self):
+        class Provider:
+            name = "sched-test"
+            default_model = "m"
+
+            async def chat(self, request):
+                limiter = scheduler.limiter("sched-test", "m")
+                assert limiter.in_flight == 1
+                return ChatResponse(content="ok", model="m", provider=self.name)
+
+        request = ChatRequest(messages=[ChatMessage(role="user", content="Hi")])
+        await chat_pipeline.complete(Provider(), request, ChatOptions(cache=False))
+
+        assert scheduler.limiter("sched-test", "m").in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_byok_429_leaves_platform_limiter_alone(self):
+        class TenantProvider:
+            name = "sched-byok"
+            default_model = "m"
+            tenant = "pool-key"
+
+            async def chat(self, request):
+                response = httpx.Response(
+                    429, request=httpx.Request("POST", "http://x")
+                )
+                raise httpx.HTTPStatusError(
+                    "429", request=response.request, response=response
+                )
+
+        request = ChatRequest(messages=[ChatMessage(role="user", content="Hi")])
+        with pytest.raises(httpx.HTTPStatusError):
+            await chat_pipeline.complete(
+                TenantProvider(), request, ChatOptions(cache=False)
+            )
+
+        assert scheduler.limiter("sched-byok", "m", "pool-key").rate_limited == 1
+        platform = scheduler.limiter("sched-byok", "m")
+        assert platform.rate_limited == 0
+        assert platform.paused_until == 0.0
@@ -0,0 +1,163 @@
+"""Tests for the semantic (embedding-similarity) cache."""
+
+import threading
+
+import numpy as np
+import pytest
+from unittest.mock import MagicMock
+
+from app.services.ai_providers import ChatMessage, ChatRequest, ChatResponse
+from app.services.semantic_cache import (
+    BruteForceIndex,
+    SemanticCache,
+    hashed_ngram_embedding,
+)
+
+
+def _provider() -> MagicMock:
+    provider = MagicMock()
+    provider.name = "openai"
+    provider.default_model = "gpt-4"
+    return provider
+
+
+def _request(
+    question: str, system: str = "FAQ bot", temperature: float = 0.7
+) -> ChatRequest:
+    return ChatRequest(messages=[
+        ChatMessage(role="system", content=system),
+        ChatMessage(role="user", content=question),
+    ], temperature=temperature)
+
+
+def _cache(**kwargs) -> SemanticCache:
+    defaults = dict(
+        embedder=hashed_ngram_embedding,
+        threshold=0.8,
+        max_entries_per_app=4,
+        max_apps=2,
+    )
+    return SemanticCache(**{**defaults, **kwargs})
+
+
+def _answer(text: str = "Go to Settings > Billing.") -> ChatResponse:
+    return ChatResponse(content=text, model="gpt-4", provider="openai")
+
+
+class TestEmbedding:
+    def test_normalised(self):
+        vec = hashed_ngram_embedding("How do I reset my password?")
+        assert np.isclose(np.linalg.norm(vec), 1.0)
+
+    def test_paraphrase_closer_than_unrelated(self):
+        q = hashed_ngram_embedding("How do I cancel my subscription?")
+        para = hashed_ngram_embedding("how can I cancel my subscription")
+        other = hashed_ngram_embedding("What is the weather in Paris?")
+        assert q @ para > q @ other
+
+
+class TestBruteForceIndex:
+    def test_evicts_least_recently_used_when_full(self):
+        index = BruteForceIndex(dim=2, capacity=2)
+        index.add(np.array([1.0, 0.0], np.float32), 1, {"id": "a"})
+        index.add(np.array([0.0, 1.0], np.float32), 1, {"id": "b"})
+        index.search(np.array([1.0, 0.0], np.float32), 1)  # touch "a"
+        index.add(np.array([0.7, 0.7], np.float32), 1, {"id": "c"})
+
+        assert len(index) == 2
+        _, hit = index.search(np.array([0.0, 1.0], np.float32), 1)
+        assert hit["id"] != "b"
+
+
+class TestSemanticCache:
+    def test_paraphrase_hits_within_application(self):
+        cache = _cache()
+        probe = cache.probe_for(
+            _provider(), _request("How do I update my billing details?"), "app-1", True
+        )
+        cache.put(probe, _answer(), latency_ms=800)
+
+        hit = cache.lookup(cache.probe_for(
+            _provider(), _request("how do i update my billing details"), "app-1", True
+        ))
+
+        assert hit is not None
+        assert hit.usage["cache"] == "semantic_hit"
+        assert cache.stats()["latency_saved_ms"] == 800
+
+    def test_scoped_per_application_and_system_prompt(self):
+        cache = _cache()
+        question = "How do I update my billing details?"
+        cache.put(
+            cache.probe_for(_provider(), _request(question), "app-1", True),
+            _answer(),
+            latency_ms=1,
+        )
+
+        other_app = cache.probe_for(_provider(), _request(question), "app-2", True)
+        other_bot = cache.probe_for(
+            _provider(), _request(question, system="Pirate bot"), "app-1", True
+        )
+        assert cache.lookup(other_app) is None
+        assert cache.lookup(other_bot) is None
+
+    def test_scoped_per_temperature(self):
+        cache = _cache()
+        question = "How do I update my billing details?"
+        cache.put(
+            cache.probe_for(_provider(), _request(question, temperature=0), "app-1", True),
+            _answer(),
+            latency_ms=1,
+        )
+
+        sampled = cache.probe_for(
+            _provider(), _request(question, temperature=1.0), "app-1", True
+        )
+        assert cache.lookup(sampled) is None
+
+    def test_probe_does_not_embed(self):
+        embedder = MagicMock(side_effect=hashed_ngram_embedding)
+        cache = _cache(embedder=embedder)
+
+        probe = cache.probe_for(_provider(), _request("q"), "app-1", True)
+
+        assert probe is not None
+        embedder.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_custom_embedder_runs_off_event_loop(self):
+        threads = []
+
+        def embedder(text):
+            threads.append(threading.get_ident())
+            return hashed_ngram_embedding(text)
+
+        cache = _cache(embedder=embedder)
+        probe = cache.probe_for(_provider(), _request("q"), "app-1", True)
+
+        await cache.embed(probe)
+        await cache.embed(probe)
+
+        assert len(threads) == 1
+        assert threads[0] != threading.get_ident()
+
+    def test_follow_up_turns_not_eligible(self):
+        request = ChatRequest(messages=[
+            ChatMessage(role="user", content="Hi"),
+            ChatMessage(role="assistant", content="Hello!"),
+            ChatMessage(role="user", content="What did I just say?"),
+        ])
+        assert _cache().probe_for(_provider(), request, "app-1", True) is None
+
+    def test_disabled_without_application(self):
+        assert _cache().probe_for(_provider(), _request("q"), None, True) is None
+
+    def test_application_count_bounded(self):
+        cache = _cache(max_apps=1)
+        for app_id in ("app-1", "app-2"):
+            cache.put(
+                cache.probe_for(_provider(), _request("q"), app_id, True),
+                _answer(),
+                latency_ms=1,
+            )
+        assert cache.stats()["applications"] == 1
@@ -0,0 +1,104 @@
+"""Tests for orjson responses, SSE frames and the streamed conversation body."""
+
+import json
+from datetime import datetime
+
+import pytest
+from bson import ObjectId  # type: ignore
+from fastapi.encoders import jsonable_encoder
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+from app.core.serialization import dumps
+from app.routers import conversations as conversations_router
+from app.routers.streaming import _event_frame, _sse_frame
+from app.services import message_store
+from app.services.stream_sessions import StreamEvent
+
+
+def _data(frame: bytes) -> tuple[list[str], dict]:
+    lines = frame.decode().split("\n")
+    assert frame.endswith(b"\n\n")
+    payload = json.loads(lines[-3].removeprefix("data: "))
+    return lines[:-3], payload
+
+
+class TestDumps:
+    def test_matches_jsonable_encoder(self):
+        doc = {
+            "_id": ObjectId(),
+            "createdAt": datetime(2024, 5, 1, 12, 30, 15, 250000),
+            "messages": [{"role": "user", "content": "héllo \"quoted\""}],
+        }
+        assert json.loads(dumps(doc)) == jsonable_encoder(
+            doc, custom_encoder={ObjectId: str}
+        )
+
+    def test_unknown_types_raise(self):
+        with pytest.raises(TypeError):
+            dumps({"value": object()})
+
+
+class TestSseFrames:
+    def test_chunk_frame(self):
+        frame = _event_frame(StreamEvent(7, "chunk", 'line\n"two"'))
+        head, payload = _data(frame)
+
+        assert head == ["id: 7"]
+        assert payload == {"type": "chunk", "content": 'line\n"two"'}
+
+    def test_done_frame_carries_usage(self):
+        usage = {"prompt_tokens": 3, "completion_tokens": 5}
+        head, payload = _data(_event_frame(StreamEvent(None, "done", "ab", usage)))
+
+        assert head == []
+        assert payload == {"type": "done", "content": "ab", "usage": usage}
+
+    def test_plain_frame(self):
+        head, payload = _data(_sse_frame(None, {"type": "start", "stream_id": "s"}))
+        assert head == []
+        assert payload == {"type": "start", "stream_id": "s"}
+
+
+class TestGetConversation:
+    @pytest.fixture
+    def db(self, monkeypatch):
+        database = AsyncMongoMockClient()["agentbase_test"]
+        monkeypatch.setattr(conversations_router, "get_db", lambda: database)
+        return database
+
+    async def _conversation(self, db, count: int) -> str:
+        result = await db.ai_conversations.insert_one({
+            "applicationId": "app",
+            "title": "t",
+            **message_store.new_header_fields(),
+            "createdAt": datetime(2024, 1, 1),
+        })
+        if count:
+            await message_store.append_messages(db, result.inserted_id, [
+                {"role": "user", "content": f"m{i}",
+                 "timestamp": datetime(2024, 1, 1, 0, 0, i % 60)}
+                for i in range(count)
+            ])
+        return str(result.inserted_id)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("count", [0, 3, 250])
+    async def test_streams_every_bucket(self, client, db, count):
+        cid = await self._conversation(db, count)
+
+        response = await client.get(f"/api/ai/conversations/{cid}")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        body = response.json()
+        assert body["_id"] == cid
+        assert body["createdAt"] == "2024-01-01T00:00:00"
+        assert [m["content"] for m in body["messages"]] == [
+            f"m{i}" for i in range(count)
+        ]
+        assert all("index" not in m for m in body["messages"])
+
+    @pytest.mark.asyncio
+    async def test_missing_conversation(self, client, db):
+        response = await client.get(f"/api/ai/conversations/{ObjectId()}")
+        assert response.status_code == 404
@@ -0,0 +1,73 @@
+"""Tests for the multi-worker entry point."""
+
+import os
+
+import pytest
+
+from app import serve
+
+
+def _cgroup(monkeypatch, files: dict):
+    monkeypatch.setattr(serve, "_read", files.get)
+
+
+class TestCpuQuota:
+    def test_cgroup_v2(self, monkeypatch):
+        _cgroup(monkeypatch, {serve._CGROUP_CPU_MAX: "250000 100000"})
+        assert serve.cpu_quota() == 2.5
+
+    def test_cgroup_v2_unlimited(self, monkeypatch):
+        _cgroup(monkeypatch, {serve._CGROUP_CPU_MAX: "max 100000"})
+        assert serve.cpu_quota() is None
+
+    def test_cgroup_v1(self, monkeypatch):
+        _cgroup(monkeypatch, {
+            serve._CGROUP_V1_QUOTA: "200000",
+            serve._CGROUP_V1_PERIOD: "100000",
+        })
+        assert serve.cpu_quota() == 2.0
+
+    def test_cgroup_v1_unlimited(self, monkeypatch):
+        _cgroup(monkeypatch, {
+            serve._CGROUP_V1_QUOTA: "-1",
+            serve._CGROUP_V1_PERIOD: "100000",
+        })
+        assert serve.cpu_quota() is None
+
+    def test_quota_caps_cpus(self, monkeypatch):
+        monkeypatch.setattr(
+            serve.os, "sched_getaffinity", lambda _: set(range(16))
+        )
+        monkeypatch.setattr(serve, "cpu_quota", lambda: 2.5)
+        assert serve.available_cpus() == 3
+
+
+class TestWorkerCount:
+    def test_explicit_count_wins(self, monkeypatch):
+        monkeypatch.setattr(serve, "available_cpus", lambda: 16)
+        assert serve.worker_count(3, 8) == 3
+
+    @pytest.mark.parametrize("cpus,expected", [(1, 1), (4, 4), (16, 8)])
+    def test_auto_is_capped(self, monkeypatch, cpus, expected):
+        monkeypatch.setattr(serve, "available_cpus", lambda: cpus)
+        assert serve.worker_count(0, 8) == expected
+
+
+class TestMetricsDir:
+    def test_removes_stale_files(self, monkeypatch, tmp_path):
+        (tmp_path / "counter_123.db").write_bytes(b"old")
+        (tmp_path / "keep.txt").write_text("x")
+        monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+        serve._prepare_metrics_dir()
+
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["keep.txt"]
+
+    def test_creates_a_directory_when_unset(self, monkeypatch):
+        monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+
+        serve._prepare_metrics_dir()
+
+        path = os.environ.pop("PROMETHEUS_MULTIPROC_DIR")
+        assert os.path.isdir(path)
+        os.rmdir(path)
@@ -0,0 +1,273 @@
+"""Tests for single-flight coalescing of identical in-flight requests."""
+
+import asyncio
+
+import pytest
+from unittest.mock import MagicMock
+
+from app.services import chat_pipeline, single_flight
+from app.services.ai_providers import ChatMessage, ChatRequest, ChatResponse
+from app.services.chat_pipeline import ChatOptions
+from app.services.single_flight import SingleFlight, SubscriberTooSlow
+
+
+def _request(content: str = "Summarise the release notes"):
+    return ChatRequest(messages=[ChatMessage(role="user", content=content)])
+
+
+def _response() -> ChatResponse:
+    return ChatResponse(
+        content="summary",
+        model="gpt-4",
+        provider="openai",
+        usage={"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+    )
+
+
+class _SlowProvider:
+    """Provider whose calls block until ``release`` is set."""
+
+    name = "openai"
+    default_model = "gpt-4"
+
+    def __init__(self, chunks=("a", "b", "c"), tenant=None, release=None):
+        self.tenant = tenant
+        self.release = release or asyncio.Event()
+        self.chat_calls = 0
+        self.stream_calls = 0
+        self._chunks = chunks
+
+    async def chat(self, request):
+        self.chat_calls += 1
+        await self.release.wait()
+        return _response()
+
+    async def chat_stream(self, request):
+        self.stream_calls += 1
+        await self.release.wait()
+        for chunk in self._chunks:
+            # Network reads give consumers a chance to run between chunks.
+            await asyncio.sleep(0)
+            yield chunk
+
+
+async def _drain(stream) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+class TestSingleFlightChat:
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_upstream(self):
+        flight = SingleFlight(subscriber_buffer=8)
+        calls = 0
+        release = asyncio.Event()
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return _response()
+
+        tasks = [asyncio.create_task(flight.chat("k", call)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert [r.usage["total_tokens"] for r in results].count(12) == 1
+        assert all(r.content == "summary" for r in results)
+        assert sum(bool(r.usage.get("coalesced")) for r in results) == 4
+        assert flight.stats() == {"coalesced": 4, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_leader_cancellation_does_not_cancel_followers(self):
+        flight = SingleFlight(subscriber_buffer=8)
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            return _response()
+
+        leader = asyncio.create_task(flight.chat("k", call))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.chat("k", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+
+        assert (await follower).content == "summary"
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_every_caller(self):
+        flight = SingleFlight(subscriber_buffer=8)
+
+        async def call():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            flight.chat("k", call), flight.chat("k", call),
+            return_exceptions=True,
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_abandoned_call_error_is_retrieved(self, monkeypatch):
+        logger = MagicMock()
+        monkeypatch.setattr(single_flight, "logger", logger)
+        flight = SingleFlight(subscriber_buffer=8)
+        release = asyncio.Event()
+
+        async def call():
+            await release.wait()
+            raise RuntimeError("upstream down")
+
+        leader = asyncio.create_task(flight.chat("k", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+        assert flight.stats()["in_flight"] == 0
+        logger.warning.assert_called_once()
+        assert logger.warning.call_args.args[0] == "single_flight_call_failed"
+
+
+class TestBroadcaster:
+    @pytest.mark.asyncio
+    async def test_subscribers_share_one_stream(self):
+        flight = SingleFlight(subscriber_buffer=8)
+        provider = _SlowProvider()
+
+        first, joined_first = flight.stream("k", lambda: provider.chat_stream(None))
+        second, joined_second = flight.stream("k", lambda: provider.chat_stream(None))
+        tasks = [asyncio.create_task(_drain(s)) for s in (first, second)]
+        await asyncio.sleep(0)
+        provider.release.set()
+
+        assert await asyncio.gather(*tasks) == [["a", "b", "c"], ["a", "b", "c"]]
+        assert provider.stream_calls == 1
+        assert (joined_first, joined_second) == (False, True)
+
+    @pytest.mark.asyncio
+    async def test_late_joiner_replays_earlier_chunks(self):
+        flight = SingleFlight(subscriber_buffer=8)
+        feed: asyncio.Queue = asyncio.Queue()
+
+        async def upstream():
+            while (chunk := await feed.get()) is not None:
+                yield chunk
+
+        first, _ = flight.stream("k", upstream)
+        first_iter = first.__aiter__()
+        feed.put_nowait("a")
+        assert await first_iter.__anext__() == "a"
+        second, joined = flight.stream("k", upstream)
+        for chunk in ("b", "c", None):
+            feed.put_nowait(chunk)
+
+        assert joined
+        assert await _drain(second) == ["a", "b", "c"]
+        assert [c async for c in first_iter] == ["b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_is_dropped(self):
+        flight = SingleFlight(subscriber_buffer=2)
+        provider = _SlowProvider(chunks=tuple("abcdef"))
+
+        fast, _ = flight.stream("k", lambda: provider.chat_stream(None))
+        slow, _ = flight.stream("k", lambda: provider.chat_stream(None))
+        fast_task = asyncio.create_task(_drain(fast))
+        slow_iter = slow.__aiter__()
+        first = asyncio.create_task(slow_iter.__anext__())
+        await asyncio.sleep(0)
+        provider.release.set()
+
+        assert await first == "a"
+        assert await fast_task == list("abcdef")
+        with pytest.raises(SubscriberTooSlow):
+            async for _ in slow_iter:
+                pass
+
+
+class TestPipelineCoalescing:
+    @pytest.mark.asyncio
+    async def test_complete_coalesces_when_opted_in(self):
+        provider = _SlowProvider()
+        options = ChatOptions(cache=False, coalesce=True)
+        tasks = [
+            asyncio.create_task(chat_pipeline.complete(provider, _request(), options))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        provider.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert provider.chat_calls == 1
+        assert sum(r.usage["total_tokens"] for r in results) == 12
+
+    @pytest.mark.asyncio
+    async def test_complete_does_not_coalesce_by_default(self):
+        provider = _SlowProvider()
+        options = ChatOptions(cache=False)
+        tasks = [
+            asyncio.create_task(chat_pipeline.complete(provider, _request(), options))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        provider.release.set()
+        await asyncio.gather(*tasks)
+
+        assert provider.chat_calls == 3
+
+    @pytest.mark.asyncio
+    async def test_different_applications_are_not_coalesced(self):
+        provider = _SlowProvider()
+        tasks = [
+            asyncio.create_task(chat_pipeline.complete(
+                provider,
+                _request(),
+                ChatOptions(cache=False, coalesce=True, application_id=app_id),
+            ))
+            for app_id in ("app-1", "app-2")
+        ]
+        await asyncio.sleep(0)
+        provider.release.set()
+        await asyncio.gather(*tasks)
+
+        assert provider.chat_calls == 2
+
+    @pytest.mark.asyncio
+    async def test_coalesced_per_tenant_not_per_instance(self):
+        release = asyncio.Event()
+        providers = [
+            _SlowProvider(tenant="key-a", release=release),
+            _SlowProvider(tenant="key-a", release=release),
+            _SlowProvider(tenant="key-b", release=release),
+        ]
+        tasks = [
+            asyncio.create_task(chat_pipeline.complete(
+                provider, _request(), ChatOptions(cache=False, coalesce=True)
+            ))
+            for provider in providers
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+        assert sum(p.chat_calls for p in providers) == 2
+        assert providers[2].chat_calls == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_followers_are_marked_coalesced(self):
+        provider = _SlowProvider()
+        options = ChatOptions(cache=False, coalesce=True)
+        streams = [chat_pipeline.stream(provider, _request(), options) for _ in range(2)]
+        tasks = [asyncio.create_task(_drain(s)) for s in streams]
+        await asyncio.sleep(0)
+        provider.release.set()
+
+        assert await asyncio.gather(*tasks) == [["a", "b", "c"]] * 2
+        assert provider.stream_calls == 1
+        assert [s.usage.get("coalesced") for s in streams] == [None, True]
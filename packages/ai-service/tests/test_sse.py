@@ -0,0 +1,65 @@
+"""Tests for the incremental SSE decoder."""
+
+import pytest
+
+from app.services.sse import SSEDecoder, aiter_events
+
+
+def _feed(chunks: list[bytes]) -> list:
+    decoder = SSEDecoder()
+    return [event for chunk in chunks for event in decoder.feed(chunk)]
+
+
+class TestSSEDecoder:
+    def test_single_event(self):
+        events = _feed([b"data: hello\n\n"])
+        assert [(e.event, e.data) for e in events] == [("message", "hello")]
+
+    @pytest.mark.parametrize("newline", [b"\n", b"\r\n", b"\r"])
+    def test_line_endings(self, newline):
+        body = newline.join([b"data: a", b"", b"data: b", b"", b""])
+        assert [e.data for e in _feed([body])] == ["a", "b"]
+
+    def test_byte_at_a_time(self):
+        body = "data: héllo\r\n\r\ndata: wörld\n\n".encode()
+        chunks = [body[i:i + 1] for i in range(len(body))]
+        assert [e.data for e in _feed(chunks)] == ["héllo", "wörld"]
+
+    def test_crlf_split_across_chunks(self):
+        # The "\n" after a chunk-final "\r" must not read as a blank line.
+        events = _feed([b"data: a\r", b"\ndata: b\r", b"\n\r\n"])
+        assert [e.data for e in events] == ["a\nb"]
+
+    def test_fields_and_comments(self):
+        body = (
+            b": ping\n"
+            b"event: token\n"
+            b"id: 7\n"
+            b"retry: 1500\n"
+            b"data:first\n"
+            b"data: second\n"
+            b"ignored: x\n"
+            b"\n"
+        )
+        (event,) = _feed([body])
+        assert event.event == "token"
+        assert event.id == "7"
+        assert event.retry == 1500
+        assert event.data == "first\nsecond"
+
+    def test_event_without_data_is_not_dispatched(self):
+        assert _feed([b"event: ping\n\n: only a comment\n\n"]) == []
+
+    def test_incomplete_event_is_held(self):
+        decoder = SSEDecoder()
+        assert decoder.feed(b"data: par") == []
+        assert decoder.feed(b"tial\n") == []
+        assert [e.data for e in decoder.feed(b"\n")] == ["partial"]
+
+    @pytest.mark.asyncio
+    async def test_aiter_events(self):
+        async def chunks():
+            yield b"data: 1\n\nda"
+            yield b"ta: 2\n\n"
+
+        assert [e.data async for e in aiter_events(chunks())] == ["1", "2"]
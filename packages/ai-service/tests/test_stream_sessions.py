@@ -0,0 +1,153 @@
+"""Tests for resumable background stream sessions."""
+
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient  # type: ignore
+
+from app.services import stream_sessions
+
+
+class _Chunks:
+    """Async chunk source that mimics ChatStream (usage + aclose)."""
+
+    def __init__(self, chunks, fail_after=None, gate=None):
+        self._chunks = chunks
+        self._fail_after = fail_after
+        self._gate = gate
+        self.usage = {"cache": "miss"}
+        self.closed = False
+
+    def __aiter__(self):
+        return self._gen()
+
+    async def _gen(self):
+        for i, chunk in enumerate(self._chunks):
+            if self._gate is not None and i == 1:
+                await self._gate.wait()
+            if self._fail_after is not None and i == self._fail_after:
+                raise RuntimeError("upstream broke")
+            yield chunk
+
+    async def aclose(self):
+        self.closed = True
+
+
+class _FlakyDb:
+    """Database whose first ``failures`` chunk writes raise."""
+
+    def __init__(self, failures: int):
+        self.db = AsyncMongoMockClient()["agentbase_test"]
+        self.failures = failures
+        self.attempts = 0
+
+    def __getitem__(self, name):
+        collection = self.db[name]
+        if name != stream_sessions.CHUNKS_COLLECTION:
+            return collection
+        outer = self
+
+        class _Chunks:
+            async def replace_one(self, *args, **kwargs):
+                outer.attempts += 1
+                if outer.failures:
+                    outer.failures -= 1
+                    raise ConnectionError("mongo unavailable")
+                return await collection.replace_one(*args, **kwargs)
+
+            def find(self, *args, **kwargs):
+                return collection.find(*args, **kwargs)
+
+        return _Chunks()
+
+
+async def _collect(events):
+    return [(e.seq, e.type, e.content) async for e in events]
+
+
+class TestStreamSession:
+    @pytest.mark.asyncio
+    async def test_subscriber_gets_chunks_then_done(self):
+        completed = []
+
+        async def on_complete(text, usage):
+            completed.append((text, usage))
+
+        source = _Chunks(["Hel", "lo", "!"])
+        session = stream_sessions.start_session("c1", source, on_complete)
+
+        events = await _collect(session.follow())
+
+        assert events == [
+            (1, "chunk", "Hel"),
+            (2, "chunk", "lo"),
+            (3, "chunk", "!"),
+            (None, "done", "Hello!"),
+        ]
+        assert completed == [("Hello!", {"cache": "miss"})]
+        assert source.closed
+
+    @pytest.mark.asyncio
+    async def test_resume_replays_missed_chunks_then_joins_live(self):
+        gate = asyncio.Event()
+
+        async def on_complete(text, usage):
+            pass
+
+        session = stream_sessions.start_session(
+            "c1", _Chunks(["a", "b", "c"], gate=gate), on_complete
+        )
+        first = session.follow()
+        assert (await anext(first)).content == "a"
+        await first.aclose()  # client disconnects after event 1
+
+        assert stream_sessions.get_live_session(session.id) is session
+        resumed = asyncio.ensure_future(_collect(session.follow(after=1)))
+        gate.set()
+
+        assert await resumed == [
+            (2, "chunk", "b"),
+            (3, "chunk", "c"),
+            (None, "done", "abc"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_upstream_error_is_terminal_event(self):
+        async def on_complete(text, usage):
+            raise AssertionError("must not persist a failed stream")
+
+        session = stream_sessions.start_session(
+            "c1", _Chunks(["a", "b"], fail_after=1), on_complete
+        )
+
+        events = await _collect(session.follow())
+
+        assert events[-1] == (None, "error", "upstream broke")
+        assert stream_sessions.get_live_session(session.id) is None
+
+    @pytest.mark.asyncio
+    async def test_failed_flush_is_retried_without_losing_chunks(
+        self, monkeypatch
+    ):
+        db = _FlakyDb(failures=1)
+        monkeypatch.setattr(stream_sessions, "get_db", lambda: db)
+        monkeypatch.setattr(stream_sessions.settings, "STREAM_FLUSH_MAX_CHUNKS", 1)
+
+        async def on_complete(text, usage):
+            pass
+
+        session = stream_sessions.start_session(
+            "c1", _Chunks(["a", "b", "c"]), on_complete
+        )
+        events = await _collect(session.follow())
+        await asyncio.sleep(0)
+
+        assert events[-1] == (None, "done", "abc")
+        assert db.attempts > 3
+        replayed = await _collect(stream_sessions.replay_persisted(session.id))
+        assert replayed == [
+            (1, "chunk", "a"),
+            (2, "chunk", "b"),
+            (3, "chunk", "c"),
+            (None, "done", "abc"),
+        ]
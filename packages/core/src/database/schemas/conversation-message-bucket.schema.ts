@@ -0,0 +1,36 @@
+import { Prop, Schema, SchemaFactory } from '@nestjs/mongoose';
+import { Document, Types } from 'mongoose';
+
+export type ConversationMessageBucketDocument = ConversationMessageBucket & Document;
+
+/**
+ * Fixed-size slice of a conversation's messages, written by the AI service.
+ * Conversations with `storageVersion` 2 keep their history here instead of
+ * in an embedded `messages` array. Each message carries its absolute
+ * `index` within the conversation.
+ */
+@Schema({ collection: 'ai_conversation_messages', timestamps: true })
+export class ConversationMessageBucket {
+  @Prop({ type: Types.ObjectId, required: true })
+  conversationId: Types.ObjectId;
+
+  @Prop({ required: true })
+  bucket: number;
+
+  @Prop({ default: 0 })
+  count: number;
+
+  @Prop({ type: [Object], default: [] })
+  messages: Array<{
+    index: number;
+    role: 'system' | 'user' | 'assistant';
+    content: string;
+    timestamp?: Date;
+    tokens?: number;
+    metadata?: Record<string, any>;
+  }>;
+}
+
+export const ConversationMessageBucketSchema = SchemaFactory.createForClass(ConversationMessageBucket);
+
+ConversationMessageBucketSchema.index({ conversationId: 1, bucket: 1 }, { unique: true });
@@ -43,6 +43,24 @@ export class Conversation {
 
   @Prop({ default: false })
   isArchived: boolean;
+
+  // Set by the AI service once messages live in ai_conversation_messages.
+  // Legacy conversations have no storageVersion and keep `messages` above.
+  @Prop()
+  storageVersion?: number;
+
+  @Prop()
+  bucketSize?: number;
+
+  @Prop()
+  messageCount?: number;
+
+  @Prop({ type: Object })
+  lastMessage?: {
+    role: 'system' | 'user' | 'assistant';
+    content: string;
+    timestamp?: Date;
+  } | null;
 }
 
 export const ConversationSchema = SchemaFactory.createForClass(Conversation);
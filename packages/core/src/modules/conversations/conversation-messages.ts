@@ -0,0 +1,76 @@
+import { Model, Types } from 'mongoose';
+
+/** Header version from which messages live in ai_conversation_messages. */
+export const BUCKETED_STORAGE_VERSION = 2;
+
+export function isBucketed(conv: any): boolean {
+  return (conv?.storageVersion || 0) >= BUCKETED_STORAGE_VERSION;
+}
+
+export function messageCount(conv: any): number {
+  return isBucketed(conv) ? conv.messageCount || 0 : conv.messages?.length || 0;
+}
+
+export function lastMessage(conv: any): any {
+  return isBucketed(conv) ? conv.lastMessage : conv.messages?.[conv.messages.length - 1];
+}
+
+function toObjectIds(ids: Array<string | Types.ObjectId>): Types.ObjectId[] {
+  return ids
+    .filter(id => Types.ObjectId.isValid(String(id)))
+    .map(id => new Types.ObjectId(String(id)));
+}
+
+/**
+ * Full, ordered message history of each conversation keyed by id. Bucketed
+ * conversations are read from their buckets in one query; legacy ones use
+ * the embedded array. The internal `index` field is stripped.
+ */
+export async function loadMessages(bucketModel: Model<any>, conversations: any[]): Promise<Map<string, any[]>> {
+  const result = new Map<string, any[]>();
+  const bucketed: Types.ObjectId[] = [];
+  for (const conv of conversations) {
+    const id = String(conv._id);
+    if (isBucketed(conv)) {
+      result.set(id, []);
+      bucketed.push(conv._id);
+    } else {
+      result.set(id, conv.messages || []);
+    }
+  }
+
+  if (bucketed.length) {
+    const buckets = await bucketModel
+      .find({ conversationId: { $in: bucketed } }, { conversationId: 1, messages: 1 })
+      .sort({ conversationId: 1, bucket: 1 })
+      .lean();
+    for (const bucket of buckets as any[]) {
+      const messages = result.get(String(bucket.conversationId));
+      for (const { index, ...message } of bucket.messages || []) {
+        messages?.push(message);
+      }
+    }
+  }
+  return result;
+}
+
+/**
+ * Ids among `conversationIds` with a bucketed message whose content matches
+ * `search`. Callers pass the ids they are allowed to see, so the regex only
+ * ever runs over that tenant's buckets.
+ */
+export async function searchMessages(
+  bucketModel: Model<any>,
+  conversationIds: Array<string | Types.ObjectId>,
+  search: string,
+): Promise<Types.ObjectId[]> {
+  if (!conversationIds.length) return [];
+  return bucketModel.distinct('conversationId', {
+    conversationId: { $in: toObjectIds(conversationIds) },
+    'messages.content': { $regex: search, $options: 'i' },
+  });
+}
+
+export async function deleteMessages(bucketModel: Model<any>, ids: Array<string | Types.ObjectId>) {
+  return bucketModel.deleteMany({ conversationId: { $in: toObjectIds(ids) } });
+}
@@ -4,6 +4,10 @@ import {
   Conversation,
   ConversationSchema,
 } from "../../database/schemas/conversation.schema";
+import {
+  ConversationMessageBucket,
+  ConversationMessageBucketSchema,
+} from "../../database/schemas/conversation-message-bucket.schema";
 import {
   ModelConfig,
   ModelConfigSchema,
@@ -15,6 +19,10 @@ import { ConversationsController } from "./conversations.controller";
   imports: [
     MongooseModule.forFeature([
       { name: Conversation.name, schema: ConversationSchema },
+      {
+        name: ConversationMessageBucket.name,
+        schema: ConversationMessageBucketSchema,
+      },
       { name: ModelConfig.name, schema: ModelConfigSchema },
     ]),
   ],
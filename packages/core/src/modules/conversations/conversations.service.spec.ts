@@ -0,0 +1,146 @@
+import { Test, TestingModule } from "@nestjs/testing";
+import { getModelToken } from "@nestjs/mongoose";
+import { NotFoundException } from "@nestjs/common";
+import { Types } from "mongoose";
+import { ConversationsService } from "./conversations.service";
+import { ConversationMessageBucket } from "../../database/schemas/conversation-message-bucket.schema";
+
+/** Minimal chainable query: every builder call returns itself, awaiting resolves `value`. */
+function query(value: any) {
+  const q: any = {
+    sort: jest.fn(() => q),
+    skip: jest.fn(() => q),
+    limit: jest.fn(() => q),
+    lean: jest.fn(() => q),
+    exec: jest.fn(() => Promise.resolve(value)),
+    then: (resolve: any, reject: any) => Promise.resolve(value).then(resolve, reject),
+  };
+  return q;
+}
+
+describe("ConversationsService", () => {
+  let service: ConversationsService;
+  let conversationModel: Record<string, jest.Mock>;
+  let bucketModel: Record<string, jest.Mock>;
+
+  const convId = new Types.ObjectId();
+  const bucketedConv = {
+    _id: convId,
+    applicationId: "app-1",
+    sessionId: "session-1",
+    storageVersion: 2,
+    bucketSize: 2,
+    messageCount: 3,
+    messages: [],
+  };
+
+  beforeEach(async () => {
+    conversationModel = {
+      find: jest.fn(() => query([])),
+      findById: jest.fn(),
+      countDocuments: jest.fn().mockResolvedValue(0),
+      distinct: jest.fn().mockResolvedValue([]),
+    };
+    bucketModel = {
+      find: jest.fn(),
+      distinct: jest.fn().mockResolvedValue([]),
+    };
+
+    const module: TestingModule = await Test.createTestingModule({
+      providers: [
+        ConversationsService,
+        { provide: getModelToken("Conversation"), useValue: conversationModel },
+        {
+          provide: getModelToken(ConversationMessageBucket.name),
+          useValue: bucketModel,
+        },
+      ],
+    }).compile();
+
+    service = module.get<ConversationsService>(ConversationsService);
+  });
+
+  // ─── Find By Id ──────────────────────────────────────────
+
+  describe("findById", () => {
+    it("should return bucketed messages in order without their index", async () => {
+      conversationModel.findById.mockReturnValue(query(bucketedConv));
+      bucketModel.find.mockReturnValue(
+        query([
+          {
+            conversationId: convId,
+            messages: [
+              { role: "user", content: "hi", index: 0 },
+              { role: "assistant", content: "hello", index: 1 },
+            ],
+          },
+          {
+            conversationId: convId,
+            messages: [{ role: "user", content: "bye", index: 2 }],
+          },
+        ]),
+      );
+
+      const result = await service.findById(String(convId));
+
+      expect(result.sessionId).toBe("session-1");
+      expect(result.messages).toEqual([
+        { role: "user", content: "hi" },
+        { role: "assistant", content: "hello" },
+        { role: "user", content: "bye" },
+      ]);
+      expect(bucketModel.find).toHaveBeenCalledWith(
+        { conversationId: { $in: [convId] } },
+        expect.anything(),
+      );
+    });
+
+    it("should return embedded messages of legacy conversations as-is", async () => {
+      const legacy = {
+        _id: new Types.ObjectId(),
+        applicationId: "app-1",
+        messages: [{ role: "user", content: "hi" }],
+      };
+      conversationModel.findById.mockReturnValue(query(legacy));
+
+      const result = await service.findById(String(legacy._id));
+
+      expect(result.messages).toEqual(legacy.messages);
+      expect(bucketModel.find).not.toHaveBeenCalled();
+    });
+
+    it("should throw NotFoundException when the conversation is missing", async () => {
+      conversationModel.findById.mockReturnValue(query(null));
+
+      await expect(service.findById("missing")).rejects.toThrow(
+        NotFoundException,
+      );
+    });
+  });
+
+  // ─── Search ──────────────────────────────────────────────
+
+  describe("findByApp", () => {
+    it("should only search buckets of the application's conversations", async () => {
+      conversationModel.distinct.mockResolvedValue([convId]);
+      bucketModel.distinct.mockResolvedValue([convId]);
+
+      await service.findByApp("app-1", { search: "hello" });
+
+      expect(conversationModel.distinct).toHaveBeenCalledWith("_id", {
+        applicationId: "app-1",
+        storageVersion: { $gte: 2 },
+      });
+      expect(bucketModel.distinct).toHaveBeenCalledWith("conversationId", {
+        conversationId: { $in: [convId] },
+        "messages.content": { $regex: "hello", $options: "i" },
+      });
+    });
+
+    it("should not touch buckets when the application has none", async () => {
+      await service.findByApp("app-1", { search: "hello" });
+
+      expect(bucketModel.distinct).not.toHaveBeenCalled();
+    });
+  });
+});
@@ -2,6 +2,15 @@ import { Injectable, Logger, NotFoundException } from '@nestjs/common';
 import { InjectModel } from '@nestjs/mongoose';
 import { Model } from 'mongoose';
 import { Conversation } from '../../database/schemas/conversation.schema';
+import { ConversationMessageBucket } from '../../database/schemas/conversation-message-bucket.schema';
+import {
+  BUCKETED_STORAGE_VERSION,
+  deleteMessages,
+  lastMessage,
+  loadMessages,
+  messageCount,
+  searchMessages,
+} from './conversation-messages';
 
 @Injectable()
 export class ConversationsService {
@@ -10,6 +19,8 @@ export class ConversationsService {
   constructor(
     @InjectModel('Conversation')
     private readonly conversationModel: Model<any>,
+    @InjectModel(ConversationMessageBucket.name)
+    private readonly bucketModel: Model<any>,
   ) {}
 
   async findByApp(applicationId: string, params?: {
@@ -21,17 +32,24 @@ export class ConversationsService {
   }) {
     const query: any = { applicationId };
 
+    if (params?.from || params?.to) {
+      query.createdAt = {};
+      if (params?.from) query.createdAt.$gte = params.from;
+      if (params?.to) query.createdAt.$lte = params.to;
+    }
     if (params?.search) {
+      // Only this application's bucketed conversations are searched.
+      const bucketed = await this.conversationModel.distinct('_id', {
+        ...query,
+        storageVersion: { $gte: BUCKETED_STORAGE_VERSION },
+      });
+      const matched = await searchMessages(this.bucketModel, bucketed, params.search);
       query.$or = [
+        { _id: { $in: matched } },
         { 'messages.content': { $regex: params.search, $options: 'i' } },
         { metadata: { $regex: params.search, $options: 'i' } },
       ];
     }
-    if (params?.from || params?.to) {
-      query.createdAt = {};
-      if (params?.from) query.createdAt.$gte = params.from;
-      if (params?.to) query.createdAt.$lte = params.to;
-    }
 
     const limit = params?.limit || 20;
     const skip = params?.skip || 0;
@@ -46,8 +64,8 @@ export class ConversationsService {
         id: c._id,
         applicationId: c.applicationId,
         sessionId: c.sessionId,
-        messageCount: c.messages?.length || 0,
-        lastMessage: c.messages?.[c.messages.length - 1]?.content?.slice(0, 100),
+        messageCount: messageCount(c),
+        lastMessage: lastMessage(c)?.content?.slice(0, 100),
         metadata: c.metadata,
         createdAt: c.createdAt,
         updatedAt: c.updatedAt,
@@ -59,36 +77,40 @@ export class ConversationsService {
   }
 
   async findById(id: string) {
-    const conv = await this.conversationModel.findById(id);
+    const conv = await this.conversationModel.findById(id).lean<any>();
     if (!conv) throw new NotFoundException('Conversation not found');
-    return conv;
+    const messages = (await loadMessages(this.bucketModel, [conv])).get(String(conv._id)) || [];
+    return { ...conv, messages };
   }
 
   async delete(id: string) {
     const result = await this.conversationModel.findByIdAndDelete(id);
     if (!result) throw new NotFoundException('Conversation not found');
+    await deleteMessages(this.bucketModel, [result._id]);
     this.logger.log(`Conversation ${id} deleted`);
   }
 
   async bulkDelete(ids: string[]) {
     const result = await this.conversationModel.deleteMany({ _id: { $in: ids } });
+    await deleteMessages(this.bucketModel, ids);
     this.logger.log(`Bulk deleted ${result.deletedCount} conversations`);
     return { deleted: result.deletedCount };
   }
 
   async exportConversation(id: string, format: 'json' | 'csv' | 'txt' = 'json') {
     const conv = await this.findById(id);
+    const messages = conv.messages;
 
     switch (format) {
       case 'csv': {
         const header = 'timestamp,role,content\n';
-        const rows = (conv.messages || []).map((m: any) =>
+        const rows = messages.map((m: any) =>
           `"${m.timestamp || ''}","${m.role}","${(m.content || '').replace(/"/g, '""')}"`
         ).join('\n');
         return { data: header + rows, filename: `conversation-${id}.csv`, mimeType: 'text/csv' };
       }
       case 'txt': {
-        const lines = (conv.messages || []).map((m: any) =>
+        const lines = messages.map((m: any) =>
           `[${m.role.toUpperCase()}]: ${m.content}`
         ).join('\n\n');
         return { data: lines, filename: `conversation-${id}.txt`, mimeType: 'text/plain' };
@@ -99,7 +121,7 @@ export class ConversationsService {
             id: conv._id,
             applicationId: conv.applicationId,
             sessionId: conv.sessionId,
-            messages: conv.messages,
+            messages,
             metadata: conv.metadata,
             createdAt: conv.createdAt,
           }, null, 2),
@@ -118,11 +140,12 @@ export class ConversationsService {
     }
 
     const conversations = await this.conversationModel.find(query).sort({ createdAt: -1 }).limit(500).exec();
+    const messages = await loadMessages(this.bucketModel, conversations);
 
     if (format === 'csv') {
       const header = 'conversation_id,timestamp,role,content\n';
       const rows = conversations.flatMap((c: any) =>
-        (c.messages || []).map((m: any) =>
+        (messages.get(String(c._id)) || []).map((m: any) =>
           `"${c._id}","${m.timestamp || ''}","${m.role}","${(m.content || '').replace(/"/g, '""')}"`
         )
       ).join('\n');
@@ -133,7 +156,7 @@ export class ConversationsService {
       data: JSON.stringify(conversations.map((c: any) => ({
         id: c._id,
         sessionId: c.sessionId,
-        messages: c.messages,
+        messages: messages.get(String(c._id)) || [],
         metadata: c.metadata,
         createdAt: c.createdAt,
       })), null, 2),
@@ -151,7 +174,11 @@ export class ConversationsService {
       }),
       this.conversationModel.aggregate([
         { $match: { applicationId } },
-        { $project: { messageCount: { $size: { $ifNull: ['$messages', []] } } } },
+        {
+          $project: {
+            messageCount: { $ifNull: ['$messageCount', { $size: { $ifNull: ['$messages', []] } }] },
+          },
+        },
         { $group: { _id: null, avg: { $avg: '$messageCount' }, total: { $sum: '$messageCount' } } },
       ]),
     ]);
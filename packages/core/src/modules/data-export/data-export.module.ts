@@ -3,13 +3,20 @@ import { TypeOrmModule } from '@nestjs/typeorm';
 import { MongooseModule } from '@nestjs/mongoose';
 import { Application } from '../../database/entities/application.entity';
 import { Conversation, ConversationSchema } from '../../database/schemas/conversation.schema';
+import {
+  ConversationMessageBucket,
+  ConversationMessageBucketSchema,
+} from '../../database/schemas/conversation-message-bucket.schema';
 import { DataExportService } from './data-export.service';
 import { DataExportController } from './data-export.controller';
 
 @Module({
   imports: [
     TypeOrmModule.forFeature([Application]),
-    MongooseModule.forFeature([{ name: Conversation.name, schema: ConversationSchema }]),
+    MongooseModule.forFeature([
+      { name: Conversation.name, schema: ConversationSchema },
+      { name: ConversationMessageBucket.name, schema: ConversationMessageBucketSchema },
+    ]),
   ],
   controllers: [DataExportController],
   providers: [DataExportService],
@@ -5,6 +5,11 @@ import { Repository } from 'typeorm';
 import { Model } from 'mongoose';
 import { Application, AppStatus } from '../../database/entities/application.entity';
 import { Conversation, ConversationDocument } from '../../database/schemas/conversation.schema';
+import {
+  ConversationMessageBucket,
+  ConversationMessageBucketDocument,
+} from '../../database/schemas/conversation-message-bucket.schema';
+import { loadMessages } from '../conversations/conversation-messages';
 import { AuditService } from '../audit/audit.service';
 
 export interface ExportOptions {
@@ -24,6 +29,8 @@ export class DataExportService {
     private readonly appRepo: Repository<Application>,
     @InjectModel(Conversation.name)
     private readonly conversationModel: Model<ConversationDocument>,
+    @InjectModel(ConversationMessageBucket.name)
+    private readonly bucketModel: Model<ConversationMessageBucketDocument>,
     private readonly audit: AuditService,
   ) {}
 
@@ -107,12 +114,13 @@ export class DataExportService {
       .sort({ createdAt: -1 })
       .limit(10000)
       .lean();
+    const messages = await loadMessages(this.bucketModel, conversations);
 
     return conversations.map((c: any) => ({
       id: c._id?.toString(),
       applicationId: c.applicationId,
       sessionId: c.sessionId,
-      messages: c.messages?.map((m: any) => ({
+      messages: messages.get(String(c._id))?.map((m: any) => ({
         role: m.role,
         content: m.content,
         timestamp: m.timestamp,
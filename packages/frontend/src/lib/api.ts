@@ -371,9 +371,17 @@ class ApiClient {
     return this.request<any>(`${AI_URL}/ai/conversations/${conversationId}`);
   }
 
-  async getConversationsByApp(applicationId: string, limit = 20, skip = 0) {
+  async getConversationsByApp(
+    applicationId: string,
+    limit = 20,
+    skip = 0,
+    cursor?: string,
+  ) {
+    const page = cursor
+      ? `cursor=${encodeURIComponent(cursor)}`
+      : `skip=${skip}`;
     return this.request<any>(
-      `${AI_URL}/ai/conversations/by-app/${applicationId}?limit=${limit}&skip=${skip}`,
+      `${AI_URL}/ai/conversations/by-app/${applicationId}?limit=${limit}&${page}`,
     );
   }
 